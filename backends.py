@@ -0,0 +1,294 @@
+"""
+Второй уровень кэша ответов TMDB — общий для всех процессов бота
+✅ Один интерфейс: get(key) -> (data, expires_at), set(key, data) в фоне, evict(), close()
+✅ SQLiteStore — один узел: таблица search_cache в общем файле БД (WAL)
+✅ NetworkStore — сетевое хранилище по протоколу RESP (Redis, Valkey, KeyDB)
+✅ Одно TCP-соединение на процесс, команды идут конвейером — ответы приходят по порядку
+✅ Срок жизни записи в сети — PX (TTL + STALE_GRACE): хранилище чистит себя само
+✅ Ошибка хранилища — промах кэша, а не ошибка обработчика
+✅ Выбор по CACHE_URL: пусто — SQLite, redis://[:пароль@]хост:порт/база — сеть
+"""
+
+import os
+import time
+import asyncio
+import logging
+import sqlite3
+from collections import deque
+from datetime import datetime, timedelta
+from urllib.parse import urlsplit
+
+import orjson
+
+from cache import STALE_GRACE, ttl_for
+
+logger = logging.getLogger(__name__)
+
+CACHE_URL = os.environ.get('CACHE_URL', '')
+STORE_TIMEOUT = float(os.environ.get('CACHE_STORE_TIMEOUT', 0.5))  # дольше — считаем промахом
+KEY_PREFIX = 'moviebot:tmdb:'
+RECONNECT_DELAY = 1.0  # после неудачного подключения столько секунд сразу промах
+
+
+class StoreError(Exception):
+    """Ошибка, которую вернуло сетевое хранилище (-ERR ...)"""
+
+
+# === SQLITE ===
+
+def _is_expired(key, cached_at):
+    """SQL-функция для фоновой очистки"""
+    try:
+        return datetime.fromisoformat(cached_at) + timedelta(seconds=ttl_for(key) + STALE_GRACE) < datetime.now()
+    except (TypeError, ValueError):
+        return True
+
+
+def _disk_get(conn, key):
+    row = conn.execute('SELECT results, cached_at FROM search_cache WHERE query=?', (key,)).fetchone()
+    if not row:
+        return None, None
+    results, cached_at = row
+    expires_at = datetime.fromisoformat(cached_at).timestamp() + ttl_for(key)
+    if expires_at + STALE_GRACE < time.time():
+        return None, None
+    return orjson.loads(results), expires_at
+
+
+def _disk_set(conn, key, results, cached_at):
+    conn.execute('INSERT OR REPLACE INTO search_cache (query, results, cached_at) VALUES (?, ?, ?)',
+                 (key, results, cached_at))
+
+
+def _disk_evict(conn):
+    """Удалить устаревшие записи (TTL считается по эндпоинту в ключе)"""
+    conn.create_function('is_expired', 2, _is_expired)
+    return conn.execute('DELETE FROM search_cache WHERE is_expired(query, cached_at)').rowcount
+
+
+class SQLiteStore:
+    """Таблица search_cache через storage.Storage; процессы одного узла делят файл БД"""
+
+    name = 'sqlite'
+
+    def __init__(self, storage):
+        self.storage = storage
+        self.errors = 0
+
+    async def get(self, key):
+        try:
+            return await self.storage.read(_disk_get, key)
+        except (sqlite3.Error, ValueError) as e:
+            self.errors += 1
+            logger.error(f"Cache read error: {e}")
+            return None, None
+
+    def set(self, key, data):
+        self.storage.submit(_disk_set, key, orjson.dumps(data), datetime.now().isoformat())
+
+    async def evict(self):
+        try:
+            return await self.storage.write(_disk_evict)
+        except (sqlite3.Error, ValueError) as e:
+            self.errors += 1
+            logger.error(f"Cache eviction error: {e}")
+            return 0
+
+    async def close(self):
+        """Соединения закрывает сам Storage"""
+
+    def stats(self):
+        return {'backend': self.name, 'errors': self.errors}
+
+
+# === RESP ===
+
+def encode_command(*args):
+    """Команда RESP: массив bulk-строк"""
+    parts = [b'*%d\r\n' % len(args)]
+    for arg in args:
+        if isinstance(arg, str):
+            arg = arg.encode()
+        elif isinstance(arg, int):
+            arg = b'%d' % arg
+        parts.append(b'$%d\r\n%s\r\n' % (len(arg), arg))
+    return b''.join(parts)
+
+
+async def read_reply(reader):
+    """Один ответ RESP; ошибка возвращается как StoreError, чтобы не сбить конвейер"""
+    line = await reader.readuntil(b'\r\n')
+    kind, rest = line[:1], line[1:-2]
+    if kind == b'+':
+        return rest.decode()
+    if kind == b'-':
+        return StoreError(rest.decode())
+    if kind == b':':
+        return int(rest)
+    if kind == b'$':
+        size = int(rest)
+        if size < 0:
+            return None
+        return (await reader.readexactly(size + 2))[:-2]
+    if kind == b'*':
+        count = int(rest)
+        return None if count < 0 else [await read_reply(reader) for _ in range(count)]
+    raise StoreError(f"Bad RESP reply: {line[:64]!r}")
+
+
+class NetworkStore:
+    """Клиент RESP: GET / SET PX / DEL поверх одного соединения с конвейером"""
+
+    name = 'network'
+
+    def __init__(self, url, timeout=STORE_TIMEOUT, prefix=KEY_PREFIX):
+        parts = urlsplit(url)
+        self.host = parts.hostname or '127.0.0.1'
+        self.port = parts.port or 6379
+        self.password = parts.password
+        self.db = int(parts.path.strip('/') or 0)
+        self.timeout = timeout
+        self.prefix = prefix
+
+        self._reader_task = None
+        self._writer = None
+        self._pending = deque()  # futures в порядке отправки команд
+        self._connect_lock = None
+        self._tasks = set()      # фоновые SET
+        self._retry_at = 0.0
+
+        self.connects = 0
+        self.errors = 0
+
+    # === СОЕДИНЕНИЕ ===
+
+    async def _connect(self):
+        if self._connect_lock is None:
+            self._connect_lock = asyncio.Lock()
+        async with self._connect_lock:
+            if self._writer is not None:
+                return
+            if time.monotonic() < self._retry_at:
+                raise ConnectionError("cache store unavailable")
+            try:
+                reader, writer = await asyncio.wait_for(asyncio.open_connection(self.host, self.port), self.timeout)
+            except (OSError, asyncio.TimeoutError):
+                self._retry_at = time.monotonic() + RECONNECT_DELAY
+                raise
+            self._writer = writer
+            self._reader_task = asyncio.ensure_future(self._read_loop(reader, writer))
+            self.connects += 1
+            handshake = []
+            if self.password:
+                handshake.append(self._send('AUTH', self.password))
+            if self.db:
+                handshake.append(self._send('SELECT', self.db))
+            for reply in await asyncio.wait_for(asyncio.gather(*handshake), self.timeout):
+                if isinstance(reply, StoreError):
+                    self._drop(writer, reply)
+                    raise reply
+
+    async def _read_loop(self, reader, writer):
+        try:
+            while True:
+                reply = await read_reply(reader)
+                future = self._pending.popleft()
+                if not future.done():
+                    future.set_result(reply)
+        except (ConnectionError, OSError, EOFError, IndexError,
+                asyncio.IncompleteReadError, StoreError, ValueError) as e:
+            self._drop(writer, e)
+
+    def _drop(self, writer, error):
+        """Соединение потеряно: ждущие команды получают ошибку, следующая переподключится"""
+        if writer is not self._writer:
+            return
+        logger.warning(f"Cache store {self.host}:{self.port} disconnected: {error!r}")
+        self._writer = None
+        writer.close()
+        while self._pending:
+            future = self._pending.popleft()
+            if not future.done():
+                future.set_exception(ConnectionError(f"cache store disconnected: {error!r}"))
+
+    def _send(self, *args):
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append(future)
+        self._writer.write(encode_command(*args))
+        return future
+
+    async def _call(self, *args):
+        if self._writer is None:
+            await self._connect()
+        reply = await asyncio.wait_for(self._send(*args), self.timeout)
+        if isinstance(reply, StoreError):
+            raise reply
+        return reply
+
+    # === ПУБЛИЧНЫЙ API ===
+
+    async def get(self, key):
+        try:
+            raw = await self._call('GET', self.prefix + key)
+        except (ConnectionError, OSError, asyncio.TimeoutError, StoreError) as e:
+            self.errors += 1
+            logger.error(f"Cache read error: {e!r}")
+            return None, None
+        if raw is None:
+            return None, None
+        # Значение: "<cached_at>|<orjson>"
+        cached_at, _, payload = raw.partition(b'|')
+        try:
+            return orjson.loads(payload), float(cached_at) + ttl_for(key)
+        except ValueError as e:
+            self.errors += 1
+            logger.error(f"Cache read error: {e}")
+            return None, None
+
+    def set(self, key, data):
+        """Запись в фоне: ответ хранилища разбирает цикл чтения, обработчик его не ждёт"""
+        value = b'%.3f|' % time.time() + orjson.dumps(data)
+        ttl_ms = (ttl_for(key) + STALE_GRACE) * 1000
+        task = asyncio.ensure_future(self._call('SET', self.prefix + key, value, 'PX', ttl_ms))
+        self._tasks.add(task)
+        task.add_done_callback(self._set_done)
+
+    def _set_done(self, task):
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            self.errors += 1
+            logger.error(f"Cache write error: {task.exception()!r}")
+
+    async def delete(self, key):
+        return await self._call('DEL', self.prefix + key)
+
+    async def evict(self):
+        """Записи истекают в самом хранилище (SET ... PX)"""
+        return 0
+
+    async def close(self):
+        if self._tasks:
+            await asyncio.wait(self._tasks, timeout=self.timeout)
+        if self._writer is not None:
+            writer, self._writer = self._writer, None
+            writer.close()
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+
+    def stats(self):
+        return {
+            'backend': self.name,
+            'address': f"{self.host}:{self.port}/{self.db}",
+            'connected': self._writer is not None,
+            'connects': self.connects,
+            'pending': len(self._pending),
+            'errors': self.errors,
+        }
+
+
+def open_store(storage, url=CACHE_URL):
+    """Хранилище второго уровня по CACHE_URL"""
+    if url.startswith(('redis://', 'resp://')):
+        logger.info(f"💾 Кэш ответов TMDB: {urlsplit(url).hostname}:{urlsplit(url).port or 6379}")
+        return NetworkStore(url)
+    return SQLiteStore(storage)
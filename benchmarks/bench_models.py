@@ -0,0 +1,94 @@
+"""
+Бенчмарк компактных моделей (models.Movie) против словарей TMDB
+
+Детали фильма берутся из фейкового TMDB (credits, similar, keywords), как их
+возвращает API. Сравниваются: память на N закэшированных ответов, размер
+JSON на диске, время «карточки» — чтение из кэша (память или диск) и
+форматирование текста.
+
+Запуск:
+    python benchmarks/bench_models.py --movies 2000
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+
+import orjson
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_tmdb import route  # noqa: E402
+from models import OVERVIEW_LIMIT, Movie  # noqa: E402
+
+
+def card_from_dict(movie):
+    """Карточка, как её собирал бот до моделей"""
+    title = movie.get('title') or movie.get('name', 'Без названия')
+    year = movie.get('release_date', movie.get('first_air_date', ''))[:4] if movie.get('release_date') else '—'
+    overview = movie.get('overview', 'Описание отсутствует')
+    return (f"🎬 <b>{title}</b>\n\n📅 Год: {year}\n⭐ Рейтинг: {movie.get('vote_average', 0):.1f}/10\n\n"
+            f"📖 <b>Описание:</b>\n{overview[:300]}{'...' if len(overview) > 300 else ''}")
+
+
+def card_from_model(movie):
+    overview = movie.overview or 'Описание отсутствует'
+    return (f"🎬 <b>{movie.title}</b>\n\n📅 Год: {movie.year}\n⭐ Рейтинг: {movie.vote_average:.1f}/10\n\n"
+            f"📖 <b>Описание:</b>\n{overview[:OVERVIEW_LIMIT]}"
+            f"{'...' if len(overview) > OVERVIEW_LIMIT else ''}")
+
+
+def details(movie_id):
+    return route(f'/movie/{movie_id}', {'append_to_response': ['credits,similar,keywords']})
+
+
+def measure_memory(build, count):
+    tracemalloc.start()
+    kept = [build(details(i)) for i in range(1, count + 1)]
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return size
+
+
+def per_call(fn, items, rounds=3):
+    best = float('inf')
+    for _ in range(rounds):
+        started = time.perf_counter()
+        for item in items:
+            fn(item)
+        best = min(best, (time.perf_counter() - started) / len(items))
+    return best * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--movies', type=int, default=2000)
+    args = parser.parse_args()
+
+    raw_memory = measure_memory(lambda data: data, args.movies)
+    slim_memory = measure_memory(Movie.from_tmdb, args.movies)
+    print(f"Память на {args.movies} ответов: dict {raw_memory / 2**20:.1f} МБ, "
+          f"Movie {slim_memory / 2**20:.1f} МБ ({raw_memory / slim_memory:.0f}x)")
+
+    sample = [details(i) for i in range(1, 201)]
+    raw_json = [json.dumps(data, ensure_ascii=False) for data in sample]
+    slim_json = [orjson.dumps(Movie.from_tmdb(data)) for data in sample]
+    raw_size = sum(len(text.encode()) for text in raw_json) / len(sample)
+    slim_size = sum(map(len, slim_json)) / len(sample)
+    print(f"JSON на диске: dict {raw_size / 1024:.1f} КБ, Movie {slim_size / 1024:.1f} КБ на фильм")
+
+    models = [Movie.from_tmdb(data) for data in sample]
+    print(f"{'карточка, мкс':<28}{'dict':>8}{'Movie':>8}")
+    print(f"{'из памяти':<28}{per_call(card_from_dict, sample):>8.1f}{per_call(card_from_model, models):>8.1f}")
+    print(f"{'с диска (JSON -> карточка)':<28}"
+          f"{per_call(lambda text: card_from_dict(json.loads(text)), raw_json):>8.1f}"
+          f"{per_call(lambda raw: card_from_model(Movie.load(orjson.loads(raw))), slim_json):>8.1f}")
+    print(f"{'разбор ответа TMDB':<28}{'':>8}{per_call(Movie.from_tmdb, sample):>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
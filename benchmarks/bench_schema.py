@@ -0,0 +1,112 @@
+"""
+Нагрузочный тест схемы: запросы одного пользователя при росте таблиц
+
+Таблицы watchlist и watched заполняются синтетическими строками
+(миллионы записей), после каждого шага замеряется среднее время
+первой страницы get_watchlist_page, get_user_stats и повторного add_to_watchlist.
+
+  v1     — схема без индексов (как до миграции 2)
+  latest — схема после всех миграций
+
+Запуск:
+    python benchmarks/bench_schema.py --rows 2000000 --users 50000
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import storage  # noqa: E402
+
+
+def fill(conn, table, start, count, users, seed):
+    """Добавить count синтетических строк"""
+    rnd = random.Random(seed)
+    base = datetime(2020, 1, 1)
+    time_column = 'added_at' if table == 'watchlist' else 'watched_at'
+    extra = '' if table == 'watchlist' else ', rating'
+    extra_value = '' if table == 'watchlist' else ', 0'
+
+    rows = (
+        (i % users, start + i, f'Фильм {start + i}', (base + timedelta(seconds=rnd.randrange(10 ** 8))).isoformat())
+        for i in range(count)
+    )
+    conn.execute('BEGIN')
+    conn.executemany(
+        f'INSERT INTO {table} (user_id, movie_id, title, {time_column}{extra}) VALUES (?, ?, ?, ?{extra_value})',
+        rows
+    )
+    conn.execute('COMMIT')
+
+
+def count_stats(conn, user_id):
+    """get_user_stats до миграции 4: COUNT(*) по обеим таблицам"""
+    watchlist_count = conn.execute('SELECT COUNT(*) FROM watchlist WHERE user_id=?', (user_id,)).fetchone()[0]
+    watched_count = conn.execute('SELECT COUNT(*) FROM watched WHERE user_id=?', (user_id,)).fetchone()[0]
+    return watchlist_count, watched_count
+
+
+def timed(fn, samples):
+    started = time.perf_counter()
+    for args in samples:
+        fn(*args)
+    return (time.perf_counter() - started) / len(samples) * 1000
+
+
+def run(schema, steps, users, queries):
+    print(f"\n=== Схема: {schema} ===")
+    print(f"{'строк':>12} | {'watchlist, мс':>14} | {'stats, мс':>10} | {'add (дубль), мс':>16}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, 'load.db')
+        storage.init_db(db, target=1 if schema == 'v1' else None)
+        conn = storage.connect(db)
+
+        total = 0
+        for step in steps:
+            count = step - total
+            fill(conn, 'watchlist', total, count, users, seed=step)
+            fill(conn, 'watched', total, count, users, seed=step + 1)
+            total = step
+            conn.execute('PRAGMA optimize')
+
+            rnd = random.Random(0)
+            samples = [(conn, rnd.randrange(users)) for _ in range(queries)]
+            watchlist_ms = timed(storage._get_watchlist_page, samples)
+            # latest: счётчики в users (fill их не обновляет — на время чтения это не влияет)
+            stats_ms = timed(count_stats if schema == 'v1' else storage._get_user_stats, samples)
+
+            if schema == 'v1':
+                add_ms = '—'
+            else:
+                # Повторное добавление существующей пары: ON CONFLICT DO NOTHING
+                dupes = [(conn, i % users, i, 'x') for i in rnd.sample(range(total), queries)]
+                add_ms = f"{timed(storage._add_to_watchlist, dupes):.3f}"
+
+            print(f"{total:>12,} | {watchlist_ms:>14.3f} | {stats_ms:>10.3f} | {add_ms:>16}")
+
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=2_000_000, help='итоговое число строк в каждой таблице')
+    parser.add_argument('--users', type=int, default=50_000, help='число пользователей')
+    parser.add_argument('--queries', type=int, default=200, help='запросов на замер')
+    parser.add_argument('--skip-v1', action='store_true', help='не гонять схему без индексов (она медленная)')
+    args = parser.parse_args()
+
+    steps = sorted({min(args.rows, n) for n in (10_000, 100_000, 1_000_000, args.rows)})
+    if not args.skip_v1:
+        run('v1', steps, args.users, max(args.queries // 10, 5))
+    run('latest', steps, args.users, args.queries)
+
+
+if __name__ == '__main__':
+    main()
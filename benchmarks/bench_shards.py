@@ -0,0 +1,170 @@
+"""
+Бенчмарк режима нескольких процессов (shards.Shards)
+
+Приёмник раскладывает синтетические обновления (сценарий loadtest) по N
+воркерам; каждый воркер — настоящий Application с обработчиками bot.py
+против фейковых Telegram и TMDB. Кэш ответов TMDB общий: таблица SQLite
+или фейковое сетевое хранилище (--store network). Для каждого N —
+свежая БД; считается пропускная способность и нарушения порядка
+обновлений одного пользователя (должно быть 0).
+
+Масштабирование близко к линейному, пока воркеров не больше ядер:
+на машине с одним ядром N > 1 ускорения не даст.
+
+Запуск:
+    python benchmarks/bench_shards.py --workers 1,2,4 --updates 4000
+    python benchmarks/bench_shards.py --workers 4 --store network
+"""
+
+import os
+import sys
+import time
+import types
+import signal
+import asyncio
+import logging
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_store import FakeStoreServer  # noqa: E402
+from benchmarks.fake_telegram import FakeTelegramServer  # noqa: E402
+from benchmarks.fake_tmdb import FakeTMDBServer  # noqa: E402
+from benchmarks.loadtest import TOKEN, Scenario  # noqa: E402
+
+
+# === ВОРКЕР ===
+
+def bench_worker(index, count, updates, reports, results, telegram_url):
+    """Как shards.worker_main, но Application смотрит в фейковый Telegram"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    import bot
+    from shards import UserQueues, consume
+    from telegram import Update
+    from telegram.ext import Application, TypeHandler
+    from botapi import POOL_SIZE, InstrumentedRequest
+
+    logging.getLogger().setLevel(logging.ERROR)
+    bot.features.load()
+    application = (
+        Application.builder()
+        .token(TOKEN)
+        .base_url(telegram_url)
+        .base_file_url(telegram_url)
+        .request(InstrumentedRequest(connection_pool_size=POOL_SIZE))
+        .build()
+    )
+    last_seen = {}  # user_id -> последний update_id
+    violations = 0
+
+    async def check_order(update, context):
+        nonlocal violations
+        user_id = update.effective_user.id
+        if last_seen.get(user_id, -1) > update.update_id:
+            violations += 1
+        last_seen[user_id] = update.update_id
+
+    application.add_handler(TypeHandler(Update, check_order), group=-1)
+    bot.register_handlers(application)
+
+    async def main():
+        users = UserQueues(application)
+        async with application:
+            await application.start()
+            results.put(('ready', index))
+            await consume(updates, users)
+            await users.join()
+            await application.stop()
+        await bot.post_shutdown(application)
+        results.put(('done', index, users.processed, users.waited, violations))
+
+    asyncio.run(main())
+
+
+# === ПРОГОН ===
+
+def run(count, args, servers):
+    workdir = tempfile.mkdtemp(prefix='moviebot-shards-')
+    os.environ.update({
+        'DB_PATH': os.path.join(workdir, 'movies.db'),
+        'FEATURES_DIR': os.path.join(workdir, 'features'),
+    })
+    from storage import init_db
+    from shards import Shards
+    from telegram import Update
+    import callbacks
+
+    init_db(os.environ['DB_PATH'])
+    scenario = Scenario(types.SimpleNamespace(callbacks=callbacks), args.users, args.seed,
+                        servers['telegram'].photo_messages)
+    batch = [Update.de_json(scenario.next()[1], None) for _ in range(args.updates)]
+
+    shards = Shards(count, target=bench_worker, args=(servers['results'], servers['telegram'].base_url))
+    shards.start()
+    for _ in range(count):
+        servers['results'].get()
+
+    started = time.perf_counter()
+    for update in batch:
+        shards.put(update)
+    for updates in shards.queues:
+        updates.put(None)
+    done = [servers['results'].get() for _ in range(count)]
+    elapsed = time.perf_counter() - started
+    for process in shards.processes:
+        process.join()
+
+    processed = sum(item[2] for item in done)
+    return {
+        'workers': count,
+        'updates': processed,
+        'elapsed': round(elapsed, 2),
+        'throughput': round(processed / elapsed, 1),
+        'per_worker': [item[2] for item in sorted(done, key=lambda item: item[1])],
+        'waited': sum(item[3] for item in done),
+        'order_violations': sum(item[4] for item in done),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', default='1,2,4', help='числа воркеров через запятую')
+    parser.add_argument('--updates', type=int, default=3000)
+    parser.add_argument('--users', type=int, default=300)
+    parser.add_argument('--store', choices=('sqlite', 'network'), default='sqlite')
+    parser.add_argument('--tmdb-delay', type=float, default=0.05)
+    parser.add_argument('--tg-delay', type=float, default=0.02)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    import multiprocessing
+    with FakeTMDBServer(delay=args.tmdb_delay, jitter=0.5, seed=args.seed) as tmdb_server, \
+            FakeTelegramServer(delay=args.tg_delay, jitter=0.5, seed=args.seed) as tg_server, \
+            FakeStoreServer() as store_server:
+        os.environ.update({
+            'BOT_TOKEN': TOKEN,
+            'TMDB_BASE_URL': tmdb_server.base_url,
+            'TMDB_RATE': '1000',
+            'TMDB_BURST': '1000',
+            'USER_BURST': '1000',
+            'CACHE_URL': store_server.url if args.store == 'network' else '',
+        })
+        os.environ.pop('WEBHOOK_URL', None)
+        servers = {'telegram': tg_server, 'results': multiprocessing.get_context('spawn').Queue()}
+
+        print(f"Ядер: {os.cpu_count()}, кэш TMDB: {args.store}, обновлений: {args.updates}")
+        print(f"{'воркеров':>9}{'обн./с':>10}{'время, с':>10}{'ускорение':>11}{'ждали своей очереди':>21}"
+              f"{'нарушений порядка':>19}")
+        base = None
+        for count in (int(n) for n in args.workers.split(',')):
+            result = run(count, args, servers)
+            base = base or result['throughput']
+            print(f"{count:>9}{result['throughput']:>10}{result['elapsed']:>10}"
+                  f"{result['throughput'] / base:>10.2f}x{result['waited']:>21}{result['order_violations']:>19}")
+        if args.store == 'network':
+            print(f"Хранилище: {len(store_server.data)} ключей, {store_server.commands} команд")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+"""
+Микробенчмарк слоя хранения: операций в секунду до и после
+
+  before — старые хелперы: sqlite3.connect на каждый вызов, журнал rollback
+  after  — storage.Storage: WAL, долгоживущие соединения, один писатель
+
+Нагрузка — смесь из обработчиков бота: add_to_watchlist, add_to_watched,
+get_watchlist(_page), get_user_stats для случайных пользователей, выполняемая
+конкурентно из цикла событий.
+
+Запуск:
+    python benchmarks/bench_storage.py --ops 4000 --users 200
+"""
+
+import os
+import sys
+import time
+import random
+import sqlite3
+import asyncio
+import argparse
+import tempfile
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage import Storage, init_db  # noqa: E402
+
+
+# === СТАРАЯ РЕАЛИЗАЦИЯ (копия хелперов из bot.py до перехода на Storage) ===
+
+def old_add_to_watchlist(db, user_id, movie_id, title):
+    conn = sqlite3.connect(db)
+    c = conn.cursor()
+    c.execute('SELECT * FROM watchlist WHERE user_id=? AND movie_id=?', (user_id, movie_id))
+    if c.fetchone():
+        conn.close()
+        return False
+    c.execute('INSERT INTO watchlist (user_id, movie_id, title, added_at) VALUES (?, ?, ?, ?)',
+              (user_id, movie_id, title, datetime.now().isoformat()))
+    conn.commit()
+    conn.close()
+    return True
+
+
+def old_add_to_watched(db, user_id, movie_id, title, rating=0):
+    conn = sqlite3.connect(db)
+    c = conn.cursor()
+    c.execute('SELECT * FROM watched WHERE user_id=? AND movie_id=?', (user_id, movie_id))
+    if c.fetchone():
+        conn.close()
+        return False
+    c.execute('INSERT INTO watched (user_id, movie_id, title, rating, watched_at) VALUES (?, ?, ?, ?, ?)',
+              (user_id, movie_id, title, rating, datetime.now().isoformat()))
+    c.execute('DELETE FROM watchlist WHERE user_id=? AND movie_id=?', (user_id, movie_id))
+    c.execute('UPDATE users SET total_watched = total_watched + 1 WHERE user_id=?', (user_id,))
+    conn.commit()
+    conn.close()
+    return True
+
+
+def old_get_watchlist(db, user_id):
+    conn = sqlite3.connect(db)
+    rows = conn.execute('SELECT movie_id, title FROM watchlist WHERE user_id=? ORDER BY added_at DESC',
+                        (user_id,)).fetchall()
+    conn.close()
+    return rows
+
+
+def old_get_user_stats(db, user_id):
+    conn = sqlite3.connect(db)
+    watchlist_count = conn.execute('SELECT COUNT(*) FROM watchlist WHERE user_id=?', (user_id,)).fetchone()[0]
+    watched_count = conn.execute('SELECT COUNT(*) FROM watched WHERE user_id=?', (user_id,)).fetchone()[0]
+    conn.close()
+    return watchlist_count, watched_count
+
+
+def workload(ops, users, seed=42):
+    """Детерминированная смесь операций"""
+    rnd = random.Random(seed)
+    for _ in range(ops):
+        user_id = rnd.randrange(users)
+        movie_id = rnd.randrange(5000)
+        kind = rnd.choices(('watchlist', 'watched', 'list', 'stats'), weights=(3, 1, 3, 3))[0]
+        yield kind, user_id, movie_id
+
+
+async def run_before(db, ops, users):
+    async def one(kind, user_id, movie_id):
+        # Так это выглядело в обработчиках: синхронный вызов внутри async
+        if kind == 'watchlist':
+            old_add_to_watchlist(db, user_id, movie_id, f'Фильм {movie_id}')
+        elif kind == 'watched':
+            old_add_to_watched(db, user_id, movie_id, f'Фильм {movie_id}')
+        elif kind == 'list':
+            old_get_watchlist(db, user_id)
+        else:
+            old_get_user_stats(db, user_id)
+
+    await asyncio.gather(*(one(*op) for op in workload(ops, users)))
+
+
+async def run_after(db, ops, users):
+    storage = Storage(db)
+
+    async def one(kind, user_id, movie_id):
+        if kind == 'watchlist':
+            await storage.add_to_watchlist(user_id, movie_id, f'Фильм {movie_id}')
+        elif kind == 'watched':
+            await storage.add_to_watched(user_id, movie_id, f'Фильм {movie_id}')
+        elif kind == 'list':
+            await storage.get_watchlist_page(user_id)
+        else:
+            await storage.get_user_stats(user_id)
+
+    try:
+        await asyncio.gather(*(one(*op) for op in workload(ops, users)))
+    finally:
+        await storage.close()
+    print(f"        писатель: {storage.writes} записей в {storage.batches} транзакциях")
+
+
+def measure(name, runner, ops, users):
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, 'bench.db')
+        init_db(db)
+        if name == 'before':
+            # Старая база работала в журнале rollback
+            conn = sqlite3.connect(db)
+            conn.execute('PRAGMA journal_mode=DELETE')
+            conn.close()
+
+        started = time.perf_counter()
+        asyncio.run(runner(db, ops, users))
+        elapsed = time.perf_counter() - started
+
+    print(f"{name:>7}: {ops} операций за {elapsed:.2f} с — {ops / elapsed:.0f} оп/с")
+    return ops / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--ops', type=int, default=4000, help='число операций')
+    parser.add_argument('--users', type=int, default=200, help='число пользователей')
+    args = parser.parse_args()
+
+    before = measure('before', run_before, args.ops, args.users)
+    after = measure('after', run_after, args.ops, args.users)
+    print(f"Ускорение: x{after / before:.1f}")
+
+
+if __name__ == '__main__':
+    main()
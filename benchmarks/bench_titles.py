@@ -0,0 +1,102 @@
+"""
+Бенчмарк локального поиска по названиям (titles.TitleIndex)
+
+Индекс заполняется синтетическими названиями (кириллица и латиница),
+затем замеряется время поиска для точных запросов, опечаток и
+транслитерации — и доля запросов, на которые ответ найден локально.
+
+Запуск:
+    python benchmarks/bench_titles.py --titles 100000 --queries 500
+"""
+
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage import Storage, init_db  # noqa: E402
+from titles import STRONG_MATCH, TitleIndex, normalize, transliterate  # noqa: E402
+
+SYLLABLES = ['ка', 'ро', 'ми', 'на', 'ле', 'то', 'ра', 'ве', 'до', 'зо', 'лу', 'ни', 'ше', 'ты', 'бра', 'гра',
+             'ст', 'кро', 'пле', 'тё', 'ан', 'ор', 'ель', 'ия', 'ус']
+COMMON = ['тёмный', 'последний', 'король', 'ночь', 'город', 'история', 'игра', 'война', 'любовь', 'время']
+
+
+def word(rnd):
+    return ''.join(rnd.choice(SYLLABLES) for _ in range(rnd.randint(2, 4)))
+
+
+def make_items(count, seed):
+    """Названия из 1–3 слов: редкие «слова» из слогов и частые обычные"""
+    rnd = random.Random(seed)
+    items = []
+    for i in range(1, count + 1):
+        words = [rnd.choice(COMMON) if rnd.random() < 0.2 else word(rnd) for _ in range(rnd.randint(1, 3))]
+        title = ' '.join(words).capitalize()
+        latin = transliterate(normalize(title))
+        items.append({'id': i, 'media_type': 'movie', 'title': title, 'original_title': latin,
+                      'release_date': '2001-01-01', 'vote_average': 7.0, 'popularity': rnd.random() * 100})
+    return items
+
+
+def typo(text, rnd):
+    i = rnd.randrange(1, len(text) - 1)
+    return text[:i] + text[i + 1:]
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] * 1000
+
+
+async def run(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, 'titles.db')
+        init_db(db)
+        storage = Storage(db)
+        index = TitleIndex(storage)
+        items = make_items(args.titles, args.seed)
+
+        started = time.perf_counter()
+        for i in range(0, len(items), 1000):
+            index.add_many(items[i:i + 1000])
+        await storage.write(lambda conn: None)  # дождаться очереди писателя
+        print(f"Индекс: {args.titles:,} названий за {time.perf_counter() - started:.1f} с")
+
+        rnd = random.Random(args.seed + 1)
+        kinds = {
+            'точный': lambda item: item['title'],
+            'регистр': lambda item: item['title'].upper(),
+            'опечатка': lambda item: typo(item['title'], rnd),
+            'латиница': lambda item: item['original_title'],
+        }
+        print(f"{'запрос':<10}{'p50, мс':>9}{'p99, мс':>9}{'найден':>9}")
+        for name, make_query in kinds.items():
+            latencies, found = [], 0
+            for item in rnd.sample(items, args.queries):
+                started = time.perf_counter()
+                hits = await index.search(make_query(item))
+                latencies.append(time.perf_counter() - started)
+                # Синтетические названия повторяются — засчитываем совпадение названия, а не id
+                if any(hit_item['title'] == item['title'] and score >= STRONG_MATCH for score, _, hit_item in hits):
+                    found += 1
+            print(f"{name:<10}{percentile(latencies, 0.5):>9.2f}{percentile(latencies, 0.99):>9.2f}"
+                  f"{found / args.queries:>9.0%}")
+        await storage.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--titles', type=int, default=100_000)
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=1)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
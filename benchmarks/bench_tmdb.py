@@ -0,0 +1,100 @@
+"""
+Бенчмарк: сколько апдейтов в секунду обрабатывает бот при медленном TMDB
+
+Каждый апдейт — это поиск из text_handler (фильмы + актёры).
+Сравниваются:
+  sync  — старый путь: requests.get прямо внутри async-обработчика
+  async — TMDBClient с общим пулом соединений
+
+Затем «толпа»: --herd одновременных кликов по одной карточке фильма
+(get_movie_details) — сколько запросов дошло до TMDB.
+
+Запуск:
+    python benchmarks/bench_tmdb.py --updates 200 --delay 0.2
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tmdb import TMDBClient  # noqa: E402
+from benchmarks.fake_tmdb import FakeTMDBServer  # noqa: E402
+
+
+def blocking_search(base_url, path, query):
+    """Старая реализация: синхронный requests.get"""
+    params = {'api_key': 'bench', 'query': query, 'language': 'ru-RU', 'page': 1}
+    response = requests.get(f"{base_url}{path}", params=params, timeout=10)
+    return response.json().get('results', [])[:5] if response.status_code == 200 else []
+
+
+async def run_sync(base_url, updates):
+    async def handle(i):
+        blocking_search(base_url, '/search/multi', f'query {i}')
+        blocking_search(base_url, '/search/person', f'query {i}')
+
+    await asyncio.gather(*(handle(i) for i in range(updates)))
+
+
+async def run_async(base_url, updates, concurrency):
+    client = TMDBClient(api_key='bench', base_url=base_url,
+                        max_connections=concurrency, max_concurrency=concurrency)
+
+    async def handle(i):
+        await client.search_movie(f'query {i}')
+        await client.search_actor(f'query {i}')
+
+    try:
+        await asyncio.gather(*(handle(i) for i in range(updates)))
+    finally:
+        await client.close()
+
+
+async def run_herd(base_url, clicks, movies=3):
+    """Одновременные клики по нескольким популярным карточкам -> присоединённых запросов"""
+    client = TMDBClient(api_key='bench', base_url=base_url)
+    try:
+        await asyncio.gather(*(client.get_movie_details(550 + i % movies) for i in range(clicks)))
+        return client.coalesced
+    finally:
+        await client.close()
+
+
+def measure(name, coro_factory, updates):
+    started = time.perf_counter()
+    asyncio.run(coro_factory())
+    elapsed = time.perf_counter() - started
+    print(f"{name:>6}: {updates} апдейтов за {elapsed:.2f} с — {updates / elapsed:.1f} апдейтов/с")
+    return updates / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--updates', type=int, default=200, help='число апдейтов')
+    parser.add_argument('--delay', type=float, default=0.2, help='задержка ответа TMDB, с')
+    parser.add_argument('--concurrency', type=int, default=64, help='лимит одновременных запросов')
+    parser.add_argument('--sync-updates', type=int, default=20, help='апдейтов для sync (он очень медленный)')
+    parser.add_argument('--herd', type=int, default=500, help='одновременных кликов по одним карточкам')
+    args = parser.parse_args()
+
+    with FakeTMDBServer(delay=args.delay) as server:
+        print(f"Фейковый TMDB: {server.base_url}, задержка {args.delay * 1000:.0f} мс")
+        sync_rate = measure('sync', lambda: run_sync(server.base_url, args.sync_updates), args.sync_updates)
+        async_rate = measure('async', lambda: run_async(server.base_url, args.updates, args.concurrency), args.updates)
+        print(f"Ускорение: x{async_rate / sync_rate:.1f}")
+
+        before = server.requests
+        started = time.perf_counter()
+        coalesced = asyncio.run(run_herd(server.base_url, args.herd))
+        print(f" herd: {args.herd} кликов за {time.perf_counter() - started:.2f} с — "
+              f"запросов к TMDB {server.requests - before}, присоединено {coalesced}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+"""
+Минимальный HTTP/1.1-сервер для фейковых API в бенчмарках
+✅ keep-alive, чтение тела по Content-Length
+✅ Задержка ответа с разбросом
+✅ Доля ответов с ошибкой (5xx) и с ограничением частоты (429)
+✅ Работает в отдельном потоке со своим циклом событий
+"""
+
+import json
+import random
+import asyncio
+import threading
+from urllib.parse import urlsplit, parse_qs
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 429: 'Too Many Requests',
+           500: 'Internal Server Error', 503: 'Service Unavailable'}
+
+
+class FakeHTTPServer:
+    """Базовый фейковый сервер на 127.0.0.1 в фоновом потоке; ответ — в respond()"""
+
+    def __init__(self, delay=0.0, jitter=0.0, error_rate=0.0, throttle_rate=0.0,
+                 host='127.0.0.1', port=0, seed=None):
+        self.delay = delay
+        self.jitter = jitter                # ± к задержке, доля от delay
+        self.error_rate = error_rate        # доля ответов 500
+        self.throttle_rate = throttle_rate  # доля ответов 429
+        self.host = host
+        self.port = port
+        self.requests = 0
+        self.errors = 0
+        self.throttled = 0
+        self._random = random.Random(seed)
+        self._loop = None
+        self._server = None
+        self._thread = None
+        self._ready = threading.Event()
+
+    # === ПЕРЕОПРЕДЕЛЯЕТСЯ ===
+
+    def respond(self, method, path, params, body):
+        """(status, данные JSON) для запроса"""
+        raise NotImplementedError
+
+    def error_response(self, status):
+        """Тело ответа с ошибкой"""
+        return {'status_code': status}
+
+    # === HTTP ===
+
+    def _latency(self):
+        if not self.delay:
+            return 0.0
+        spread = self.delay * self.jitter
+        return max(0.0, self.delay + self._random.uniform(-spread, spread))
+
+    async def _read_request(self, reader):
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+        length = 0
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            if name.strip().lower() == 'content-length':
+                length = int(value.strip())
+        body = await reader.readexactly(length) if length else b''
+        method, target, _version = request_line.decode().split(' ', 2)
+        return method, target, body
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                method, target, body = request
+                url = urlsplit(target)
+                self.requests += 1
+
+                latency = self._latency()
+                if latency:
+                    await asyncio.sleep(latency)
+
+                headers = {}
+                roll = self._random.random()
+                if roll < self.error_rate:
+                    self.errors += 1
+                    status, data = 500, self.error_response(500)
+                elif roll < self.error_rate + self.throttle_rate:
+                    self.throttled += 1
+                    status, data = 429, self.error_response(429)
+                    headers['Retry-After'] = '1'
+                else:
+                    status, data = self.respond(method, url.path, parse_qs(url.query), body)
+
+                payload = json.dumps(data, ensure_ascii=False).encode()
+                head = (f"HTTP/1.1 {status} {REASONS.get(status, 'Unknown')}\r\n"
+                        f"Content-Type: application/json;charset=utf-8\r\n"
+                        f"Content-Length: {len(payload)}\r\n"
+                        f"Connection: keep-alive\r\n")
+                head += ''.join(f"{name}: {value}\r\n" for name, value in headers.items())
+                writer.write(head.encode() + b"\r\n" + payload)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    # === ЗАПУСК ===
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._server = self._loop.run_until_complete(
+            asyncio.start_server(self._handle, self.host, self.port, backlog=1024)
+        )
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._ready.set()
+        self._loop.run_forever()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        return self
+
+    async def _shutdown(self):
+        self._server.close()
+        tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._loop.stop()
+
+    def stop(self):
+        if self._loop is not None:
+            asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop)
+            self._thread.join(timeout=5)
+            self._loop.close()
+            self._loop = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,163 @@
+"""
+Фейковое сетевое хранилище (подмножество RESP/Redis) для бенчмарков
+✅ PING, AUTH, SELECT, GET, SET [EX|PX], DEL, DBSIZE, FLUSHDB
+✅ Истечение ключей по PX/EX при чтении
+✅ Конвейер команд: ответы в порядке запросов
+✅ Работает в отдельном потоке со своим циклом событий (как fake_http)
+
+Запуск отдельно (для бота с CACHE_URL=redis://127.0.0.1:6390/0):
+    python benchmarks/fake_store.py --port 6390
+"""
+
+import time
+import asyncio
+import argparse
+import threading
+
+
+def _bulk(value):
+    return b'$-1\r\n' if value is None else b'$%d\r\n%s\r\n' % (len(value), value)
+
+
+class FakeStoreServer:
+    """RESP-сервер на 127.0.0.1 в фоновом потоке; данные — словарь в памяти"""
+
+    def __init__(self, host='127.0.0.1', port=0, password=None):
+        self.host = host
+        self.port = port
+        self.password = password
+        self.data = {}     # ключ -> (значение, истекает в monotonic или None)
+        self.commands = 0
+        self.connections = 0
+        self._loop = None
+        self._server = None
+        self._thread = None
+        self._ready = threading.Event()
+
+    @property
+    def url(self):
+        return f"redis://{f':{self.password}@' if self.password else ''}{self.host}:{self.port}/0"
+
+    # === КОМАНДЫ ===
+
+    def _get(self, key):
+        entry = self.data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self.data[key]
+            return None
+        return value
+
+    def execute(self, args, session):
+        name = args[0].upper()
+        if name != b'AUTH' and self.password and not session['auth']:
+            return b'-NOAUTH Authentication required.\r\n'
+        if name == b'PING':
+            return b'+PONG\r\n'
+        if name == b'AUTH':
+            session['auth'] = args[-1].decode() == self.password
+            return b'+OK\r\n' if session['auth'] else b'-WRONGPASS invalid password\r\n'
+        if name == b'FLUSHDB':
+            self.data.clear()
+            return b'+OK\r\n'
+        if name == b'SELECT':
+            return b'+OK\r\n'
+        if name == b'GET':
+            return _bulk(self._get(args[1]))
+        if name == b'SET':
+            expires_at = None
+            options = [arg.upper() for arg in args[3:]]
+            for unit, scale in ((b'PX', 1000), (b'EX', 1)):
+                if unit in options:
+                    expires_at = time.monotonic() + int(args[3 + options.index(unit) + 1]) / scale
+            self.data[args[1]] = (args[2], expires_at)
+            return b'+OK\r\n'
+        if name == b'DEL':
+            return b':%d\r\n' % sum(self.data.pop(key, None) is not None for key in args[1:])
+        if name == b'DBSIZE':
+            return b':%d\r\n' % len(self.data)
+        return b'-ERR unknown command\r\n'
+
+    # === СЕРВЕР ===
+
+    async def _read_command(self, reader):
+        line = await reader.readuntil(b'\r\n')
+        if not line.startswith(b'*'):
+            return line.split()  # inline-команда (redis-cli, telnet)
+        args = []
+        for _ in range(int(line[1:-2])):
+            size = int((await reader.readuntil(b'\r\n'))[1:-2])
+            args.append((await reader.readexactly(size + 2))[:-2])
+        return args
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        session = {'auth': False}
+        try:
+            while True:
+                args = await self._read_command(reader)
+                if not args:
+                    continue
+                self.commands += 1
+                writer.write(self.execute(args, session))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._server = self._loop.run_until_complete(
+            asyncio.start_server(self._handle, self.host, self.port, backlog=1024)
+        )
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._ready.set()
+        self._loop.run_forever()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        return self
+
+    async def _shutdown(self):
+        self._server.close()
+        tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._loop.stop()
+
+    def stop(self):
+        if self._loop is not None:
+            asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop)
+            self._thread.join(timeout=5)
+            self._loop.close()
+            self._loop = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=6390)
+    parser.add_argument('--password')
+    args = parser.parse_args()
+    server = FakeStoreServer(port=args.port, password=args.password).start()
+    print(f"Хранилище: {server.url} (Ctrl+C — остановить)")
+    try:
+        server._thread.join()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
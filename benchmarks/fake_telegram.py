@@ -0,0 +1,78 @@
+"""
+Локальный фейковый Telegram Bot API для бенчмарков
+✅ /bot<token>/<method> с ответами в формате Bot API
+✅ sendMessage, editMessageText, editMessageCaption, sendPhoto, answerCallbackQuery, deleteMessage, ...
+✅ Как настоящий Bot API: у фото нельзя править текст, у текста — подпись (400 Bad Request)
+✅ Задержка и доля ошибок — как у fake_http.FakeHTTPServer
+✅ Счётчик вызовов по методам
+"""
+
+import time
+import itertools
+from collections import Counter
+from urllib.parse import parse_qs
+
+from benchmarks.fake_http import FakeHTTPServer
+
+BOT_USER = {'id': 1, 'is_bot': True, 'first_name': 'Movie Bot', 'username': 'movie_bench_bot'}
+
+
+class FakeTelegramServer(FakeHTTPServer):
+    """Фейковый api.telegram.org на 127.0.0.1"""
+
+    def __init__(self, delay=0.03, **kwargs):
+        super().__init__(delay=delay, **kwargs)
+        self.calls = Counter()
+        self._message_ids = itertools.count(1000)
+        self._file_ids = itertools.count(1)
+        self.photo_messages = set()  # message_id фото: отправленные и объявленные сценарием
+        self.rejected = Counter()
+
+    @property
+    def base_url(self):
+        """Для Application.builder().base_url(...) — токен допишет PTB"""
+        return f"http://{self.host}:{self.port}/bot"
+
+    def _message(self, fields, **extra):
+        chat_id = int(fields.get('chat_id', 1))
+        message = {
+            'message_id': int(fields.get('message_id') or next(self._message_ids)),
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+            'from': BOT_USER,
+        }
+        message.update(extra)
+        return message
+
+    def respond(self, method, path, params, body):
+        api_method = path.rsplit('/', 1)[-1]
+        self.calls[api_method] += 1
+        fields = {k: v[0] for k, v in parse_qs(body.decode()).items()} if body else {}
+
+        if api_method == 'getMe':
+            result = BOT_USER
+        elif api_method in ('editMessageText', 'editMessageCaption') and \
+                (int(fields.get('message_id', 0)) in self.photo_messages) != (api_method == 'editMessageCaption'):
+            self.rejected[api_method] += 1
+            what = 'text' if api_method == 'editMessageText' else 'caption'
+            return 400, {'ok': False, 'error_code': 400,
+                         'description': f'Bad Request: there is no {what} in the message to edit'}
+        elif api_method in ('sendMessage', 'editMessageText'):
+            result = self._message(fields, text=fields.get('text', ''))
+        elif api_method in ('sendPhoto', 'editMessageCaption'):
+            file_id = f"fake-file-{next(self._file_ids)}"
+            result = self._message(fields, caption=fields.get('caption', ''), photo=[
+                {'file_id': file_id, 'file_unique_id': file_id, 'width': 500, 'height': 750}
+            ])
+            self.photo_messages.add(result['message_id'])
+        elif api_method in ('answerCallbackQuery', 'deleteMessage', 'setWebhook', 'deleteWebhook'):
+            result = True
+        else:
+            return 404, {'ok': False, 'error_code': 404, 'description': 'Not Found: method not found'}
+        return 200, {'ok': True, 'result': result}
+
+    def error_response(self, status):
+        if status == 429:
+            return {'ok': False, 'error_code': 429, 'description': 'Too Many Requests: retry after 1',
+                    'parameters': {'retry_after': 1}}
+        return {'ok': False, 'error_code': status, 'description': 'Internal Server Error'}
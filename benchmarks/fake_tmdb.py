@@ -0,0 +1,98 @@
+"""
+Локальный фейковый сервер TMDB для бенчмарков
+✅ HTTP/1.1 с keep-alive
+✅ Настраиваемая задержка ответа
+✅ Доля ошибок 5xx и ответов 429 (см. fake_http.FakeHTTPServer)
+✅ Работает в отдельном потоке со своим циклом событий
+"""
+
+from benchmarks.fake_http import FakeHTTPServer
+
+GENRES = (28, 12, 16, 35, 80, 99, 18, 10751, 14, 36, 27, 10402, 9648, 10749, 878, 53)
+
+
+def _movie(movie_id):
+    return {
+        'id': movie_id,
+        'title': f'Фильм {movie_id}',
+        'media_type': 'movie',
+        'release_date': '2010-07-16',
+        'vote_average': 7.5,
+        'popularity': 100.0 - movie_id % 100,
+        'overview': 'Описание фильма ' * 20,
+        'poster_path': f'/poster{movie_id}.jpg',
+        'genre_ids': [GENRES[movie_id % len(GENRES)], GENRES[movie_id // 7 % len(GENRES)]],
+    }
+
+
+def _person(person_id):
+    return {
+        'id': person_id,
+        'name': f'Актёр {person_id}',
+        'media_type': 'person',
+        'known_for_department': 'Acting',
+        'birthday': '1974-11-11',
+        'place_of_birth': 'Лос-Анджелес, Калифорния, США',
+        'biography': 'Биография актёра ' * 20,
+        'profile_path': f'/profile{person_id}.jpg',
+        'known_for': [_movie(person_id * 10 + i) for i in range(2)],
+    }
+
+
+def route(path, params):
+    """Ответ фейкового TMDB для пути и параметров"""
+    parts = [p for p in path.split('/') if p]
+    if parts[:1] == ['3']:
+        parts = parts[1:]  # версия API
+
+    if parts[:2] == ['search', 'multi']:
+        seed = sum(map(ord, params.get('query', [''])[0]))
+        return {'results': [_movie(seed + i) for i in range(4)] + [_person(seed)]}
+    if parts[:2] == ['search', 'movie']:
+        query = params.get('query', [''])[0]
+        if query.startswith('?'):
+            return {'results': []}  # «неизвестное» название для проверки отчёта импорта
+        return {'results': [_movie(sum(map(ord, query)) + i) for i in range(3)]}
+    if len(parts) == 2 and parts[0] == 'find':
+        return {'movie_results': [_movie(int(parts[1].lstrip('t') or 0))], 'person_results': []}
+    if parts[:2] == ['search', 'person']:
+        seed = sum(map(ord, params.get('query', [''])[0]))
+        return {'results': [_person(seed + i) for i in range(3)]}
+    if parts[:2] in (['movie', 'popular'], ['movie', 'top_rated'], ['trending', 'movie']):
+        return {'results': [_movie(i) for i in range(1, 21)]}
+    if len(parts) == 3 and parts[0] == 'person' and parts[2] == 'movie_credits':
+        return {'cast': [_movie(int(parts[1]) * 100 + i) for i in range(60)]}
+    if len(parts) == 3 and parts[0] in ('movie', 'tv') and parts[2] == 'recommendations':
+        return {'results': [_movie(int(parts[1]) * 7 + i) for i in range(1, 21)]}
+    if len(parts) == 2 and parts[0] == 'person':
+        person = _person(int(parts[1]))
+        if 'movie_credits' in params.get('append_to_response', [''])[0]:
+            person['movie_credits'] = route(f'/person/{parts[1]}/movie_credits', {})
+        return person
+    if len(parts) == 2 and parts[0] in ('movie', 'tv'):
+        movie = _movie(int(parts[1]))
+        movie['credits'] = {'cast': [_person(i) for i in range(20)], 'crew': []}
+        movie['similar'] = {'results': [_movie(int(parts[1]) + i) for i in range(1, 21)]}
+        movie['keywords'] = {'keywords': [{'id': int(parts[1]) % 50 + i, 'name': f'kw{i}'} for i in range(5)]}
+        return movie
+    return None
+
+
+class FakeTMDBServer(FakeHTTPServer):
+    """Фейковый TMDB на 127.0.0.1 в фоновом потоке"""
+
+    def __init__(self, delay=0.2, **kwargs):
+        super().__init__(delay=delay, **kwargs)
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self.port}/3"
+
+    def respond(self, method, path, params, body):
+        data = route(path, params)
+        if data is None:
+            return 404, {'status_code': 34, 'status_message': 'The resource you requested could not be found.'}
+        return 200, data
+
+    def error_response(self, status):
+        return {'status_code': 25 if status == 429 else 11, 'status_message': 'fake error'}
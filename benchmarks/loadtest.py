@@ -0,0 +1,316 @@
+"""
+Нагрузочный тест бота целиком, без сети
+✅ Фейковые Telegram Bot API и TMDB с задержкой и долей ошибок
+✅ Настоящий Application с обработчиками из bot.py
+✅ Синтетические пользователи: /start, кнопки меню и карточек, поиск текстом
+✅ Кнопки карточек нажимаются и на фото (карточка с постером): правка текста фото — ошибка 400
+✅ Открытая модель нагрузки: обновления приходят с заданной частотой
+✅ Отчёт: пропускная способность, p50/p95/p99 по типам, конкуренция за SQLite
+
+Запуск:
+    python benchmarks/loadtest.py --rate 100 --duration 20 --users 300
+    python benchmarks/loadtest.py --tmdb-delay 0.3 --tmdb-errors 0.05 --json result.json
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import logging
+import argparse
+import itertools
+import tempfile
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_tmdb import FakeTMDBServer  # noqa: E402
+from benchmarks.fake_telegram import FakeTelegramServer  # noqa: E402
+
+TOKEN = '123456:bench'
+QUERIES = ['Матрица', 'Интерстеллар', 'Начало', 'Дюна', 'Брат', 'Форрест Гамп', 'Бойцовский клуб',
+           'Ди Каприо', 'Киану Ривз', 'Нолан', 'Шрек', 'Титаник', 'Аватар', 'Джокер', 'Гарри Поттер']
+
+
+# === СЦЕНАРИЙ ===
+
+def zipf_choice(rng, n, s=1.1):
+    """Популярные id/запросы встречаются намного чаще (как в реальном трафике)"""
+    weights = [1 / (i + 1) ** s for i in range(n)]
+    return rng.choices(range(1, n + 1), weights=weights)[0]
+
+
+class Scenario:
+    """Генератор синтетических обновлений"""
+
+    def __init__(self, bot_module, users, seed=1, photo_messages=None):
+        self.callbacks = bot_module.callbacks
+        self.users = users
+        self.rng = random.Random(seed)
+        self.update_ids = itertools.count(1)
+        self.message_ids = itertools.count(10 ** 9)  # не пересекаются с id сообщений фейкового Telegram
+        self.photo_messages = photo_messages if photo_messages is not None else set()
+        # (вес, тип, фабрика callback_data или None для сообщений)
+        self.actions = [
+            (8, 'start', None),
+            (18, 'search', None),
+            (10, 'popular', lambda: 'popular'),
+            (5, 'top_rated', lambda: 'top_rated'),
+            (12, 'smart_rec', lambda: 'smart_rec'),
+            (20, 'show_movie', lambda: self.callbacks.show(zipf_choice(self.rng, 500))),
+            (5, 'show_actor', lambda: self.callbacks.show_actor(zipf_choice(self.rng, 50))),
+            (4, 'similar', lambda: self.callbacks.similar(zipf_choice(self.rng, 500))),
+            (5, 'add_watch', lambda: self._add(self.callbacks.add_watch)),
+            (5, 'add_watched', lambda: self._add(self.callbacks.add_watched)),
+            (5, 'my_watchlist', lambda: 'my_watchlist'),
+            (3, 'my_watched', lambda: 'my_watched'),
+            (2, 'stats', lambda: 'stats'),
+            (2, 'back', lambda: 'back'),
+        ]
+        self.weights = [a[0] for a in self.actions]
+        self.on_card = {'similar', 'add_watch', 'add_watched'}  # кнопки карточки фильма — под фото
+
+    def _add(self, factory):
+        movie_id = zipf_choice(self.rng, 500)
+        return factory(movie_id, f'Фильм {movie_id}')
+
+    def _user(self, user_id):
+        return {'id': user_id, 'is_bot': False, 'first_name': f'User{user_id}', 'username': f'user{user_id}'}
+
+    def _message(self, user_id, text=None, photo=False):
+        message = {
+            'message_id': next(self.message_ids),
+            'date': int(time.time()),
+            'chat': {'id': user_id, 'type': 'private'},
+            'from': self._user(user_id),
+        }
+        if photo:
+            message['caption'] = text
+            message['photo'] = [{'file_id': 'card', 'file_unique_id': 'card', 'width': 500, 'height': 750}]
+            self.photo_messages.add(message['message_id'])
+        elif text is not None:
+            message['text'] = text
+            if text.startswith('/'):
+                message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text)}]
+        return message
+
+    def next(self):
+        """(тип, dict обновления)"""
+        user_id = 10_000 + self.rng.randrange(self.users)
+        _, kind, data = self.rng.choices(self.actions, weights=self.weights)[0]
+        update = {'update_id': next(self.update_ids)}
+        if kind == 'start':
+            update['message'] = self._message(user_id, '/start')
+        elif kind == 'search':
+            update['message'] = self._message(user_id, QUERIES[zipf_choice(self.rng, len(QUERIES)) - 1])
+        else:
+            update['callback_query'] = {
+                'id': str(update['update_id']),
+                'from': self._user(user_id),
+                'chat_instance': str(user_id),
+                'message': self._message(user_id, 'card', photo=True) if kind in self.on_card
+                else self._message(user_id, 'menu'),
+                'data': data(),
+            }
+        return kind, update
+
+
+# === ОТЧЁТ ===
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def summarize(values):
+    values = sorted(values)
+    return {
+        'count': len(values),
+        'p50': round(percentile(values, 0.50) * 1000, 1),
+        'p95': round(percentile(values, 0.95) * 1000, 1),
+        'p99': round(percentile(values, 0.99) * 1000, 1),
+        'max': round(values[-1] * 1000, 1) if values else 0.0,
+    }
+
+
+class LockErrors(logging.Handler):
+    """Считает сообщения SQLite о блокировках"""
+
+    def __init__(self):
+        super().__init__(logging.ERROR)
+        self.count = 0
+
+    def emit(self, record):
+        if 'locked' in record.getMessage():
+            self.count += 1
+
+
+# === ПРОГОН ===
+
+async def run(args, bot, tmdb_server, tg_server):
+    from telegram import Update
+    from telegram.ext import Application
+    from botapi import InstrumentedRequest, POOL_SIZE
+    import storage
+
+    bot.init_db(bot.DB_PATH)
+    bot.features.load()
+
+    application = (
+        Application.builder()
+        .token(TOKEN)
+        .base_url(tg_server.base_url)
+        .base_file_url(tg_server.base_url)
+        .request(InstrumentedRequest(connection_pool_size=POOL_SIZE))
+        .build()
+    )
+    bot.register_handlers(application)
+
+    handler_errors = defaultdict(int)
+
+    async def on_error(update, context):
+        handler_errors[type(context.error).__name__] += 1
+
+    application.add_error_handler(on_error)
+    await application.initialize()
+
+    if not args.no_warm:
+        await bot.warm.refresh()
+
+    scenario = Scenario(bot, args.users, args.seed, tg_server.photo_messages)
+    latencies = defaultdict(list)
+    max_queue = 0
+    running = True
+
+    async def sample_queue():
+        nonlocal max_queue
+        while running:
+            max_queue = max(max_queue, bot.storage.queue_depth())
+            await asyncio.sleep(0.02)
+
+    async def one(kind, data):
+        update = Update.de_json(data, application.bot)
+        started = time.perf_counter()
+        await application.process_update(update)
+        latencies[kind].append(time.perf_counter() - started)
+
+    total = int(args.rate * args.duration)
+    loop = asyncio.get_running_loop()
+    sampler = asyncio.ensure_future(sample_queue())
+    tasks = []
+    started = loop.time()
+    for i in range(total):
+        delay = started + i / args.rate - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        kind, data = scenario.next()
+        tasks.append(asyncio.ensure_future(one(kind, data)))
+    send_elapsed = loop.time() - started
+    await asyncio.gather(*tasks)
+    elapsed = loop.time() - started
+    running = False
+    await sampler
+
+    await application.shutdown()
+    await bot.post_shutdown(application)
+
+    everything = [v for values in latencies.values() for v in values]
+    return {
+        'config': vars(args),
+        'updates': total,
+        'elapsed': round(elapsed, 2),
+        'offered_rate': round(total / send_elapsed, 1) if send_elapsed else 0.0,
+        'throughput': round(total / elapsed, 1),
+        'latency_ms': summarize(everything),
+        'by_kind': {kind: summarize(values) for kind, values in sorted(latencies.items())},
+        'handler_errors': dict(handler_errors),
+        'db': {
+            'write_queue_wait_ms': {k: round(v * 1000, 2) if k != 'count' else v
+                                    for k, v in storage.DB_QUEUE_WAIT.snapshot().items()},
+            'avg_batch': storage.DB_BATCH.snapshot()['avg'],
+            'max_queue_depth': max_queue,
+            'batches': bot.storage.batches,
+            'writes': bot.storage.writes,
+            'lock_errors': args.lock_errors.count,
+        },
+        'tmdb': {'requests': tmdb_server.requests, 'errors': tmdb_server.errors,
+                 'throttled': tmdb_server.throttled, 'cache': bot.response_cache.stats()},
+        'telegram': dict(tg_server.calls),
+        'telegram_rejected': dict(tg_server.rejected),
+    }
+
+
+def print_report(result):
+    print(f"\nОбновлений: {result['updates']} за {result['elapsed']} с "
+          f"(подано {result['offered_rate']}/с) — {result['throughput']} обновлений/с")
+    total = result['latency_ms']
+    print(f"Задержка, мс: p50 {total['p50']}  p95 {total['p95']}  p99 {total['p99']}  max {total['max']}\n")
+    print(f"{'тип':<14}{'кол-во':>8}{'p50':>9}{'p95':>9}{'p99':>9}")
+    for kind, stats in result['by_kind'].items():
+        print(f"{kind:<14}{stats['count']:>8}{stats['p50']:>9}{stats['p95']:>9}{stats['p99']:>9}")
+    db = result['db']
+    print(f"\nSQLite: ожидание записи p50 {db['write_queue_wait_ms']['p50']} мс, "
+          f"p99 {db['write_queue_wait_ms']['p99']} мс; пакет в среднем {db['avg_batch']}; "
+          f"макс. очередь {db['max_queue_depth']}; блокировок {db['lock_errors']}")
+    tmdb = result['tmdb']
+    print(f"TMDB: {tmdb['requests']} запросов (ошибок {tmdb['errors']}, 429: {tmdb['throttled']}), "
+          f"кэш hit rate {tmdb['cache']['hit_rate']}")
+    print(f"Telegram: {sum(result['telegram'].values())} вызовов {result['telegram']}")
+    if result['telegram_rejected']:
+        print(f"Отклонено Telegram (400): {result['telegram_rejected']}")
+    if result['handler_errors']:
+        print(f"Исключения в обработчиках: {result['handler_errors']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rate', type=float, default=50, help='обновлений в секунду')
+    parser.add_argument('--duration', type=float, default=10, help='секунд нагрузки')
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--tmdb-delay', type=float, default=0.08)
+    parser.add_argument('--tmdb-errors', type=float, default=0.0, help='доля ответов 500')
+    parser.add_argument('--tmdb-429', type=float, default=0.0, help='доля ответов 429')
+    parser.add_argument('--tg-delay', type=float, default=0.03)
+    parser.add_argument('--tg-errors', type=float, default=0.0)
+    parser.add_argument('--tmdb-rate', type=float, default=40, help='лимит запросов к TMDB в секунду')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--no-warm', action='store_true', help='без прогрева популярных списков')
+    parser.add_argument('--json', help='сохранить результат в файл')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='moviebot-load-')
+    with FakeTMDBServer(delay=args.tmdb_delay, jitter=0.5, error_rate=args.tmdb_errors,
+                        throttle_rate=args.tmdb_429, seed=args.seed) as tmdb_server, \
+            FakeTelegramServer(delay=args.tg_delay, jitter=0.5, error_rate=args.tg_errors,
+                               seed=args.seed) as tg_server:
+        os.environ.update({
+            'BOT_TOKEN': TOKEN,
+            'DB_PATH': os.path.join(workdir, 'movies.db'),
+            'FEATURES_DIR': os.path.join(workdir, 'features'),
+            'TMDB_BASE_URL': tmdb_server.base_url,
+            'TMDB_RATE': str(args.tmdb_rate),
+            'TMDB_BURST': str(int(args.tmdb_rate)),
+        })
+        os.environ.pop('WEBHOOK_URL', None)
+        import bot
+
+        # Логи бота не печатаем, но считаем ошибки блокировок SQLite
+        args.lock_errors = LockErrors()
+        root = logging.getLogger()
+        root.handlers = [args.lock_errors]
+        root.setLevel(logging.ERROR)
+
+        result = asyncio.run(run(args, bot, tmdb_server, tg_server))
+
+    del result['config']['lock_errors']
+    print_report(result)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
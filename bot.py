@@ -6,19 +6,42 @@
 ✅ Умные рекомендации
 ✅ Постеры фильмов
 ✅ Статистика и достижения
+✅ Несколько процессов-обработчиков (SHARDS), шардирование по пользователю
 """
 
 import os
+import html
+import time
+import asyncio
 import logging
-import sqlite3
-import random
-import requests
-from datetime import datetime
+import functools
+import tempfile
 from threading import Thread
-from flask import Flask
+from flask import Flask, Response, jsonify
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import BadRequest, TelegramError
 from telegram.ext import Application, CommandHandler, CallbackQueryHandler, MessageHandler, filters, ContextTypes
 
+import callbacks
+import metrics
+import render
+from backends import open_store
+from botapi import PHOTO_SENDS, POOL_SIZE, InstrumentedRequest
+from cache import EVICT_INTERVAL, FileIdCache, ResponseCache
+from callbacks import Action
+from importer import IMPORT_MAX_BYTES, SPOOL_SIZE, default_list_for, export_file, import_file
+from router import CallbackRouter
+from prefetch import WARM_FOLLOW_DELAY, WARM_INTERVAL, WarmLists
+from ratelimit import TMDBBudget, UserLimiter, cache_only
+from recommend import Recommender
+from search import SEARCH_LATENCY, search_all
+from shards import REPORT_INTERVAL, SHARDS, Shards, is_primary, reporter, work
+from similarity import FeatureIndex
+from storage import DB_PATH, PAGE_SIZE, Storage, init_db
+from titles import TitleIndex
+from tmdb import TMDBClient
+from webhook import WEBHOOK_URL, WebhookApp, serve
+
 # Настройка логирования
 logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
@@ -27,7 +50,6 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 TOKEN = os.environ.get('BOT_TOKEN')
-TMDB_API_KEY = "8265bd1679663a7ea12ac168da84d2e8"  # Бесплатный ключ для демо
 
 if not TOKEN:
     logger.error("❌ BOT_TOKEN not found!")
@@ -36,198 +58,114 @@ if not TOKEN:
 # Flask для Render (чтобы не засыпал)
 app = Flask(__name__)
 
+# Воркеры в режиме SHARDS > 1 (создаются в main() приёмника)
+cluster = None
+
 @app.route('/')
 def home():
     return "🎬 Movie Bot is running!"
 
 @app.route('/health')
 def health():
-    return "OK", 200
+    # Всегда 200: перезапуск не поможет, если лежит TMDB, — бот отвечает из кэша
+    if cluster is not None:
+        # Приёмник в TMDB не ходит — состояние собирается из отчётов воркеров
+        return jsonify(cluster.health()), 200
+    degraded = tmdb.breakers.open_endpoints()
+    return jsonify({
+        'status': 'degraded' if degraded else 'ok',
+        'tmdb_unavailable': degraded,
+        'tmdb': tmdb.breakers.stats(),
+    }), 200
+
+@app.route('/stats')
+def stats():
+    if cluster is not None:
+        # Приёмник сам не обрабатывает обновления — его кэши пусты
+        return jsonify({'shards': cluster.stats(), 'webhook': webhook.stats()})
+    return jsonify({
+        'cache': response_cache.stats(),
+        'tmdb': tmdb.stats(),
+        'file_ids': file_ids.stats(),
+        'cards': renderer.stats(),
+        'user_stats': storage.stats_cache(),
+        'search_latency': SEARCH_LATENCY.snapshot(),
+        'callbacks': router.stats(),
+        'warm': warm.stats(),
+        'recommender': recommender.stats(),
+        'features': features.stats(),
+        'titles': titles.stats(),
+        'webhook': webhook.stats(),
+        'ratelimit': {
+            'tmdb': tmdb_budget.stats(),
+            'users': user_limiter.stats(),
+            'cache_only_misses': tmdb.cache_only_misses,
+        }
+    })
 
 
-# === БАЗА ДАННЫХ ===
+@app.route('/metrics')
+def prometheus_metrics():
+    if cluster is not None:
+        text = metrics.merge({'receiver': metrics.render(), **cluster.metrics_texts()})
+    else:
+        text = metrics.render()
+    return Response(text, mimetype='text/plain; version=0.0.4')
 
-def init_db():
-    """Инициализация базы данных"""
-    conn = sqlite3.connect('movies.db')
-    c = conn.cursor()
-    
-    # Таблица пользователей
-    c.execute('''CREATE TABLE IF NOT EXISTS users
-                 (user_id INTEGER PRIMARY KEY,
-                  username TEXT,
-                  created_at TEXT,
-                  total_watched INTEGER DEFAULT 0)''')
-    
-    # Таблица watchlist
-    c.execute('''CREATE TABLE IF NOT EXISTS watchlist
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                  user_id INTEGER,
-                  movie_id INTEGER,
-                  title TEXT,
-                  added_at TEXT)''')
-    
-    # Таблица просмотренных
-    c.execute('''CREATE TABLE IF NOT EXISTS watched
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                  user_id INTEGER,
-                  movie_id INTEGER,
-                  title TEXT,
-                  rating INTEGER,
-                  watched_at TEXT)''')
-    
-    # Таблица поиска (кэш)
-    c.execute('''CREATE TABLE IF NOT EXISTS search_cache
-                 (query TEXT PRIMARY KEY,
-                  results TEXT,
-                  cached_at TEXT)''')
-    
-    conn.commit()
-    conn.close()
-    logger.info("✅ База данных инициализирована")
 
+# Режим webhook: один ASGI-сервер для Telegram и маршрутов выше
+webhook = WebhookApp(app)
 
-# === API TMDB ===
 
-def search_movie(query):
-    """Поиск фильма через TMDB API"""
-    try:
-        url = f"https://api.themoviedb.org/3/search/multi"
-        params = {
-            'api_key': TMDB_API_KEY,
-            'query': query,
-            'language': 'ru-RU',
-            'page': 1
-        }
-        response = requests.get(url, params=params, timeout=10)
-        
-        if response.status_code == 200:
-            data = response.json()
-            return data.get('results', [])[:5]  # Топ-5 результатов
-        return []
-    except Exception as e:
-        logger.error(f"Search error: {e}")
-        return []
+# === МЕТРИКИ ===
+# Счётчики, которые уже ведут кэши и лимитеры, читаются только при запросе /metrics
 
+HANDLER_LATENCY = metrics.histogram('handler_seconds', 'Время обработки обновления', ('handler',))
 
-def search_actor(query):
-    """Поиск актёра через TMDB API"""
-    try:
-        url = f"https://api.themoviedb.org/3/search/person"
-        params = {
-            'api_key': TMDB_API_KEY,
-            'query': query,
-            'language': 'ru-RU',
-            'page': 1
-        }
-        response = requests.get(url, params=params, timeout=10)
-        
-        if response.status_code == 200:
-            data = response.json()
-            return data.get('results', [])[:5]  # Топ-5 актёров
-        return []
-    except Exception as e:
-        logger.error(f"Actor search error: {e}")
-        return []
+metrics.GaugeCallback('tmdb_cache_lookups_total', 'Обращения к кэшу ответов TMDB', lambda: {
+    'memory_hit': response_cache.memory_hits,
+    'disk_hit': response_cache.disk_hits,
+    'stale_hit': response_cache.stale_hits,
+    'miss': response_cache.misses,
+}, ('result',), kind='counter')
+metrics.GaugeCallback('tmdb_breaker_open', 'Размыкатель эндпоинта TMDB открыт (1) или закрыт (0)',
+                      lambda: {name: int(name in tmdb.breakers.open_endpoints()) for name in tmdb.breakers.stats()},
+                      ('endpoint',))
+metrics.GaugeCallback('tmdb_budget_queue', 'Запросы к TMDB, ждущие лимита', lambda: tmdb_budget.waiting)
+metrics.GaugeCallback('tmdb_budget_rejected_total', 'Запросы к TMDB, отклонённые лимитом',
+                      lambda: tmdb_budget.rejected, kind='counter')
+metrics.GaugeCallback('users_throttled_total', 'Обновления сверх лимита пользователя',
+                      lambda: user_limiter.throttled, kind='counter')
+metrics.GaugeCallback('db_write_queue_depth', 'Записи в очереди писателя SQLite', lambda: storage.queue_depth())
+metrics.GaugeCallback('update_queue_depth', 'Обновления в очереди приложения (webhook)',
+                      lambda: webhook.stats()['queue'])
+metrics.GaugeCallback('shard_updates_forwarded_total', 'Обновления, переданные воркерам (SHARDS > 1)',
+                      lambda: {str(i): n for i, n in enumerate(cluster.forwarded)} if cluster else {},
+                      ('worker',), kind='counter')
 
 
-def get_actor_movies(actor_id):
-    """Получить фильмы актёра"""
-    try:
-        url = f"https://api.themoviedb.org/3/person/{actor_id}/movie_credits"
-        params = {
-            'api_key': TMDB_API_KEY,
-            'language': 'ru-RU'
-        }
-        response = requests.get(url, params=params, timeout=10)
-        
-        if response.status_code == 200:
-            data = response.json()
-            cast = data.get('cast', [])
-            # Сортируем по популярности
-            cast.sort(key=lambda x: x.get('popularity', 0), reverse=True)
-            return cast[:10]  # Топ-10 фильмов
-        return []
-    except Exception as e:
-        logger.error(f"Actor movies error: {e}")
-        return []
+# === БАЗА ДАННЫХ ===
 
+# Долгоживущие соединения, WAL и один писатель с группировкой транзакций
+storage = Storage(DB_PATH)
 
-def get_actor_details(actor_id):
-    """Получить детали актёра"""
-    try:
-        url = f"https://api.themoviedb.org/3/person/{actor_id}"
-        params = {
-            'api_key': TMDB_API_KEY,
-            'language': 'ru-RU'
-        }
-        response = requests.get(url, params=params, timeout=10)
-        
-        if response.status_code == 200:
-            return response.json()
-        return None
-    except Exception as e:
-        logger.error(f"Actor details error: {e}")
-        return None
 
+# === API TMDB ===
 
-def get_movie_details(movie_id, media_type='movie'):
-    """Получить детали фильма"""
-    try:
-        url = f"https://api.themoviedb.org/3/{media_type}/{movie_id}"
-        params = {
-            'api_key': TMDB_API_KEY,
-            'language': 'ru-RU',
-            'append_to_response': 'credits,similar'
-        }
-        response = requests.get(url, params=params, timeout=10)
-        
-        if response.status_code == 200:
-            return response.json()
-        return None
-    except Exception as e:
-        logger.error(f"Details error: {e}")
-        return None
+# Кэш ответов: LRU в памяти + общее хранилище (таблица search_cache или сеть, см. CACHE_URL)
+response_cache = ResponseCache(open_store(storage))
 
+# Общий лимит запросов к TMDB (очередь, пауза по 429)
+tmdb_budget = TMDBBudget()
 
-def get_popular_movies():
-    """Получить популярные фильмы"""
-    try:
-        url = "https://api.themoviedb.org/3/movie/popular"
-        params = {
-            'api_key': TMDB_API_KEY,
-            'language': 'ru-RU',
-            'page': 1
-        }
-        response = requests.get(url, params=params, timeout=10)
-        
-        if response.status_code == 200:
-            data = response.json()
-            return data.get('results', [])[:10]
-        return []
-    except Exception as e:
-        logger.error(f"Popular error: {e}")
-        return []
+# Общий асинхронный клиент (один пул соединений на весь бот)
+tmdb = TMDBClient(cache=response_cache, budget=tmdb_budget)
 
+# Бюджет обновлений на пользователя: сверх лимита — только из кэша
+user_limiter = UserLimiter()
+SLOW_DOWN_NOTICE = "⏳ Слишком часто! Показываю то, что есть в кэше"
+SLOW_DOWN_TEXT = "⏳ Слишком много запросов. Подождите пару секунд и повторите поиск."
 
-def get_top_rated_movies():
-    """Топ фильмов по рейтингу"""
-    try:
-        url = "https://api.themoviedb.org/3/movie/top_rated"
-        params = {
-            'api_key': TMDB_API_KEY,
-            'language': 'ru-RU',
-            'page': 1
-        }
-        response = requests.get(url, params=params, timeout=10)
-        
-        if response.status_code == 200:
-            data = response.json()
-            return data.get('results', [])[:10]
-        return []
-    except Exception as e:
-        logger.error(f"Top rated error: {e}")
-        return []
 
 
 def get_poster_url(poster_path):
@@ -237,175 +175,122 @@ def get_poster_url(poster_path):
     return None
 
 
-# === ФУНКЦИИ БД ===
+# === ПОСТЕРЫ В TELEGRAM ===
 
-def add_user(user_id, username):
-    """Добавить пользователя"""
-    conn = sqlite3.connect('movies.db')
-    c = conn.cursor()
-    c.execute('''INSERT OR IGNORE INTO users (user_id, username, created_at)
-                 VALUES (?, ?, ?)''', (user_id, username, datetime.now().isoformat()))
-    conn.commit()
-    conn.close()
+# poster_path/profile_path -> file_id, чтобы Telegram не скачивал картинку заново
+file_ids = FileIdCache(storage)
+# Ошибки Bot API о самом file_id (остальные BadRequest — о подписи/клавиатуре, file_id исправен)
+FILE_ID_ERRORS = ('file identifier', 'file reference', 'file_reference')
 
+# Популярное/топ/тренды в памяти, обновляются задачей JobQueue
+warm = WarmLists(tmdb, file_ids, get_poster_url)
 
-def add_to_watchlist(user_id, movie_id, title):
-    """Добавить в watchlist"""
-    conn = sqlite3.connect('movies.db')
-    c = conn.cursor()
-    
-    # Проверка дубликата
-    c.execute('SELECT * FROM watchlist WHERE user_id=? AND movie_id=?', (user_id, movie_id))
-    if c.fetchone():
-        conn.close()
-        return False
-    
-    c.execute('''INSERT INTO watchlist (user_id, movie_id, title, added_at)
-                 VALUES (?, ?, ?, ?)''', 
-              (user_id, movie_id, title, datetime.now().isoformat()))
-    conn.commit()
-    conn.close()
-    return True
+# Готовые карточки фильмов и актёров; сбрасываются, когда ответ TMDB обновился из сети
+renderer = render.Renderer()
+tmdb.refresh_observers.append(renderer.on_refresh)
 
 
-def add_to_watched(user_id, movie_id, title, rating=0):
-    """Добавить в просмотренные"""
-    conn = sqlite3.connect('movies.db')
-    c = conn.cursor()
-    
-    # Проверка дубликата
-    c.execute('SELECT * FROM watched WHERE user_id=? AND movie_id=?', (user_id, movie_id))
-    if c.fetchone():
-        conn.close()
+async def reply_with_photo(query, image_path, caption, reply_markup, use_file_id=True):
+    """Отправить карточку с картинкой вместо сообщения; True если получилось"""
+    if not image_path:
+        return False
+
+    file_id = await file_ids.get(image_path) if use_file_id else None
+    source = 'file_id' if file_id else 'url'
+    try:
+        sent = await query.message.reply_photo(
+            photo=file_id or get_poster_url(image_path),
+            caption=caption,
+            reply_markup=reply_markup,
+            parse_mode='HTML'
+        )
+    except BadRequest as e:
+        PHOTO_SENDS.labels(source, 'rejected').inc()
+        if file_id and any(marker in e.message.lower() for marker in FILE_ID_ERRORS):
+            # Telegram отверг сохранённый file_id — забываем и шлём по URL. Не через кэш:
+            # удаление с диска ещё в очереди писателя, и чтение вернуло бы тот же file_id
+            logger.warning(f"file_id rejected for {image_path}: {e}")
+            file_ids.invalidate(image_path)
+            return await reply_with_photo(query, image_path, caption, reply_markup, use_file_id=False)
+        logger.warning(f"Photo send error for {image_path}: {e}")
+        return False
+    except TelegramError as e:
+        PHOTO_SENDS.labels(source, 'error').inc()
+        logger.warning(f"Photo send error for {image_path}: {e}")
         return False
-    
-    c.execute('''INSERT INTO watched (user_id, movie_id, title, rating, watched_at)
-                 VALUES (?, ?, ?, ?, ?)''', 
-              (user_id, movie_id, title, rating, datetime.now().isoformat()))
-    
-    # Убрать из watchlist
-    c.execute('DELETE FROM watchlist WHERE user_id=? AND movie_id=?', (user_id, movie_id))
-    
-    # Обновить счётчик
-    c.execute('UPDATE users SET total_watched = total_watched + 1 WHERE user_id=?', (user_id,))
-    
-    conn.commit()
-    conn.close()
-    return True
 
+    PHOTO_SENDS.labels(source, 'ok').inc()
+    if not file_id and sent.photo:
+        file_ids.set(image_path, sent.photo[-1].file_id)
 
-def get_watchlist(user_id):
-    """Получить watchlist"""
-    conn = sqlite3.connect('movies.db')
-    c = conn.cursor()
-    c.execute('SELECT movie_id, title FROM watchlist WHERE user_id=? ORDER BY added_at DESC', (user_id,))
-    results = c.fetchall()
-    conn.close()
-    return results
+    try:
+        await query.message.delete()
+    except TelegramError as e:
+        logger.warning(f"Delete message error: {e}")
+    return True
 
 
-def get_watched(user_id):
-    """Получить просмотренные"""
-    conn = sqlite3.connect('movies.db')
-    c = conn.cursor()
-    c.execute('SELECT movie_id, title, rating FROM watched WHERE user_id=? ORDER BY watched_at DESC', (user_id,))
-    results = c.fetchall()
-    conn.close()
-    return results
+async def send_text(query, text, reply_markup=None):
+    """Текст вместо сообщения с кнопкой; карточку-фото текстом не отредактировать — новое сообщение"""
+    if not query.message.photo:
+        await query.edit_message_text(text, reply_markup=reply_markup, parse_mode='HTML')
+        return
+    await query.message.reply_text(text, reply_markup=reply_markup, parse_mode='HTML')
+    try:
+        await query.message.delete()
+    except TelegramError as e:
+        logger.warning(f"Delete message error: {e}")
 
 
-def get_user_stats(user_id):
-    """Статистика пользователя"""
-    conn = sqlite3.connect('movies.db')
-    c = conn.cursor()
-    
-    c.execute('SELECT COUNT(*) FROM watchlist WHERE user_id=?', (user_id,))
-    watchlist_count = c.fetchone()[0]
-    
-    c.execute('SELECT COUNT(*) FROM watched WHERE user_id=?', (user_id,))
-    watched_count = c.fetchone()[0]
-    
-    conn.close()
-    return watchlist_count, watched_count
+async def send_card(query, card):
+    """Готовая карточка (render.Card): с картинкой, если она есть, иначе текстом"""
+    if await reply_with_photo(query, card.photo, card.text, card.reply_markup):
+        return
+    await send_text(query, card.text, card.reply_markup)
 
 
-# === ФОРМАТИРОВАНИЕ ===
+# === УМНЫЕ РЕКОМЕНДАЦИИ ===
 
-def format_movie_card(movie, media_type='movie'):
-    """Форматирование карточки фильма"""
-    type_emoji = "🎬" if media_type == "movie" else "📺"
-    
-    title = movie.get('title') or movie.get('name', 'Без названия')
-    year = movie.get('release_date', movie.get('first_air_date', ''))[:4] if movie.get('release_date') or movie.get('first_air_date') else '—'
-    rating = movie.get('vote_average', 0)
-    overview = movie.get('overview', 'Описание отсутствует')
-    
-    message = f"{type_emoji} <b>{title}</b>\n\n"
-    message += f"📅 Год: {year}\n"
-    message += f"⭐ Рейтинг: {rating:.1f}/10\n\n"
-    message += f"📖 <b>Описание:</b>\n{overview[:300]}{'...' if len(overview) > 300 else ''}"
-    
-    return message
+async def popular_fallback():
+    """Популярное и тренды (из памяти, если прогреты)"""
+    return (warm.get('popular') or await tmdb.get_popular_movies()) + (warm.get('trending') or [])
 
 
-# === УМНЫЕ РЕКОМЕНДАЦИИ ===
+# Векторы жанров/ключевых слов/актёров всех фильмов, пришедших из TMDB
+features = FeatureIndex()
+tmdb.observers.append(features.add_many)
 
-def get_smart_recommendation(user_id):
-    """Умная рекомендация на основе истории"""
-    conn = sqlite3.connect('movies.db')
-    c = conn.cursor()
-    
-    # Получить последние просмотренные
-    c.execute('SELECT movie_id FROM watched WHERE user_id=? ORDER BY watched_at DESC LIMIT 3', (user_id,))
-    recent = [row[0] for row in c.fetchall()]
-    conn.close()
-    
-    if recent:
-        # Получить похожие на последний просмотренный
-        movie_id = recent[0]
-        similar = get_movie_details(movie_id)
-        if similar and 'similar' in similar:
-            similar_movies = similar['similar'].get('results', [])
-            if similar_movies:
-                return random.choice(similar_movies)
-    
-    # Fallback на популярные
-    popular = get_popular_movies()
-    return random.choice(popular) if popular else None
+# Названия фильмов, сериалов и людей для поиска без TMDB
+titles = TitleIndex(storage)
+tmdb.title_observers.append(titles.add_many)
 
+# Кандидаты по всей истории просмотров + очередь готовых рекомендаций
+recommender = Recommender(tmdb, storage, fallback=popular_fallback, index=features)
 
-# === ОБРАБОТЧИКИ КОМАНД ===
 
-async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Команда /start"""
-    user = update.effective_user
-    user_id = user.id
-    username = user.username or user.first_name
-    
-    # Добавить пользователя в БД
-    add_user(user_id, username)
-    
-    watchlist_count, watched_count = get_user_stats(user_id)
-    
-    keyboard = [
-        [InlineKeyboardButton("🎲 Что посмотреть?", callback_data='smart_rec')],
-        [
-            InlineKeyboardButton("🔥 Популярное", callback_data='popular'),
-            InlineKeyboardButton("⭐ Топ рейтинг", callback_data='top_rated')
-        ],
-        [
-            InlineKeyboardButton("🔍 Поиск фильма", callback_data='search_help'),
-            InlineKeyboardButton("🎭 Поиск актёра", callback_data='actor_search_help')
-        ],
-        [
-            InlineKeyboardButton(f"📝 Список ({watchlist_count})", callback_data='my_watchlist'),
-            InlineKeyboardButton(f"✅ Просмотрено ({watched_count})", callback_data='my_watched')
-        ],
-        [InlineKeyboardButton("📈 Статистика", callback_data='stats')]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    message = f"""🎬 Привет, {user.first_name}!
+async def get_smart_recommendation(user_id):
+    """Умная рекомендация на основе истории"""
+    return await recommender.recommend(user_id)
+
+
+# === ГЛАВНОЕ МЕНЮ ===
+# Статичные кнопки создаются один раз, на запрос — только строка со счётчиками
+
+MENU_TOP = (
+    (InlineKeyboardButton("🎲 Что посмотреть?", callback_data='smart_rec'),),
+    (
+        InlineKeyboardButton("🔥 Популярное", callback_data='popular'),
+        InlineKeyboardButton("⭐ Топ рейтинг", callback_data='top_rated')
+    ),
+    (
+        InlineKeyboardButton("🔍 Поиск фильма", callback_data='search_help'),
+        InlineKeyboardButton("🎭 Поиск актёра", callback_data='actor_search_help')
+    ),
+)
+MENU_BOTTOM = ((InlineKeyboardButton("📈 Статистика", callback_data='stats'),),)
+BACK_MENU = InlineKeyboardMarkup([[InlineKeyboardButton("◀️ Меню", callback_data='back')]])
+
+START_TEXT = """🎬 Привет, {name}!
 
 <b>ПРЕМИУМ БОТ</b> для подбора фильмов! 🍿
 
@@ -422,6 +307,47 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
 ✅ Просмотрено: {watched_count}
 
 Жми кнопку! 👇"""
+
+MENU_TEXT = """🎬 <b>ГЛАВНОЕ МЕНЮ</b>
+
+Что хочешь посмотреть? 🍿"""
+
+# (порог просмотров, достижение)
+ACHIEVEMENTS = (
+    (1, "🎬 Первый просмотр"),
+    (10, "🔥 Киноман (10 фильмов)"),
+    (50, "⭐ Эксперт (50 фильмов)"),
+    (100, "🏆 Легенда (100 фильмов)"),
+)
+WATCH_GOAL = 100
+
+
+@functools.lru_cache(maxsize=1024)
+def main_menu(watchlist_count, watched_count):
+    """Клавиатура главного меню (одна на каждую пару счётчиков)"""
+    counts = (
+        InlineKeyboardButton(f"📝 Список ({watchlist_count})", callback_data='my_watchlist'),
+        InlineKeyboardButton(f"✅ Просмотрено ({watched_count})", callback_data='my_watched')
+    )
+    return InlineKeyboardMarkup(MENU_TOP + (counts,) + MENU_BOTTOM)
+
+
+# === ОБРАБОТЧИКИ КОМАНД ===
+
+@metrics.timed(HANDLER_LATENCY.labels('start'))
+async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Команда /start"""
+    user = update.effective_user
+    user_id = user.id
+    username = user.username or user.first_name
+    
+    # Добавить пользователя в БД
+    await storage.add_user(user_id, username)
+    
+    watchlist_count, watched_count = await storage.get_user_stats(user_id)
+    
+    reply_markup = main_menu(watchlist_count, watched_count)
+    message = START_TEXT.format(name=render.esc(user.first_name), watchlist_count=watchlist_count, watched_count=watched_count)
     
     await update.message.reply_text(
         message,
@@ -432,256 +358,288 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 # === ОБРАБОТЧИК КНОПОК ===
 
+# callback_data -> обработчик (таблица вместо цепочки if/elif)
+router = CallbackRouter()
+
+# Через сколько секунд ожидания показывать «Загружаю...»
+LOADING_DELAY = 0.3
+
+
+async def fetch_with_loading(query, coro, loading_text):
+    """Дождаться данных; сообщение о загрузке — только если ответ не пришёл сразу"""
+    task = asyncio.ensure_future(coro)
+    done, _ = await asyncio.wait({task}, timeout=LOADING_DELAY)
+    if not done:
+        if query.message.photo:
+            await query.edit_message_caption(loading_text, parse_mode='HTML')
+        else:
+            await query.edit_message_text(loading_text, parse_mode='HTML')
+    return await task
+
+
+async def get_callback_title(payload):
+    """Название из контекста кнопки (или из TMDB, если контекст истёк)"""
+    if payload.context and payload.context.get('title'):
+        return payload.context['title']
+    movie = await tmdb.get_movie_details(payload.item_id)
+    return movie.title if movie else 'film'
+
+
+@metrics.timed(HANDLER_LATENCY.labels('button'))
 async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработка кнопок"""
     query = update.callback_query
-    await query.answer()
+    if user_limiter.allow(query.from_user.id):
+        await router.dispatch(query, context)
+        return
     
+    # Слишком частые нажатия — без запросов к TMDB
+    with cache_only():
+        await router.dispatch(query, context, notice=SLOW_DOWN_NOTICE)
+
+
+@router.route('smart_rec')
+async def on_smart_rec(query, context, payload):
+    """Умная рекомендация"""
     user_id = query.from_user.id
     
-    if query.data == 'smart_rec':
-        await query.edit_message_text("🔮 Подбираю фильм специально для вас...", parse_mode='HTML')
-        
-        movie = get_smart_recommendation(user_id)
-        
-        if movie:
-            message = f"🎲 <b>РЕКОМЕНДАЦИЯ</b>\n\n{format_movie_card(movie)}"
-            
-            # Отправить постер если есть
-            poster_url = get_poster_url(movie.get('poster_path'))
-            
-            movie_id = movie.get('id')
-            keyboard = [
-                [
-                    InlineKeyboardButton("➕ В список", callback_data=f'add_watch_{movie_id}_{movie.get("title", "film")}'),
-                    InlineKeyboardButton("✅ Посмотрел", callback_data=f'add_watched_{movie_id}_{movie.get("title", "film")}')
-                ],
-                [InlineKeyboardButton("🔍 Подробнее", callback_data=f'details_{movie_id}_movie')],
-                [
-                    InlineKeyboardButton("🎲 Ещё", callback_data='smart_rec'),
-                    InlineKeyboardButton("◀️ Меню", callback_data='back')
-                ]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            
-            if poster_url:
-                try:
-                    await query.message.reply_photo(
-                        photo=poster_url,
-                        caption=message,
-                        reply_markup=reply_markup,
-                        parse_mode='HTML'
-                    )
-                    await query.message.delete()
-                    return
-                except:
-                    pass
-            
-            await query.edit_message_text(
-                message,
-                reply_markup=reply_markup,
-                parse_mode='HTML'
-            )
-        else:
-            await query.edit_message_text("❌ Ошибка загрузки. Попробуйте ещё раз.", parse_mode='HTML')
-    
-    elif query.data == 'popular':
-        await query.edit_message_text("🔥 Загружаю популярное...", parse_mode='HTML')
-        
-        movies = get_popular_movies()
-        
-        if movies:
-            message = "🔥 <b>ПОПУЛЯРНОЕ СЕЙЧАС</b>\n\nВыберите фильм:\n\n"
-            
-            keyboard = []
-            for movie in movies[:10]:
-                title = movie.get('title', 'Фильм')
-                rating = movie.get('vote_average', 0)
-                movie_id = movie.get('id')
-                
-                keyboard.append([InlineKeyboardButton(
-                    f"⭐ {rating:.1f} — {title}",
-                    callback_data=f'show_{movie_id}_movie'
-                )])
-            
-            keyboard.append([InlineKeyboardButton("◀️ Меню", callback_data='back')])
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            
-            await query.edit_message_text(
-                message,
-                reply_markup=reply_markup,
-                parse_mode='HTML'
-            )
-        else:
-            await query.edit_message_text("❌ Ошибка загрузки", parse_mode='HTML')
-    
-    elif query.data == 'top_rated':
-        await query.edit_message_text("⭐ Загружаю топ...", parse_mode='HTML')
-        
-        movies = get_top_rated_movies()
-        
-        if movies:
-            message = "⭐ <b>ТОП ПО РЕЙТИНГУ</b>\n\nЛучшие фильмы всех времён:\n\n"
-            
-            keyboard = []
-            for i, movie in enumerate(movies[:10], 1):
-                title = movie.get('title', 'Фильм')
-                rating = movie.get('vote_average', 0)
-                movie_id = movie.get('id')
-                
-                keyboard.append([InlineKeyboardButton(
-                    f"{i}. ⭐ {rating:.1f} — {title}",
-                    callback_data=f'show_{movie_id}_movie'
-                )])
-            
-            keyboard.append([InlineKeyboardButton("◀️ Меню", callback_data='back')])
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            
-            await query.edit_message_text(
-                message,
-                reply_markup=reply_markup,
-                parse_mode='HTML'
-            )
-        else:
-            await query.edit_message_text("❌ Ошибка загрузки", parse_mode='HTML')
-    
-    elif query.data.startswith('show_'):
-        parts = query.data.split('_')
-        movie_id = int(parts[1])
-        media_type = parts[2]
-        
-        await query.edit_message_text("⏳ Загружаю детали...", parse_mode='HTML')
-        
-        movie = get_movie_details(movie_id, media_type)
-        
-        if movie:
-            message = format_movie_card(movie, media_type)
-            poster_url = get_poster_url(movie.get('poster_path'))
-            
-            title = movie.get('title') or movie.get('name', 'film')
-            
-            keyboard = [
-                [
-                    InlineKeyboardButton("➕ В список", callback_data=f'add_watch_{movie_id}_{title}'),
-                    InlineKeyboardButton("✅ Посмотрел", callback_data=f'add_watched_{movie_id}_{title}')
-                ],
-                [
-                    InlineKeyboardButton("🎲 Похожие", callback_data=f'similar_{movie_id}_{media_type}'),
-                    InlineKeyboardButton("◀️ Меню", callback_data='back')
-                ]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            
-            if poster_url:
-                try:
-                    await query.message.reply_photo(
-                        photo=poster_url,
-                        caption=message,
-                        reply_markup=reply_markup,
-                        parse_mode='HTML'
-                    )
-                    await query.message.delete()
-                    return
-                except:
-                    pass
-            
-            await query.edit_message_text(
-                message,
-                reply_markup=reply_markup,
-                parse_mode='HTML'
-            )
-    
-    elif query.data.startswith('add_watch_'):
-        parts = query.data.split('_', 2)
-        movie_id = int(parts[2].split('_')[0])
-        title = '_'.join(parts[2].split('_')[1:])
-        
-        success = add_to_watchlist(user_id, movie_id, title)
-        
-        if success:
-            await query.answer("✅ Добавлено в список!", show_alert=True)
-        else:
-            await query.answer("⚠️ Уже в списке!", show_alert=True)
+    movie = await fetch_with_loading(
+        query, get_smart_recommendation(user_id), "🔮 Подбираю фильм специально для вас..."
+    )
     
-    elif query.data.startswith('add_watched_'):
-        parts = query.data.split('_', 2)
-        movie_id = int(parts[2].split('_')[0])
-        title = '_'.join(parts[2].split('_')[1:])
-        
-        success = add_to_watched(user_id, movie_id, title)
-        
-        if success:
-            await query.answer("✅ Отмечено! +1 к статистике!", show_alert=True)
-        else:
-            await query.answer("⚠️ Уже отмечено!", show_alert=True)
+    if movie:
+        await send_card(query, renderer.recommendation_card(movie, tmdb.language))
+    else:
+        await query.edit_message_text("❌ Ошибка загрузки. Попробуйте ещё раз.", parse_mode='HTML')
+
+
+@router.route('popular')
+async def on_popular(query, context, payload):
+    """Популярное сейчас"""
+    # Прогретый список из памяти, иначе запрос к TMDB
+    movies = warm.get('popular') or await fetch_with_loading(
+        query, tmdb.get_popular_movies(), "🔥 Загружаю популярное..."
+    )
     
-    elif query.data == 'my_watchlist':
-        watchlist = get_watchlist(user_id)
-        
-        if watchlist:
-            message = f"📝 <b>МОЙ СПИСОК</b>\n\nФильмов: {len(watchlist)}\n\n"
-            
-            keyboard = []
-            for movie_id, title in watchlist[:20]:
-                keyboard.append([InlineKeyboardButton(
-                    f"🎬 {title}",
-                    callback_data=f'show_{movie_id}_movie'
-                )])
-            
-            keyboard.append([InlineKeyboardButton("◀️ Меню", callback_data='back')])
-            reply_markup = InlineKeyboardMarkup(keyboard)
-        else:
-            message = "📝 <b>МОЙ СПИСОК</b>\n\nСписок пуст!\n\nДобавляйте фильмы кнопкой '➕ В список'"
-            keyboard = [[InlineKeyboardButton("◀️ Меню", callback_data='back')]]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-        
+    if movies:
         await query.edit_message_text(
-            message,
-            reply_markup=reply_markup,
+            "🔥 <b>ПОПУЛЯРНОЕ СЕЙЧАС</b>\n\nВыберите фильм:\n\n",
+            reply_markup=render.movie_list(movies[:10]),
             parse_mode='HTML'
         )
+    else:
+        await query.edit_message_text("❌ Ошибка загрузки", parse_mode='HTML')
+
+
+@router.route('top_rated')
+async def on_top_rated(query, context, payload):
+    """Топ по рейтингу"""
+    # Прогретый список из памяти, иначе запрос к TMDB
+    movies = warm.get('top_rated') or await fetch_with_loading(
+        query, tmdb.get_top_rated_movies(), "⭐ Загружаю топ..."
+    )
     
-    elif query.data == 'my_watched':
-        watched = get_watched(user_id)
-        
-        if watched:
-            message = f"✅ <b>ПРОСМОТРЕНО</b>\n\nВсего: {len(watched)}\n\n"
-            
-            keyboard = []
-            for movie_id, title, rating in watched[:20]:
-                keyboard.append([InlineKeyboardButton(
-                    f"{'⭐' * (rating if rating > 0 else 0)} {title}",
-                    callback_data=f'show_{movie_id}_movie'
-                )])
-            
-            keyboard.append([InlineKeyboardButton("◀️ Меню", callback_data='back')])
-            reply_markup = InlineKeyboardMarkup(keyboard)
-        else:
-            message = "✅ <b>ПРОСМОТРЕНО</b>\n\nПока ничего!\n\nОтмечайте кнопкой '✅ Посмотрел'"
-            keyboard = [[InlineKeyboardButton("◀️ Меню", callback_data='back')]]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-        
+    if movies:
         await query.edit_message_text(
-            message,
-            reply_markup=reply_markup,
+            "⭐ <b>ТОП ПО РЕЙТИНГУ</b>\n\nЛучшие фильмы всех времён:\n\n",
+            reply_markup=render.movie_list(movies[:10], numbered=True),
             parse_mode='HTML'
         )
+    else:
+        await query.edit_message_text("❌ Ошибка загрузки", parse_mode='HTML')
+
+
+@router.action(Action.SHOW_MOVIE, Action.SHOW_TV)
+async def on_show(query, context, payload):
+    """Карточка фильма или сериала"""
+    movie_id = payload.item_id
+    media_type = payload.media_type
+    
+    movie = await fetch_with_loading(
+        query, tmdb.get_movie_details(movie_id, media_type), "⏳ Загружаю детали..."
+    )
+    
+    if movie:
+        await send_card(query, renderer.movie_card(movie, tmdb.language))
+
+
+@router.action(Action.SIMILAR_MOVIE, Action.SIMILAR_TV)
+async def on_similar(query, context, payload):
+    """Похожие из деталей фильма (обычно уже в кэше — карточку только что показали)"""
+    movie = await fetch_with_loading(
+        query, tmdb.get_movie_details(payload.item_id, payload.media_type), "🎲 Ищу похожие..."
+    )
+    
+    # Кнопка — на карточке, а карточка с постером — фото: список уходит новым сообщением
+    if not movie:
+        await send_text(query, "❌ Ошибка загрузки")
+    elif not movie.similar:
+        await send_text(query, "🤷 Похожих пока нет", BACK_MENU)
+    else:
+        await send_text(query, *render.similar_list(movie))
+
+
+@router.action(Action.ADD_WATCH, answer=False)
+async def on_add_watch(query, context, payload):
+    """Добавить в список"""
+    user_id = query.from_user.id
+    
+    movie_id = payload.item_id
+    title = await get_callback_title(payload)
+    
+    success = await storage.add_to_watchlist(user_id, movie_id, title)
+    recommender.mark_seen(user_id, movie_id)
+    
+    if success:
+        await query.answer("✅ Добавлено в список!", show_alert=True)
+    else:
+        await query.answer("⚠️ Уже в списке!", show_alert=True)
+
+
+@router.action(Action.ADD_WATCHED, answer=False)
+async def on_add_watched(query, context, payload):
+    """Отметить просмотренным"""
+    user_id = query.from_user.id
+    
+    movie_id = payload.item_id
+    title = await get_callback_title(payload)
+    
+    success = await storage.add_to_watched(user_id, movie_id, title)
+    if success:
+        recommender.on_watched(user_id, movie_id)
+    
+    if success:
+        await query.answer("✅ Отмечено! +1 к статистике!", show_alert=True)
+    else:
+        await query.answer("⚠️ Уже отмечено!", show_alert=True)
+
+
+def page_args(payload):
+    """(курсор, направление, номер страницы) из кнопки; истёкший контекст — первая страница"""
+    if not payload.context:
+        return None, True, 1
+    return (payload.context['at'], payload.item_id), payload.context['older'], payload.context['page']
+
+
+def page_header(total, number):
+    pages = max(-(-total // PAGE_SIZE), number)
+    return f"Страница {number} из {pages}" if pages > 1 else ""
+
+
+def page_buttons(page, number, factory):
+    """Ряд «Новее / Старее» или None, если страница одна"""
+    row = []
+    if page.newer:
+        row.append(InlineKeyboardButton("◀️ Новее", callback_data=factory(page.newer, False, number - 1)))
+    if page.older:
+        row.append(InlineKeyboardButton("Старее ▶️", callback_data=factory(page.older, True, number + 1)))
+    return row or None
+
+
+async def show_watchlist(query, cursor=None, older=True, number=1):
+    """Страница «Мой список»: читается только она, итог — из счётчиков"""
+    user_id = query.from_user.id
+    
+    page = await storage.get_watchlist_page(user_id, cursor, older)
+    if not page.rows and cursor is not None:
+        # Список изменился (фильмы отмечены просмотренными) — с начала
+        page, number = await storage.get_watchlist_page(user_id), 1
+    watchlist_count, _ = await storage.get_user_stats(user_id)
     
-    elif query.data == 'stats':
-        watchlist_count, watched_count = get_user_stats(user_id)
+    if page.rows:
+        message = f"📝 <b>МОЙ СПИСОК</b>\n\nФильмов: {watchlist_count}\n{page_header(watchlist_count, number)}\n"
         
-        # Достижения
-        achievements = []
-        if watched_count >= 1:
-            achievements.append("🎬 Первый просмотр")
-        if watched_count >= 10:
-            achievements.append("🔥 Киноман (10 фильмов)")
-        if watched_count >= 50:
-            achievements.append("⭐ Эксперт (50 фильмов)")
-        if watched_count >= 100:
-            achievements.append("🏆 Легенда (100 фильмов)")
+        keyboard = []
+        for movie_id, title in page.rows:
+            keyboard.append([InlineKeyboardButton(
+                f"🎬 {title}",
+                callback_data=callbacks.show(movie_id, 'movie')
+            )])
         
-        message = f"""📈 <b>ВАША СТАТИСТИКА</b>
+        navigation = page_buttons(page, number, callbacks.watchlist_page)
+        if navigation:
+            keyboard.append(navigation)
+        keyboard.append([InlineKeyboardButton("◀️ Меню", callback_data='back')])
+        reply_markup = InlineKeyboardMarkup(keyboard)
+    else:
+        message = "📝 <b>МОЙ СПИСОК</b>\n\nСписок пуст!\n\nДобавляйте фильмы кнопкой '➕ В список'"
+        reply_markup = BACK_MENU
+    
+    await query.edit_message_text(
+        message,
+        reply_markup=reply_markup,
+        parse_mode='HTML'
+    )
+
+
+async def show_watched(query, cursor=None, older=True, number=1):
+    """Страница «Просмотрено»"""
+    user_id = query.from_user.id
+    
+    page = await storage.get_watched_page(user_id, cursor, older)
+    if not page.rows and cursor is not None:
+        page, number = await storage.get_watched_page(user_id), 1
+    _, watched_count = await storage.get_user_stats(user_id)
+    
+    if page.rows:
+        message = f"✅ <b>ПРОСМОТРЕНО</b>\n\nВсего: {watched_count}\n{page_header(watched_count, number)}\n"
+        
+        keyboard = []
+        for movie_id, title, rating in page.rows:
+            keyboard.append([InlineKeyboardButton(
+                f"{'⭐' * (rating if rating > 0 else 0)} {title}",
+                callback_data=callbacks.show(movie_id, 'movie')
+            )])
+        
+        navigation = page_buttons(page, number, callbacks.watched_page)
+        if navigation:
+            keyboard.append(navigation)
+        keyboard.append([InlineKeyboardButton("◀️ Меню", callback_data='back')])
+        reply_markup = InlineKeyboardMarkup(keyboard)
+    else:
+        message = "✅ <b>ПРОСМОТРЕНО</b>\n\nПока ничего!\n\nОтмечайте кнопкой '✅ Посмотрел'"
+        reply_markup = BACK_MENU
+    
+    await query.edit_message_text(
+        message,
+        reply_markup=reply_markup,
+        parse_mode='HTML'
+    )
+
+
+@router.route('my_watchlist')
+async def on_my_watchlist(query, context, payload):
+    """Мой список"""
+    await show_watchlist(query)
+
+
+@router.action(Action.WATCHLIST_PAGE)
+async def on_watchlist_page(query, context, payload):
+    await show_watchlist(query, *page_args(payload))
+
+
+@router.route('my_watched')
+async def on_my_watched(query, context, payload):
+    """Просмотренные"""
+    await show_watched(query)
+
+
+@router.action(Action.WATCHED_PAGE)
+async def on_watched_page(query, context, payload):
+    await show_watched(query, *page_args(payload))
+
+
+@router.route('stats')
+async def on_stats(query, context, payload):
+    """Статистика и достижения"""
+    user_id = query.from_user.id
+    
+    watchlist_count, watched_count = await storage.get_user_stats(user_id)
+    
+    # Достижения
+    achievements = [title for threshold, title in ACHIEVEMENTS if watched_count >= threshold]
+    
+    message = f"""📈 <b>ВАША СТАТИСТИКА</b>
 
 📝 В списке: {watchlist_count}
 ✅ Просмотрено: {watched_count}
@@ -689,20 +647,20 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 🏆 <b>Достижения:</b>
 {chr(10).join(achievements) if achievements else '— Пока нет'}
 
-💡 <b>Цель:</b> Посмотреть 100 фильмов!
-Осталось: {100 - watched_count if watched_count < 100 else 0}"""
-        
-        keyboard = [[InlineKeyboardButton("◀️ Меню", callback_data='back')]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        await query.edit_message_text(
-            message,
-            reply_markup=reply_markup,
-            parse_mode='HTML'
-        )
+💡 <b>Цель:</b> Посмотреть {WATCH_GOAL} фильмов!
+Осталось: {max(WATCH_GOAL - watched_count, 0)}"""
     
-    elif query.data == 'search_help':
-        message = """🔍 <b>ПОИСК ФИЛЬМОВ</b>
+    await query.edit_message_text(
+        message,
+        reply_markup=BACK_MENU,
+        parse_mode='HTML'
+    )
+
+
+@router.route('search_help')
+async def on_search_help(query, context, payload):
+    """Подсказка по поиску фильмов"""
+    message = """🔍 <b>ПОИСК ФИЛЬМОВ</b>
 
 Просто напишите название фильма!
 
@@ -714,18 +672,21 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 • Star Wars
 
 Бот найдёт фильм в базе TMDB!"""
-        
-        keyboard = [[InlineKeyboardButton("◀️ Меню", callback_data='back')]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        await query.edit_message_text(
-            message,
-            reply_markup=reply_markup,
-            parse_mode='HTML'
-        )
     
-    elif query.data == 'actor_search_help':
-        message = """🎭 <b>ПОИСК ПО АКТЁРАМ</b>
+    keyboard = [[InlineKeyboardButton("◀️ Меню", callback_data='back')]]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    
+    await query.edit_message_text(
+        message,
+        reply_markup=reply_markup,
+        parse_mode='HTML'
+    )
+
+
+@router.route('actor_search_help')
+async def on_actor_search_help(query, context, payload):
+    """Подсказка по поиску актёров"""
+    message = """🎭 <b>ПОИСК ПО АКТЁРАМ</b>
 
 Напишите имя актёра чтобы найти все его фильмы!
 
@@ -742,246 +703,303 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 • Tom Hanks
 
 Бот покажет все фильмы актёра! 🎬"""
-        
-        keyboard = [[InlineKeyboardButton("◀️ Меню", callback_data='back')]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        await query.edit_message_text(
-            message,
-            reply_markup=reply_markup,
-            parse_mode='HTML'
-        )
     
-    elif query.data.startswith('show_actor_'):
-        actor_id = int(query.data.split('_')[2])
-        
-        await query.edit_message_text("🎭 Загружаю фильмографию...", parse_mode='HTML')
-        
-        actor = get_actor_details(actor_id)
-        movies = get_actor_movies(actor_id)
-        
-        if actor and movies:
-            name = actor.get('name', 'Актёр')
-            known_for = actor.get('known_for_department', '')
-            birthday = actor.get('birthday', '')
-            place_of_birth = actor.get('place_of_birth', '')
-            biography = actor.get('biography', 'Биография отсутствует')
-            
-            message = f"🎭 <b>{name}</b>\n\n"
-            
-            if known_for:
-                message += f"👤 {known_for}\n"
-            if birthday:
-                from datetime import datetime
-                try:
-                    birth_date = datetime.strptime(birthday, '%Y-%m-%d')
-                    age = (datetime.now() - birth_date).days // 365
-                    message += f"🎂 {birthday} ({age} лет)\n"
-                except:
-                    message += f"🎂 {birthday}\n"
-            if place_of_birth:
-                message += f"🌍 {place_of_birth}\n"
-            
-            message += f"\n📖 <b>О актёре:</b>\n{biography[:200]}{'...' if len(biography) > 200 else ''}\n\n"
-            
-            message += f"🎬 <b>ФИЛЬМЫ ({len(movies)}):</b>\n\nВыберите фильм:"
-            
-            keyboard = []
-            for movie in movies:
-                title = movie.get('title', 'Фильм')
-                year = movie.get('release_date', '')[:4] if movie.get('release_date') else '—'
-                rating = movie.get('vote_average', 0)
-                movie_id = movie.get('id')
-                
-                keyboard.append([InlineKeyboardButton(
-                    f"⭐ {rating:.1f} — {title} ({year})",
-                    callback_data=f'show_{movie_id}_movie'
-                )])
-            
-            keyboard.append([InlineKeyboardButton("◀️ Меню", callback_data='back')])
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            
-            # Попытка отправить с фото
-            profile_path = actor.get('profile_path')
-            if profile_path:
-                photo_url = f"https://image.tmdb.org/t/p/w500{profile_path}"
-                try:
-                    await query.message.reply_photo(
-                        photo=photo_url,
-                        caption=message,
-                        reply_markup=reply_markup,
-                        parse_mode='HTML'
-                    )
-                    await query.message.delete()
-                    return
-                except:
-                    pass
-            
-            await query.edit_message_text(
-                message,
-                reply_markup=reply_markup,
-                parse_mode='HTML'
-            )
-        else:
-            await query.edit_message_text("❌ Ошибка загрузки актёра", parse_mode='HTML')
+    keyboard = [[InlineKeyboardButton("◀️ Меню", callback_data='back')]]
+    reply_markup = InlineKeyboardMarkup(keyboard)
     
-    elif query.data == 'back':
-        watchlist_count, watched_count = get_user_stats(user_id)
-        
-        keyboard = [
-            [InlineKeyboardButton("🎲 Что посмотреть?", callback_data='smart_rec')],
-            [
-                InlineKeyboardButton("🔥 Популярное", callback_data='popular'),
-                InlineKeyboardButton("⭐ Топ рейтинг", callback_data='top_rated')
-            ],
-            [
-                InlineKeyboardButton("🔍 Поиск фильма", callback_data='search_help'),
-                InlineKeyboardButton("🎭 Поиск актёра", callback_data='actor_search_help')
-            ],
-            [
-                InlineKeyboardButton(f"📝 Список ({watchlist_count})", callback_data='my_watchlist'),
-                InlineKeyboardButton(f"✅ Просмотрено ({watched_count})", callback_data='my_watched')
-            ],
-            [InlineKeyboardButton("📈 Статистика", callback_data='stats')]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        message = """🎬 <b>ГЛАВНОЕ МЕНЮ</b>
+    await query.edit_message_text(
+        message,
+        reply_markup=reply_markup,
+        parse_mode='HTML'
+    )
 
-Что хочешь посмотреть? 🍿"""
-        
-        await query.edit_message_text(
-            message,
-            reply_markup=reply_markup,
-            parse_mode='HTML'
-        )
+
+@router.action(Action.SHOW_ACTOR)
+async def on_show_actor(query, context, payload):
+    """Карточка актёра"""
+    actor_id = payload.item_id
+    
+    actor, _ = await fetch_with_loading(
+        query, tmdb.get_actor(actor_id), "🎭 Загружаю фильмографию..."
+    )
+    if not (actor and actor.movies):
+        await query.edit_message_text("❌ Ошибка загрузки актёра", parse_mode='HTML')
+        return
+    
+    await send_card(query, renderer.actor_card(actor, tmdb.language))
+
+
+@router.route('back')
+async def on_back(query, context, payload):
+    """Главное меню"""
+    watchlist_count, watched_count = await storage.get_user_stats(query.from_user.id)
+    
+    await query.edit_message_text(
+        MENU_TEXT,
+        reply_markup=main_menu(watchlist_count, watched_count),
+        parse_mode='HTML'
+    )
 
 
 # === ПОИСК ПО ТЕКСТУ ===
 
+@metrics.timed(HANDLER_LATENCY.labels('text'))
 async def text_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработка текстовых сообщений - поиск"""
     query_text = update.message.text.strip()
     
-    msg = await update.message.reply_text(f"🔍 Ищу '<b>{query_text}</b>'...", parse_mode='HTML')
-    
-    # Сначала ищем фильмы
-    movie_results = search_movie(query_text)
+    throttled = not user_limiter.allow(update.effective_user.id)
     
-    # Потом ищем актёров
-    actor_results = search_actor(query_text)
+    msg = await update.message.reply_text(render.searching(query_text), parse_mode='HTML')
     
-    # Разделяем результаты на фильмы/сериалы и актёров
-    movies = [r for r in movie_results if r.get('media_type') in ['movie', 'tv']]
-    actors_in_movie_search = [r for r in movie_results if r.get('media_type') == 'person']
+    # Фильмы и актёры ищутся одновременно (сверх лимита — только из кэша)
+    with cache_only(throttled):
+        movies, all_actors = await search_all(tmdb, query_text, local=titles)
     
-    # Объединяем актёров из обоих поисков
-    all_actors = actors_in_movie_search + actor_results
+    if throttled and not (movies or all_actors):
+        await msg.edit_text(SLOW_DOWN_TEXT)
+        return
     
     if movies or all_actors:
-        message = f"🔍 <b>РЕЗУЛЬТАТЫ ПОИСКА</b>\n\nПо запросу '<i>{query_text}</i>':\n\n"
-        
-        keyboard = []
-        
-        # Сначала показываем фильмы
-        if movies:
-            message += "🎬 <b>ФИЛЬМЫ И СЕРИАЛЫ:</b>\n"
-            for item in movies[:3]:
-                title = item.get('title') or item.get('name', 'Без названия')
-                year = item.get('release_date', item.get('first_air_date', ''))[:4] if item.get('release_date') or item.get('first_air_date') else ''
-                rating = item.get('vote_average', 0)
-                media_type = item.get('media_type', 'movie')
-                movie_id = item.get('id')
-                
-                type_emoji = "🎬" if media_type == "movie" else "📺"
-                
-                keyboard.append([InlineKeyboardButton(
-                    f"{type_emoji} {title} ({year}) — ⭐ {rating:.1f}",
-                    callback_data=f'show_{movie_id}_{media_type}'
-                )])
-            message += "\n"
-        
-        # Потом показываем актёров
-        if all_actors:
-            message += "🎭 <b>АКТЁРЫ:</b>\n"
-            seen_actors = set()
-            for actor in all_actors:
-                actor_id = actor.get('id')
-                if actor_id in seen_actors:
-                    continue
-                seen_actors.add(actor_id)
-                
-                name = actor.get('name', 'Актёр')
-                known_for_titles = actor.get('known_for', [])
-                
-                # Составляем список известных фильмов
-                known_movies = []
-                for kf in known_for_titles[:2]:
-                    kf_title = kf.get('title') or kf.get('name')
-                    if kf_title:
-                        known_movies.append(kf_title)
-                
-                known_text = f" ({', '.join(known_movies)})" if known_movies else ""
-                
-                keyboard.append([InlineKeyboardButton(
-                    f"🎭 {name}{known_text}",
-                    callback_data=f'show_actor_{actor_id}'
-                )])
-                
-                if len(seen_actors) >= 3:
-                    break
-        
-        if not movies and not all_actors:
-            message = f"❌ По запросу '<b>{query_text}</b>' ничего не найдено.\n\n"
-            message += "💡 Попробуйте:\n"
-            message += "• Другое название\n"
-            message += "• На английском языке\n"
-            message += "• Имя актёра"
-        
-        keyboard.append([InlineKeyboardButton("◀️ Меню", callback_data='back')])
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
+        message, reply_markup = render.search_results(query_text, movies, all_actors)
         await msg.edit_text(
             message,
             reply_markup=reply_markup,
             parse_mode='HTML'
         )
     else:
-        await msg.edit_text(
-            f"❌ По запросу '<b>{query_text}</b>' ничего не найдено.\n\n💡 Попробуйте другое название или имя актёра!",
-            parse_mode='HTML'
+        await msg.edit_text(render.not_found(query_text), parse_mode='HTML')
+
+
+# === ИМПОРТ И ЭКСПОРТ ===
+
+IMPORT_HELP = """📥 <b>ИМПОРТ СПИСКОВ</b>
+
+Пришлите файл CSV или JSON:
+• экспорт Letterboxd (watched.csv, ratings.csv, watchlist.csv)
+• экспорт IMDb (ratings.csv)
+• файл из /export
+
+Куда добавлять — из колонки <i>list</i>, иначе по подписи или имени файла: «watchlist» — в список, остальное — в просмотренные.
+
+📤 Выгрузить свои списки: /export (или /export json)"""
+
+# Файлы, которые принимаются к импорту: остальные документы (PDF, фото файлом) не трогаем
+IMPORT_FILES = (
+    filters.Document.FileExtension('csv')
+    | filters.Document.FileExtension('json')
+    | filters.Document.FileExtension('jsonl')
+    | filters.Document.MimeType('text/csv')
+    | filters.Document.MimeType('application/json')
+)
+
+# Пользователи, у которых идёт импорт (один за раз)
+importing = set()
+
+
+class ImportProgress:
+    """Сообщение о прогрессе импорта: правка не чаще раза в interval секунд"""
+
+    def __init__(self, message, interval=2.0):
+        self.message = message
+        self.interval = interval
+        self._last = time.monotonic()
+
+    async def __call__(self, report):
+        now = time.monotonic()
+        if now - self._last < self.interval:
+            return
+        self._last = now
+        try:
+            await self.message.edit_text(f"⏳ Импорт: обработано {report.rows}, добавлено {report.added}...")
+        except TelegramError as e:
+            logger.warning(f"Import progress edit failed: {e}")
+
+
+def import_summary(report):
+    """Итог импорта для пользователя"""
+    header = "⚠️ <b>ИМПОРТ ПРЕРВАН</b>" if report.error else "✅ <b>ИМПОРТ ЗАВЕРШЁН</b>"
+    message = f"""{header}
+
+Строк в файле: {report.rows}
+📝 Добавлено в список: {report.watchlist}
+✅ Добавлено в просмотренные: {report.watched}
+Уже были: {report.duplicates}
+Пропущено: {report.skipped}"""
+    if report.error:
+        message += (f"\n\n❌ Файл повреждён после строки {report.rows} — остальное не прочитано. "
+                    "Исправьте файл и пришлите снова: уже добавленное не задвоится.")
+    if report.unresolved:
+        titles = '\n'.join(f"• {html.escape(title)}" for title in report.unresolved)
+        message += f"\n\n❓ <b>Не найдены в TMDB:</b>\n{titles}"
+    return message
+
+
+async def import_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Команда /import — подсказка, сам файл приходит документом"""
+    await update.message.reply_text(IMPORT_HELP, parse_mode='HTML')
+
+
+async def document_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Файл для импорта: скачивается во временный файл и разбирается потоком"""
+    document = update.message.document
+    user_id = update.effective_user.id
+    
+    if document.file_size and document.file_size > IMPORT_MAX_BYTES:
+        await update.message.reply_text(f"⚠️ Файл больше {IMPORT_MAX_BYTES // (1024 * 1024)} МБ")
+        return
+    if user_id in importing:
+        await update.message.reply_text("⏳ Импорт уже идёт, дождитесь окончания")
+        return
+    
+    importing.add(user_id)
+    try:
+        msg = await update.message.reply_text("⏳ Импорт: читаю файл...")
+        default_list = default_list_for(update.message.caption, document.file_name)
+        with tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE) as spool:
+            telegram_file = await document.get_file()
+            await telegram_file.download_to_memory(out=spool)
+            spool.seek(0)
+            report = await import_file(spool, user_id, storage, tmdb, default_list, progress=ImportProgress(msg))
+        logger.info(f"Import for {user_id}: {report.rows} rows, +{report.added}, {report.lookups} TMDB lookups")
+        if report.added:
+            # Импортированное не должно всплыть в «🎲 Что посмотреть?»
+            recommender.forget(user_id)
+        await msg.edit_text(import_summary(report), parse_mode='HTML')
+    except TelegramError as e:
+        logger.error(f"Import error: {e}")
+        await update.message.reply_text("❌ Не удалось загрузить файл")
+    finally:
+        importing.discard(user_id)
+
+
+async def export_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Команда /export [json] — списки файлом"""
+    fmt = 'json' if context.args and context.args[0].lower() == 'json' else 'csv'
+    
+    spool, count = await export_file(storage, update.effective_user.id, fmt)
+    with spool:
+        if not count:
+            await update.message.reply_text("📭 Списки пусты — выгружать нечего")
+            return
+        await update.message.reply_document(
+            document=spool,
+            filename='movies.jsonl' if fmt == 'json' else 'movies.csv',
+            caption=f"📤 Экспорт: {count} фильмов. Вернуть обратно — /import"
         )
 
 
 # === ГЛАВНАЯ ФУНКЦИЯ ===
 
+async def housekeeping(context: ContextTypes.DEFAULT_TYPE):
+    """Очистка кэшей (задача JobQueue); общее хранилище чистит один воркер"""
+    await response_cache.evict_expired(shared=is_primary())
+    await file_ids.trim()
+    await features.flush()
+
+
+async def post_shutdown(application: Application):
+    """Закрыть пул соединений TMDB и БД при остановке"""
+    if cluster is not None:
+        await asyncio.to_thread(cluster.stop)
+    await tmdb.close()
+    await response_cache.store.close()
+    await storage.close()
+    await features.flush()
+
+
+def register_handlers(application):
+    """Обработчики команд, кнопок и поиска"""
+    # Команды
+    application.add_handler(CommandHandler("start", start))
+    application.add_handler(CommandHandler("import", import_command))
+    # Импорт и экспорт долгие — не задерживают остальные обновления
+    application.add_handler(CommandHandler("export", export_command, block=False))
+    application.add_handler(MessageHandler(IMPORT_FILES, document_handler, block=False))
+    
+    # Кнопки
+    application.add_handler(CallbackQueryHandler(button_handler))
+    
+    # Поиск по тексту
+    application.add_handler(MessageHandler(
+        filters.TEXT & ~filters.COMMAND,
+        text_handler
+    ))
+
+
+def build_application():
+    """Приложение PTB с общим пулом соединений к Bot API"""
+    return (
+        Application.builder()
+        .token(TOKEN)
+        .request(InstrumentedRequest(connection_pool_size=POOL_SIZE))
+        .post_shutdown(post_shutdown)
+        .build()
+    )
+
+
+def schedule_jobs(application):
+    """Фоновые задачи: прогрев списков и очистка кэшей"""
+    if is_primary():
+        application.job_queue.run_repeating(warm.job, interval=WARM_INTERVAL, first=1)
+    else:
+        # Списки и детали прогревает воркер 0 — здесь они читаются из общего кэша
+        application.job_queue.run_repeating(warm.follow, interval=WARM_INTERVAL, first=WARM_FOLLOW_DELAY)
+    application.job_queue.run_repeating(housekeeping, interval=EVICT_INTERVAL, first=60)
+
+
+def worker_report():
+    """Отчёт воркера приёмнику: для /health и /metrics"""
+    return {
+        'tmdb_unavailable': tmdb.breakers.open_endpoints(),
+        'tmdb': tmdb.breakers.stats(),
+        'metrics': metrics.render(),
+    }
+
+
+def run_worker(updates, reports):
+    """Процесс-воркер (SHARDS > 1): обработчики и фоновые задачи, обновления — от приёмника"""
+    features.load()
+    application = build_application()
+    register_handlers(application)
+    schedule_jobs(application)
+    application.job_queue.run_repeating(reporter(reports, worker_report), interval=REPORT_INTERVAL, first=1)
+    asyncio.run(work(application, updates, post_shutdown=post_shutdown))
+
+
 def main():
     """Запуск бота"""
+    global cluster
     logger.info("=" * 60)
     logger.info("🎬 БОТ 'ЧТО ПОСМОТРЕТЬ?' - ПРЕМИУМ")
     logger.info("=" * 60)
     
-    # Инициализация БД
-    init_db()
+    # Инициализация БД (до запуска воркеров — миграции в одном процессе)
+    init_db(DB_PATH)
     
     try:
-        application = Application.builder().token(TOKEN).build()
+        application = build_application()
+        webhook.attach(application)
         
-        # Команды
-        application.add_handler(CommandHandler("start", start))
-        
-        # Кнопки
-        application.add_handler(CallbackQueryHandler(button_handler))
-        
-        # Поиск по тексту
-        application.add_handler(MessageHandler(
-            filters.TEXT & ~filters.COMMAND,
-            text_handler
-        ))
+        if SHARDS > 1:
+            # Приёмник: обновления уходят воркерам, обработчики работают там
+            cluster = Shards(SHARDS).start().attach(application)
+        else:
+            features.load()
+            register_handlers(application)
+            schedule_jobs(application)
         
         logger.info("✅ Handlers registered")
         logger.info("🎬 TMDB API connected")
         logger.info("💾 Database ready")
+        
+        port = int(os.environ.get('PORT', 10000))
+        
+        if WEBHOOK_URL:
+            # Webhook, health и статистика — в одном цикле событий с ботом
+            asyncio.run(serve(webhook, application, port, post_shutdown=post_shutdown))
+            return
+        
         logger.info("⏳ Starting polling...")
         
         # Запускаем бота в отдельном потоке
@@ -1006,7 +1024,6 @@ def main():
         bot_thread.start()
         
         # Запускаем Flask
-        port = int(os.environ.get('PORT', 10000))
         app.run(host='0.0.0.0', port=port)
         
     except Exception as e:
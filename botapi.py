@@ -0,0 +1,37 @@
+"""
+Запросы к Telegram Bot API с метриками
+✅ Время каждого вызова по методу (sendPhoto, editMessageText, ...)
+✅ Счётчик ответов по HTTP-статусу и сетевых ошибок
+✅ Подключается через Application.builder().request(...)
+"""
+
+import time
+
+from telegram.error import TelegramError
+from telegram.request import HTTPXRequest
+
+import metrics
+
+TELEGRAM_LATENCY = metrics.histogram('telegram_api_seconds', 'Время вызова Bot API', ('method',))
+TELEGRAM_CALLS = metrics.counter('telegram_api_calls_total', 'Вызовы Bot API по результату', ('method', 'status'))
+# Отправка картинок отдельно: раньше ошибки молча проглатывались
+PHOTO_SENDS = metrics.counter('telegram_photo_sends_total', 'Отправка постеров и фото', ('source', 'result'))
+
+POOL_SIZE = 256  # как у Application.builder() по умолчанию
+
+
+class InstrumentedRequest(HTTPXRequest):
+    """HTTPXRequest, который замеряет каждый вызов Bot API"""
+
+    async def do_request(self, url, method, request_data=None, **kwargs):
+        api_method = url.rsplit('/', 1)[-1]
+        started = time.perf_counter()
+        try:
+            code, payload = await super().do_request(url, method, request_data, **kwargs)
+        except TelegramError as e:
+            TELEGRAM_CALLS.labels(api_method, type(e).__name__).inc()
+            raise
+        finally:
+            TELEGRAM_LATENCY.labels(api_method).observe(time.perf_counter() - started)
+        TELEGRAM_CALLS.labels(api_method, str(code)).inc()
+        return code, payload
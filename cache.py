@@ -0,0 +1,296 @@
+"""
+Двухуровневый кэш ответов TMDB
+✅ LRU в памяти процесса (ограниченный размер)
+✅ Второй уровень — общее хранилище процессов (backends: SQLite или сетевое)
+✅ Разный TTL для разных эндпоинтов
+✅ Устаревшие ответы живут ещё STALE_GRACE — для stale-while-revalidate
+✅ Разобранные ответы (models.Movie/Person) лежат в памяти как есть, в хранилище — JSON (orjson)
+✅ Фоновая очистка устаревших записей
+✅ Счётчики попаданий и промахов
+✅ Кэш file_id Telegram для постеров и фото актёров
+✅ Простой TTL-кэш в памяти для готовых карточек
+"""
+
+import os
+import re
+import time
+import logging
+import sqlite3
+from collections import OrderedDict
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+MINUTE = 60
+HOUR = 60 * MINUTE
+DAY = 24 * HOUR
+
+# TTL по эндпоинтам: первое совпавшее правило побеждает
+TTL_RULES = [
+    (re.compile(r'^/movie/popular'), 15 * MINUTE),
+    (re.compile(r'^/movie/top_rated'), 30 * MINUTE),
+    (re.compile(r'^/trending/'), 15 * MINUTE),
+    (re.compile(r'^/search/'), 6 * HOUR),
+    (re.compile(r'^/(movie|tv)/\d+'), 3 * DAY),
+    (re.compile(r'^/person/\d+'), 3 * DAY),
+]
+DEFAULT_TTL = HOUR
+# Сколько после TTL ответ ещё можно отдать, пока идёт обновление (или TMDB лежит)
+STALE_GRACE = int(os.environ.get('CACHE_STALE_GRACE', 7 * DAY))
+
+MEMORY_SIZE = 2048
+EVICT_INTERVAL = 10 * MINUTE
+
+FILE_ID_MEMORY_SIZE = 4096
+FILE_ID_DISK_SIZE = 50000
+
+# Готовые карточки (render.Renderer); TTL меньше жизни контекста кнопок (callbacks.PAYLOAD_TTL)
+CARD_TTL = 12 * HOUR
+CARD_SIZE = 4096
+
+
+def ttl_for(path):
+    """TTL для эндпоинта"""
+    for pattern, ttl in TTL_RULES:
+        if pattern.match(path):
+            return ttl
+    return DEFAULT_TTL
+
+
+def make_key(path, params):
+    """Ключ кэша: эндпоинт + параметры + язык (без api_key)"""
+    items = sorted((k, str(v)) for k, v in params.items() if k != 'api_key')
+    return path + '?' + '&'.join(f"{k}={v}" for k, v in items)
+
+
+class ResponseCache:
+    """LRU в памяти перед общим хранилищем (backends.SQLiteStore / NetworkStore)"""
+
+    def __init__(self, store, memory_size=MEMORY_SIZE):
+        self.store = store
+        self.memory_size = memory_size
+        self._memory = OrderedDict()  # key -> (expires_at, data)
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    # === ПАМЯТЬ ===
+
+    def _memory_get(self, key):
+        """(data, expires_at) или (None, None)"""
+        entry = self._memory.get(key)
+        if entry is None:
+            return None, None
+        expires_at, data = entry
+        if expires_at + STALE_GRACE < time.time():
+            del self._memory[key]
+            return None, None
+        self._memory.move_to_end(key)
+        return data, expires_at
+
+    def _memory_set(self, key, data, expires_at):
+        self._memory[key] = (expires_at, data)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    # === ПУБЛИЧНЫЙ API ===
+
+    async def lookup(self, path, params):
+        """(data, свежий ли) — устаревший ответ тоже отдаётся, но с False"""
+        key = make_key(path, params)
+
+        data, expires_at = self._memory_get(key)
+        if data is not None and expires_at >= time.time():
+            self.memory_hits += 1
+            return data, True
+
+        # В памяти нет или устарело — другой процесс мог уже обновить общее хранилище
+        stored, stored_expires_at = await self.store.get(key)
+        if stored is not None and (data is None or stored_expires_at > expires_at):
+            data, expires_at = stored, stored_expires_at
+            self._memory_set(key, data, expires_at)
+            if expires_at >= time.time():
+                self.disk_hits += 1
+                return data, True
+
+        if data is not None:
+            self.stale_hits += 1
+            return data, False
+        self.misses += 1
+        return None, False
+
+    async def get(self, path, params):
+        """Свежее значение из кэша или None"""
+        data, fresh = await self.lookup(path, params)
+        return data if fresh else None
+
+    async def set(self, path, params, data):
+        """Сохранить ответ в оба уровня (запись в хранилище — в фоне)"""
+        key = make_key(path, params)
+        self._memory_set(key, data, time.time() + ttl_for(path))
+        self.store.set(key, data)
+
+    async def evict_expired(self, shared=True):
+        """Очистка устаревших записей в памяти и (shared) в общем хранилище"""
+        now = time.time()
+        for key in [k for k, (expires_at, _) in self._memory.items() if expires_at + STALE_GRACE < now]:
+            del self._memory[key]
+        if shared:
+            deleted = await self.store.evict()
+            if deleted:
+                logger.info(f"🧹 Кэш: удалено {deleted} устаревших записей")
+
+    def stats(self):
+        """Счётчики попаданий и промахов"""
+        hits = self.memory_hits + self.disk_hits
+        total = hits + self.misses
+        return {
+            'memory_hits': self.memory_hits,
+            'disk_hits': self.disk_hits,
+            'stale_hits': self.stale_hits,
+            'misses': self.misses,
+            'hit_rate': round(hits / total, 3) if total else 0.0,
+            'memory_size': len(self._memory),
+            'store': self.store.stats(),
+        }
+
+
+# === FILE_ID TELEGRAM ===
+
+def _file_get(conn, path):
+    row = conn.execute('SELECT file_id FROM telegram_files WHERE path=?', (path,)).fetchone()
+    return row[0] if row else None
+
+
+def _file_set(conn, path, file_id, used_at):
+    conn.execute('INSERT OR REPLACE INTO telegram_files (path, file_id, used_at) VALUES (?, ?, ?)',
+                 (path, file_id, used_at))
+
+
+def _file_touch(conn, path, used_at):
+    conn.execute('UPDATE telegram_files SET used_at=? WHERE path=?', (used_at, path))
+
+
+def _file_delete(conn, path):
+    conn.execute('DELETE FROM telegram_files WHERE path=?', (path,))
+
+
+def _file_trim(conn, keep):
+    """Оставить keep самых свежих по использованию"""
+    return conn.execute('''DELETE FROM telegram_files WHERE path IN
+                           (SELECT path FROM telegram_files ORDER BY used_at DESC LIMIT -1 OFFSET ?)''',
+                        (keep,)).rowcount
+
+
+class FileIdCache:
+    """poster_path/profile_path -> file_id первой успешной отправки"""
+
+    def __init__(self, storage, memory_size=FILE_ID_MEMORY_SIZE, disk_size=FILE_ID_DISK_SIZE):
+        self.storage = storage
+        self.memory_size = memory_size
+        self.disk_size = disk_size
+        self._memory = OrderedDict()  # path -> file_id
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _remember(self, path, file_id):
+        self._memory[path] = file_id
+        self._memory.move_to_end(path)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    async def get(self, path):
+        """file_id для пути картинки или None"""
+        file_id = self._memory.get(path)
+        if file_id is not None:
+            self._memory.move_to_end(path)
+            self.hits += 1
+            return file_id
+
+        try:
+            file_id = await self.storage.read(_file_get, path)
+        except sqlite3.Error as e:
+            logger.error(f"File id read error: {e}")
+            file_id = None
+
+        if file_id is None:
+            self.misses += 1
+            return None
+
+        # Поднять в LRU на диске и в памяти
+        self.hits += 1
+        self._remember(path, file_id)
+        self.storage.submit(_file_touch, path, datetime.now().isoformat())
+        return file_id
+
+    def set(self, path, file_id):
+        """Запомнить file_id после успешной отправки"""
+        self._remember(path, file_id)
+        self.storage.submit(_file_set, path, file_id, datetime.now().isoformat())
+
+    def invalidate(self, path):
+        """Telegram отверг file_id — забыть его"""
+        self._memory.pop(path, None)
+        self.invalidations += 1
+        self.storage.submit(_file_delete, path)
+
+    async def trim(self):
+        """Ограничить размер таблицы на диске"""
+        try:
+            deleted = await self.storage.write(_file_trim, self.disk_size)
+            if deleted:
+                logger.info(f"🧹 file_id: удалено {deleted} старых записей")
+        except sqlite3.Error as e:
+            logger.error(f"File id trim error: {e}")
+
+    def stats(self):
+        """Счётчики попаданий и промахов"""
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'invalidations': self.invalidations,
+            'memory_size': len(self._memory),
+        }
+
+
+# === TTL-КЭШ В ПАМЯТИ ===
+
+class TTLCache:
+    """LRU в памяти с общим TTL (готовые карточки и т.п.)"""
+
+    def __init__(self, ttl, max_size):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._items = OrderedDict()  # key -> (expires_at, value)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Значение или None, если нет или истекло"""
+        entry = self._items.get(key)
+        if entry is None or entry[0] < time.time():
+            if entry is not None:
+                del self._items[key]
+            self.misses += 1
+            return None
+        self._items.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key, value):
+        self._items[key] = (time.time() + self.ttl, value)
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+
+    def invalidate(self, key):
+        """True, если запись была"""
+        return self._items.pop(key, None) is not None
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._items)}
@@ -0,0 +1,169 @@
+"""
+Компактные callback_data для инлайн-кнопок
+✅ Действие (enum) + числовой id в нескольких байтах base64
+✅ Название и прочий контекст хранятся на сервере по короткому токену
+✅ Хранилище контекста с TTL и ограничением размера
+✅ Разбор за O(1), без split('_') по названию
+"""
+
+import os
+import time
+import base64
+import struct
+from enum import IntEnum
+from typing import NamedTuple, Optional
+from collections import OrderedDict
+
+PREFIX = '~'
+TOKEN_SIZE = 4
+PAYLOAD_TTL = 48 * 3600
+PAYLOAD_MAX = 200_000
+
+_HEADER = struct.Struct('>BI')  # действие (1 байт) + id (4 байта)
+
+
+class Action(IntEnum):
+    """Действия кнопок с параметром"""
+    SHOW_MOVIE = 1
+    SHOW_TV = 2
+    SHOW_ACTOR = 3
+    ADD_WATCH = 4
+    ADD_WATCHED = 5
+    SIMILAR_MOVIE = 6
+    SIMILAR_TV = 7
+    WATCHLIST_PAGE = 8
+    WATCHED_PAGE = 9
+
+
+SHOW_ACTIONS = {'movie': Action.SHOW_MOVIE, 'tv': Action.SHOW_TV}
+SIMILAR_ACTIONS = {'movie': Action.SIMILAR_MOVIE, 'tv': Action.SIMILAR_TV}
+MEDIA_TYPES = {
+    Action.SHOW_MOVIE: 'movie', Action.SHOW_TV: 'tv',
+    Action.SIMILAR_MOVIE: 'movie', Action.SIMILAR_TV: 'tv',
+}
+
+
+class Callback(NamedTuple):
+    """Разобранная callback_data"""
+    action: Action
+    item_id: int
+    context: Optional[dict] = None
+
+    @property
+    def media_type(self):
+        return MEDIA_TYPES.get(self.action, 'movie')
+
+
+class PayloadStore:
+    """Контекст кнопок на сервере: токен -> dict, с TTL"""
+
+    def __init__(self, ttl=PAYLOAD_TTL, max_size=PAYLOAD_MAX):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._items = OrderedDict()  # token -> (expires_at, context), по времени вставки
+
+    def _evict(self, now):
+        while self._items:
+            token, (expires_at, _) = next(iter(self._items.items()))
+            if expires_at >= now and len(self._items) <= self.max_size:
+                break
+            del self._items[token]
+
+    def put(self, context):
+        """Сохранить контекст, вернуть токен"""
+        now = time.time()
+        self._evict(now)
+        token = os.urandom(TOKEN_SIZE)
+        while token in self._items:
+            token = os.urandom(TOKEN_SIZE)
+        self._items[token] = (now + self.ttl, context)
+        return token
+
+    def get(self, token):
+        """Контекст по токену или None, если истёк"""
+        entry = self._items.get(token)
+        if entry is None or entry[0] < time.time():
+            return None
+        return entry[1]
+
+    def __len__(self):
+        return len(self._items)
+
+
+payloads = PayloadStore()
+
+
+def encode(action, item_id, context=None):
+    """callback_data вида '~' + base64(действие, id[, токен])"""
+    raw = _HEADER.pack(action, item_id)
+    if context:
+        raw += payloads.put(context)
+    return PREFIX + base64.urlsafe_b64encode(raw).rstrip(b'=').decode()
+
+
+def decode(data):
+    """Callback для компактных и старых форматов или None"""
+    if not data.startswith(PREFIX):
+        return parse_legacy(data)
+    try:
+        encoded = data[1:]
+        raw = base64.urlsafe_b64decode(encoded + '=' * (-len(encoded) % 4))
+        action, item_id = _HEADER.unpack_from(raw)
+        token = raw[_HEADER.size:]
+        return Callback(Action(action), item_id, payloads.get(token) if token else None)
+    except (ValueError, struct.error):
+        return None
+
+
+def parse_legacy(data):
+    """Кнопки старого формата из уже отправленных сообщений"""
+    try:
+        if data.startswith('show_actor_'):
+            return Callback(Action.SHOW_ACTOR, int(data[len('show_actor_'):]))
+        if data.startswith('show_') or data.startswith('details_'):
+            item_id, media_type = data.split('_', 1)[1].split('_', 1)
+            return Callback(SHOW_ACTIONS.get(media_type, Action.SHOW_MOVIE), int(item_id))
+        if data.startswith('similar_'):
+            item_id, media_type = data[len('similar_'):].split('_', 1)
+            return Callback(SIMILAR_ACTIONS.get(media_type, Action.SIMILAR_MOVIE), int(item_id))
+        for prefix, action in (('add_watched_', Action.ADD_WATCHED), ('add_watch_', Action.ADD_WATCH)):
+            if data.startswith(prefix):
+                # Название может содержать '_', поэтому делим только по первому
+                item_id, _, title = data[len(prefix):].partition('_')
+                return Callback(action, int(item_id), {'title': title} if title else None)
+    except ValueError:
+        pass
+    return None
+
+
+# === КНОПКИ ===
+
+def show(item_id, media_type='movie'):
+    return encode(SHOW_ACTIONS.get(media_type, Action.SHOW_MOVIE), item_id)
+
+
+def show_actor(actor_id):
+    return encode(Action.SHOW_ACTOR, actor_id)
+
+
+def add_watch(movie_id, title):
+    return encode(Action.ADD_WATCH, movie_id, {'title': title})
+
+
+def add_watched(movie_id, title):
+    return encode(Action.ADD_WATCHED, movie_id, {'title': title})
+
+
+def similar(item_id, media_type='movie'):
+    return encode(SIMILAR_ACTIONS.get(media_type, Action.SIMILAR_MOVIE), item_id)
+
+
+def watchlist_page(cursor, older, number):
+    """Страница watchlist: id строки в кнопке, время и направление — в контексте"""
+    at, row_id = cursor
+    return encode(Action.WATCHLIST_PAGE, row_id, {'at': at, 'older': older, 'page': number})
+
+
+def watched_page(cursor, older, number):
+    at, row_id = cursor
+    return encode(Action.WATCHED_PAGE, row_id, {'at': at, 'older': older, 'page': number})
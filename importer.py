@@ -0,0 +1,316 @@
+"""
+Импорт и экспорт списков пользователя
+✅ CSV (Letterboxd, IMDb, собственный экспорт), JSON-массив и JSON Lines
+✅ Разбор потоком: в памяти только текущий пакет строк
+✅ Названия -> TMDB id пакетами, параллельно, через кэш ответов и без повторов
+✅ Пакет пишется одной транзакцией (Storage.import_rows)
+✅ Экспорт потоком во временный файл, кусками по ключу (Storage.iter_list)
+"""
+
+import io
+import csv
+import json
+import asyncio
+import logging
+import tempfile
+from datetime import datetime
+from typing import NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+IMPORT_MAX_BYTES = 5 * 1024 * 1024
+IMPORT_MAX_ROWS = 5000
+IMPORT_BATCH = 100        # строк на одну транзакцию
+IMPORT_CONCURRENCY = 4    # одновременных поисков в TMDB (бюджет общий с остальными)
+SPOOL_SIZE = 1024 * 1024  # больше — временный файл на диске
+JSON_CHUNK = 64 * 1024
+UNRESOLVED_SHOWN = 10
+
+EXPORT_FIELDS = ('list', 'tmdb_id', 'title', 'rating', 'date')
+LISTS = ('watchlist', 'watched')
+
+# Заголовок в файле (в нижнем регистре) -> поле
+COLUMNS = {
+    'list': 'list',
+    'tmdb_id': 'tmdb_id', 'tmdbid': 'tmdb_id', 'tmdb id': 'tmdb_id',
+    'const': 'imdb_id', 'imdb_id': 'imdb_id', 'imdbid': 'imdb_id', 'imdb id': 'imdb_id',
+    'title': 'title', 'name': 'title',
+    'year': 'year', 'release year': 'year',
+    'rating': 'rating', 'your rating': 'rating_10',
+    'date': 'date', 'watched date': 'date', 'date rated': 'date', 'added': 'date',
+}
+
+
+class ImportItem(NamedTuple):
+    """Строка файла импорта"""
+    list: str
+    title: str
+    tmdb_id: Optional[int] = None
+    imdb_id: Optional[str] = None
+    year: Optional[str] = None
+    rating: int = 0
+    date: Optional[str] = None
+
+
+class ImportReport:
+    """Итог импорта (и промежуточный прогресс)"""
+
+    def __init__(self):
+        self.rows = 0
+        self.skipped = 0        # строки без названия/id или с ошибкой разбора
+        self.watchlist = 0      # добавлено в список
+        self.watched = 0        # добавлено в просмотренные
+        self.duplicates = 0
+        self.unresolved = []    # названия, не найденные в TMDB
+        self.lookups = 0        # запросов к TMDB
+        self.error = None       # файл повреждён: разбор остановлен (массив JSON, CSV)
+
+    @property
+    def added(self):
+        return self.watchlist + self.watched
+
+
+# === РАЗБОР ===
+
+def _rating(value, scale):
+    """Оценка в звёздах 0..5 (IMDb — из 10, Letterboxd — половинки)"""
+    try:
+        rating = float(value)
+    except (TypeError, ValueError):
+        return 0
+    if scale == 10:
+        rating /= 2
+    return max(0, min(5, int(rating + 0.5)))
+
+
+def _date(value):
+    """ISO-дата/время из файла или None"""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(str(value).strip()).isoformat()
+    except ValueError:
+        return None
+
+
+def to_item(record, default_list):
+    """dict из CSV/JSON -> ImportItem или None"""
+    fields = {}
+    for key, value in record.items():
+        field = COLUMNS.get(str(key).strip().lower())
+        if field and value not in (None, ''):
+            fields[field] = value
+
+    tmdb_id = fields.get('tmdb_id')
+    try:
+        tmdb_id = int(tmdb_id) if tmdb_id is not None else None
+    except (TypeError, ValueError):
+        tmdb_id = None
+    imdb_id = str(fields['imdb_id']).strip() if str(fields.get('imdb_id', '')).startswith('tt') else None
+    title = str(fields.get('title', '')).strip()
+    if not (tmdb_id or imdb_id or title):
+        return None
+
+    if 'rating_10' in fields:
+        rating = _rating(fields['rating_10'], 10)
+    else:
+        rating = _rating(fields.get('rating'), 5)
+    target = str(fields.get('list', default_list)).strip().lower()
+    if target not in LISTS:
+        target = default_list
+    year = str(fields['year']).strip()[:4] if fields.get('year') else None
+    return ImportItem(target, title, tmdb_id, imdb_id, year, rating, _date(fields.get('date')))
+
+
+def _iter_json_array(text):
+    """Элементы JSON-массива по одному, читая файл кусками"""
+    decoder = json.JSONDecoder()
+    buffer = text.read(JSON_CHUNK).lstrip()[1:]  # без '['
+    eof = False
+    pos = 0
+    while True:
+        while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+            pos += 1
+        if pos < len(buffer) and buffer[pos] == ']':
+            return
+        try:
+            value, pos = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            chunk = text.read(JSON_CHUNK)
+            eof = not chunk
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            continue
+        yield value
+
+
+def iter_records(stream):
+    """dict-записи из бинарного файла: формат по первому символу"""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', errors='replace', newline='')
+    head = ''
+    while not head:
+        line = text.readline()
+        if not line:
+            return
+        head = line.strip()
+    text.seek(0)
+
+    if head.startswith('['):
+        yield from _iter_json_array(text)
+    elif head.startswith('{'):
+        # JSON Lines: строки независимы — битая строка пропускается (None), остальные читаются
+        for line in text:
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except ValueError as e:
+                    logger.warning(f"Import parse error: {e}")
+                    yield None
+    else:
+        yield from csv.DictReader(text)
+
+
+def iter_items(stream, default_list, report):
+    """ImportItem по одному; битые строки считаются, а не прерывают импорт"""
+    records = iter_records(stream)
+    while report.rows < IMPORT_MAX_ROWS:
+        try:
+            record = next(records)
+        except StopIteration:
+            return
+        except (ValueError, csv.Error) as e:
+            # Массив JSON или CSV сломан — дальше строк не найти, импорт останавливается
+            logger.warning(f"Import parse error: {e}")
+            report.error = str(e)
+            return
+        report.rows += 1
+        item = to_item(record, default_list) if isinstance(record, dict) else None
+        if item is None:
+            report.skipped += 1
+            continue
+        yield item
+
+
+# === ПОИСК В TMDB ===
+
+class Resolver:
+    """ImportItem -> (movie_id, название); одинаковые строки ищутся один раз"""
+
+    def __init__(self, tmdb, concurrency=IMPORT_CONCURRENCY):
+        self.tmdb = tmdb
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._known = {}  # ключ -> (movie_id, title) или None
+
+    @staticmethod
+    def key(item):
+        if item.tmdb_id:
+            return ('tmdb', item.tmdb_id)
+        if item.imdb_id:
+            return ('imdb', item.imdb_id)
+        return ('title', item.title.lower(), item.year)
+
+    async def _lookup(self, item, report):
+        async with self._semaphore:
+            report.lookups += 1
+            if item.imdb_id:
+                movie = await self.tmdb.find_by_imdb(item.imdb_id)
+            else:
+                movie = await self.tmdb.find_movie(item.title, item.year)
+        if not movie:
+            return None
+        return movie['id'], movie.get('title') or item.title
+
+    async def resolve(self, items, report):
+        """Найти все новые ключи пакета параллельно"""
+        pending = {}
+        for item in items:
+            key = self.key(item)
+            if key in self._known or key in pending:
+                continue
+            if item.tmdb_id:
+                self._known[key] = (item.tmdb_id, item.title or f'TMDB {item.tmdb_id}')
+            else:
+                pending[key] = item
+        if pending:
+            found = await asyncio.gather(*(self._lookup(item, report) for item in pending.values()))
+            self._known.update(zip(pending, found))
+        return [self._known[self.key(item)] for item in items]
+
+
+# === ИМПОРТ ===
+
+async def _write_batch(storage, user_id, items, resolver, report):
+    now = datetime.now().isoformat()
+    resolved = await resolver.resolve(items, report)
+
+    watchlist, watched = [], []
+    for item, found in zip(items, resolved):
+        if found is None:
+            if len(report.unresolved) < UNRESOLVED_SHOWN:
+                report.unresolved.append(item.title or item.imdb_id)
+            continue
+        movie_id, title = found
+        if item.list == 'watchlist':
+            watchlist.append((movie_id, title, item.date or now))
+        else:
+            watched.append((movie_id, title, item.rating, item.date or now))
+
+    listed, seen = await storage.import_rows(user_id, watchlist, watched)
+    report.watchlist += listed
+    report.watched += seen
+    report.duplicates += len(watchlist) + len(watched) - listed - seen
+
+
+async def import_file(stream, user_id, storage, tmdb, default_list='watched', progress=None):
+    """Импорт из бинарного файла; progress(report) вызывается после каждого пакета"""
+    report = ImportReport()
+    resolver = Resolver(tmdb)
+    batch = []
+    for item in iter_items(stream, default_list, report):
+        batch.append(item)
+        if len(batch) >= IMPORT_BATCH:
+            await _write_batch(storage, user_id, batch, resolver, report)
+            batch = []
+            if progress is not None:
+                await progress(report)
+    if batch:
+        await _write_batch(storage, user_id, batch, resolver, report)
+    return report
+
+
+def default_list_for(*hints):
+    """Список по подписи или имени файла: watchlist, иначе просмотренные"""
+    text = ' '.join(h for h in hints if h).lower()
+    return 'watchlist' if 'watchlist' in text or 'список' in text else 'watched'
+
+
+# === ЭКСПОРТ ===
+
+async def export_file(storage, user_id, fmt='csv'):
+    """Списки пользователя во временный файл (CSV или JSON Lines) -> (файл, строк)"""
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+    text = io.TextIOWrapper(spool, encoding='utf-8', newline='')
+    writer = None
+    if fmt == 'csv':
+        writer = csv.writer(text)
+        writer.writerow(EXPORT_FIELDS)
+
+    count = 0
+    for table in LISTS:
+        async for row in storage.iter_list(user_id, table):
+            at, _row_id, movie_id, title = row[:4]
+            rating = row[4] if table == 'watched' else None
+            values = (table, movie_id, title, rating, at)
+            if writer is not None:
+                writer.writerow(values)
+            else:
+                text.write(json.dumps(dict(zip(EXPORT_FIELDS, values)), ensure_ascii=False) + '\n')
+            count += 1
+
+    text.flush()
+    text.detach()
+    spool.seek(0)
+    return spool, count
+
@@ -0,0 +1,233 @@
+"""
+Простые метрики без внешних зависимостей
+✅ Гистограмма задержек с фиксированными корзинами
+✅ Оценка p50/p95/p99 по корзинам
+✅ Счётчики и семейства метрик с метками (endpoint, status, route...)
+✅ Экспорт в текстовом формате Prometheus (/metrics)
+✅ Объединение выводов нескольких процессов с меткой shard (shards.Shards)
+"""
+
+import time
+import functools
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Корзины в секундах (как у Prometheus)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Все метрики для /metrics в порядке регистрации
+REGISTRY = []
+
+
+class Histogram:
+    """Гистограмма задержек"""
+
+    def __init__(self, name, description='', buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)  # последняя — +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        """Записать одно значение"""
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    @contextmanager
+    def time(self):
+        """Замерить время блока кода"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+
+    def quantile(self, q):
+        """Оценка квантиля линейной интерполяцией внутри корзины"""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        cumulative = 0
+        for i, bucket_count in enumerate(self.counts):
+            if cumulative + bucket_count >= target and bucket_count:
+                if i == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i]
+                return lower + (upper - lower) * (target - cumulative) / bucket_count
+            cumulative += bucket_count
+        return self.buckets[-1]
+
+    def snapshot(self):
+        """Сводка для эндпоинтов статистики"""
+        return {
+            'count': self.count,
+            'avg': round(self.sum / self.count, 4) if self.count else 0.0,
+            'p50': round(self.quantile(0.50), 4),
+            'p95': round(self.quantile(0.95), 4),
+            'p99': round(self.quantile(0.99), 4),
+        }
+
+    def samples(self, labels=''):
+        """Строки Prometheus: _bucket, _sum, _count"""
+        sep = ',' if labels else ''
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, self.counts):
+            cumulative += bucket_count
+            yield f'{self.name}_bucket{{{labels}{sep}le="{bound}"}} {cumulative}'
+        yield f'{self.name}_bucket{{{labels}{sep}le="+Inf"}} {self.count}'
+        suffix = f'{{{labels}}}' if labels else ''
+        yield f'{self.name}_sum{suffix} {self.sum}'
+        yield f'{self.name}_count{suffix} {self.count}'
+
+
+class Counter:
+    """Монотонный счётчик"""
+
+    __slots__ = ('name', 'value')
+
+    def __init__(self, name):
+        self.name = name
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def samples(self, labels=''):
+        yield f'{self.name}{{{labels}}} {self.value}' if labels else f'{self.name} {self.value}'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Family:
+    """Метрика с метками: labels(...) возвращает (и кэширует) дочернюю метрику"""
+
+    kind = None
+
+    def __init__(self, name, description='', labelnames=(), register=True):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        if register:
+            REGISTRY.append(self)
+
+    def _create(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = self._create()
+        return child
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} {self.kind}']
+        for values, child in list(self._children.items()):
+            labels = ','.join(f'{k}="{_escape(v)}"' for k, v in zip(self.labelnames, values))
+            lines.extend(child.samples(labels))
+        return lines
+
+
+class HistogramFamily(Family):
+    kind = 'histogram'
+
+    def __init__(self, name, description='', labelnames=(), buckets=DEFAULT_BUCKETS, register=True):
+        self.buckets = buckets
+        super().__init__(name, description, labelnames, register)
+
+    def _create(self):
+        return Histogram(self.name, self.description, self.buckets)
+
+
+class CounterFamily(Family):
+    kind = 'counter'
+
+    def _create(self):
+        return Counter(self.name)
+
+
+class GaugeCallback:
+    """Значения, которые уже считает код (размеры кэшей, очереди): fn() -> число или {метки: число}"""
+
+    def __init__(self, name, description, fn, labelnames=(), kind='gauge'):
+        self.name = name
+        self.description = description
+        self.fn = fn
+        self.labelnames = tuple(labelnames)
+        self.kind = kind
+        REGISTRY.append(self)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} {self.kind}']
+        try:
+            value = self.fn()
+        except Exception:
+            return lines
+        if not isinstance(value, dict):
+            return lines + [f'{self.name} {value}']
+        for values, number in value.items():
+            values = values if isinstance(values, tuple) else (values,)
+            labels = ','.join(f'{k}="{_escape(v)}"' for k, v in zip(self.labelnames, values))
+            lines.append(f'{self.name}{{{labels}}} {number}')
+        return lines
+
+
+def histogram(name, description='', labelnames=(), buckets=DEFAULT_BUCKETS):
+    return HistogramFamily(name, description, labelnames, buckets)
+
+
+def counter(name, description='', labelnames=()):
+    return CounterFamily(name, description, labelnames)
+
+
+def timed(child):
+    """Декоратор корутины: время выполнения в гистограмму"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                child.observe(time.perf_counter() - started)
+        return wrapper
+    return decorator
+
+
+def render():
+    """Все зарегистрированные метрики в текстовом формате Prometheus"""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+def _with_label(sample, label):
+    """name{a="1"} 2 -> name{label,a="1"} 2; name 2 -> name{label} 2"""
+    brace, space = sample.find('{'), sample.find(' ')
+    if 0 <= brace < space:
+        return f'{sample[:brace + 1]}{label},{sample[brace + 1:]}'
+    return f'{sample[:space]}{{{label}}}{sample[space:]}'
+
+
+def merge(texts):
+    """{shard: вывод render()} -> один вывод: HELP/TYPE по разу, у каждой строки метка shard"""
+    families = {}  # имя -> (заголовки, строки)
+    for shard, text in texts.items():
+        label = f'shard="{_escape(shard)}"'
+        family = None
+        for line in text.splitlines():
+            if line.startswith('# '):
+                family = families.setdefault(line.split(' ', 3)[2], ([], []))
+                if line not in family[0]:
+                    family[0].append(line)
+            elif line and family is not None:
+                family[1].append(_with_label(line, label))
+    lines = [line for headers, samples in families.values() for line in headers + samples]
+    return '\n'.join(lines) + '\n'
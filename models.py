@@ -0,0 +1,137 @@
+"""
+Компактные модели фильма и человека
+✅ Ответ TMDB разбирается один раз — остаются только поля, которые бот показывает
+✅ dataclass со __slots__ вместо словарей с полными cast/crew/similar
+✅ Для индекса похожести — только id жанров, ключевых слов, актёров и режиссёров
+✅ Одну модель из кэша делят все обработчики — после разбора её не изменяют
+✅ В кэш ответов пишутся как есть: orjson сериализует dataclass без asdict()
+"""
+
+import heapq
+from dataclasses import dataclass
+
+OVERVIEW_LIMIT = 300   # символов описания в карточке фильма
+BIOGRAPHY_LIMIT = 200  # символов биографии в карточке актёра
+TOP_CAST = 5           # актёров в признаках фильма (как в similarity)
+SIMILAR_KEPT = 20
+ACTOR_TOP_MOVIES = 10
+
+
+def _clip(text, limit):
+    """Лишний символ сохраняем — по нему карточка ставит многоточие"""
+    return (text or '')[:limit + 1]
+
+
+def top_by_popularity(movies, n=ACTOR_TOP_MOVIES):
+    """n самых популярных — частичный отбор через кучу, без полной сортировки"""
+    return heapq.nlargest(n, movies, key=lambda x: x.get('popularity') or 0)
+
+
+@dataclass(slots=True)
+class Movie:
+    """Фильм или сериал: карточка, кнопки и признаки похожести"""
+    id: int
+    media_type: str = 'movie'
+    title: str = ''
+    original_title: str = ''
+    date: str = ''              # release_date / first_air_date
+    vote_average: float = 0.0
+    popularity: float = 0.0
+    overview: str = ''
+    poster_path: str = None
+    genre_ids: tuple = ()
+    keyword_ids: tuple = ()
+    cast_ids: tuple = ()
+    director_ids: tuple = ()
+    similar: tuple = ()         # Movie без собственных similar
+
+    @property
+    def year(self):
+        return self.date[:4] or '—'
+
+    @classmethod
+    def from_tmdb(cls, data, media_type=None, with_similar=True):
+        """Элемент списка или детали TMDB -> Movie"""
+        media_type = data.get('media_type') or media_type or 'movie'
+        if media_type == 'tv':
+            title, original, date = data.get('name'), data.get('original_name'), data.get('first_air_date')
+        else:
+            title, original, date = data.get('title'), data.get('original_title'), data.get('release_date')
+
+        genre_ids = data.get('genre_ids') or [genre['id'] for genre in data.get('genres') or ()]
+        keywords = data.get('keywords') or {}
+        credits = data.get('credits') or {}
+        similar = ()
+        if with_similar:
+            similar = tuple(cls.from_tmdb(item, media_type, with_similar=False)
+                            for item in (data.get('similar') or {}).get('results', [])[:SIMILAR_KEPT]
+                            if item.get('id'))
+        return cls(
+            id=data['id'],
+            media_type=media_type,
+            title=title or original or 'Без названия',
+            original_title=original or '',
+            date=date or '',
+            vote_average=float(data.get('vote_average') or 0),
+            popularity=float(data.get('popularity') or 0),
+            overview=_clip(data.get('overview'), OVERVIEW_LIMIT),
+            poster_path=data.get('poster_path'),
+            genre_ids=tuple(genre_ids),
+            keyword_ids=tuple(k['id'] for k in keywords.get('keywords', keywords.get('results', []))),
+            cast_ids=tuple(person['id'] for person in credits.get('cast', [])[:TOP_CAST]),
+            director_ids=tuple(person['id'] for person in credits.get('crew', []) if person.get('job') == 'Director'),
+            similar=similar,
+        )
+
+    @classmethod
+    def load(cls, data, media_type=None):
+        """Из кэша: сама модель, её словарь (с диска) или ответ TMDB (запись старого формата)"""
+        if isinstance(data, cls):
+            return data
+        if 'cast_ids' not in data:
+            return cls.from_tmdb(data, media_type)
+        movie = cls(**data)
+        if movie.similar:
+            movie.similar = tuple(cls(**item) for item in movie.similar)
+        return movie
+
+
+@dataclass(slots=True)
+class Person:
+    """Актёр: карточка и самые популярные фильмы"""
+    id: int
+    name: str = ''
+    known_for_department: str = ''
+    birthday: str = ''
+    place_of_birth: str = ''
+    biography: str = ''
+    profile_path: str = None
+    popularity: float = 0.0
+    movies: tuple = ()
+
+    @classmethod
+    def from_tmdb(cls, data, movies=None):
+        """Детали человека TMDB (с movie_credits) -> Person с самыми популярными фильмами"""
+        if movies is None:
+            movies = top_by_popularity((data.get('movie_credits') or {}).get('cast', []))
+        return cls(
+            id=data['id'],
+            name=data.get('name') or 'Актёр',
+            known_for_department=data.get('known_for_department') or '',
+            birthday=data.get('birthday') or '',
+            place_of_birth=data.get('place_of_birth') or '',
+            biography=_clip(data.get('biography'), BIOGRAPHY_LIMIT),
+            profile_path=data.get('profile_path'),
+            popularity=float(data.get('popularity') or 0),
+            movies=tuple(Movie.from_tmdb(movie, 'movie', with_similar=False) for movie in movies),
+        )
+
+    @classmethod
+    def load(cls, data):
+        if isinstance(data, cls):
+            return data
+        if 'movies' not in data:
+            return cls.from_tmdb(data)
+        person = cls(**data)
+        person.movies = tuple(Movie(**movie) for movie in person.movies)
+        return person
@@ -0,0 +1,117 @@
+"""
+Прогрев популярных списков (задача JobQueue)
+✅ Популярное, топ рейтинга и тренды обновляются по расписанию
+✅ Списки хранятся в памяти — кнопки меню без запросов к TMDB
+✅ Детали фильмов из списков заранее попадают в кэш ответов
+✅ Постеры заранее загружаются в Telegram (если задан служебный чат)
+✅ Несколько воркеров: прогревает один (job), остальные берут списки из общего кэша (follow)
+"""
+
+import os
+import time
+import asyncio
+import logging
+
+from telegram.error import TelegramError
+
+from ratelimit import cache_only
+
+logger = logging.getLogger(__name__)
+
+WARM_INTERVAL = int(os.environ.get('WARM_INTERVAL', 15 * 60))
+WARM_FOLLOW_DELAY = 30  # остальные воркеры читают списки позже, когда воркер 0 их прогрел
+# Служебный чат для загрузки постеров и получения file_id (необязательно)
+POSTER_CACHE_CHAT_ID = os.environ.get('POSTER_CACHE_CHAT_ID')
+POSTER_WARM_LIMIT = 20  # постеров за один прогон
+
+
+class WarmLists:
+    """Списки фильмов в памяти с фоновым обновлением"""
+
+    def __init__(self, tmdb, file_ids=None, poster_url=None):
+        self.tmdb = tmdb
+        self.file_ids = file_ids
+        self.poster_url = poster_url
+        self.sources = {
+            'popular': tmdb.get_popular_movies,
+            'top_rated': tmdb.get_top_rated_movies,
+            'trending': tmdb.get_trending_movies,
+        }
+        self.lists = {}
+        self.updated_at = {}
+        self.refreshes = 0
+
+    def get(self, name):
+        """Список из памяти или None, если ещё не прогрет"""
+        return self.lists.get(name) or None
+
+    async def _load_lists(self):
+        names = list(self.sources)
+        results = await asyncio.gather(*(self.sources[name]() for name in names))
+
+        for name, movies in zip(names, results):
+            # Пустой ответ (TMDB недоступен) не затирает старый список
+            if movies:
+                self.lists[name] = movies
+                self.updated_at[name] = time.time()
+        return names
+
+    async def refresh(self, bot=None):
+        """Обновить списки и прогреть детали и постеры"""
+        names = await self._load_lists()
+
+        movies = {m['id']: m for name in names for m in self.lists.get(name, []) if m.get('id')}
+
+        # Детали для следующего клика show_ — в кэш ответов
+        await asyncio.gather(*(self.tmdb.get_movie_details(movie_id) for movie_id in movies))
+
+        if bot is not None and POSTER_CACHE_CHAT_ID and self.file_ids is not None:
+            await self._warm_posters(bot, movies.values())
+
+        self.refreshes += 1
+        logger.info(f"🔥 Прогрето: {', '.join(f'{n}={len(self.lists.get(n, []))}' for n in names)}, "
+                    f"детали {len(movies)}")
+
+    async def _warm_posters(self, bot, movies):
+        """Загрузить постеры в служебный чат и запомнить file_id"""
+        sent = 0
+        for movie in movies:
+            path = movie.get('poster_path')
+            if not path or await self.file_ids.get(path):
+                continue
+            try:
+                message = await bot.send_photo(POSTER_CACHE_CHAT_ID, photo=self.poster_url(path),
+                                               disable_notification=True)
+                self.file_ids.set(path, message.photo[-1].file_id)
+                await message.delete()
+            except TelegramError as e:
+                logger.warning(f"Poster warm error for {path}: {e}")
+            sent += 1
+            if sent >= POSTER_WARM_LIMIT:
+                break
+
+    async def job(self, context):
+        """Колбэк для JobQueue.run_repeating"""
+        try:
+            await self.refresh(context.bot)
+        except Exception as e:
+            logger.error(f"Warm lists error: {e}")
+
+    async def follow(self, context):
+        """Колбэк JobQueue остальных воркеров: списки из общего кэша, без запросов к TMDB"""
+        try:
+            with cache_only():
+                await self._load_lists()
+        except Exception as e:
+            logger.error(f"Warm lists error: {e}")
+
+    def stats(self):
+        """Размеры списков и возраст"""
+        now = time.time()
+        return {
+            'refreshes': self.refreshes,
+            'lists': {
+                name: {'size': len(movies), 'age': round(now - self.updated_at[name])}
+                for name, movies in self.lists.items()
+            },
+        }
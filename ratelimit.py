@@ -0,0 +1,189 @@
+"""
+Ограничение частоты запросов
+✅ Token bucket: равномерная скорость + допустимый всплеск
+✅ Общий бюджет запросов к TMDB (очередь с ограниченным ожиданием)
+✅ Пауза по HTTP 429 с учётом Retry-After
+✅ Бюджет на пользователя: сверх лимита — только из кэша
+✅ Счётчики: длина очереди, отказы, паузы
+"""
+
+import os
+import time
+import asyncio
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# TMDB: ~40-50 запросов в секунду с одного IP
+TMDB_RATE = float(os.environ.get('TMDB_RATE', 40))
+TMDB_BURST = int(os.environ.get('TMDB_BURST', 40))
+TMDB_MAX_WAIT = float(os.environ.get('TMDB_MAX_WAIT', 3.0))  # дольше — отказ, а не очередь
+RETRY_429 = 2
+DEFAULT_RETRY_AFTER = 1.0
+
+# Пользователь: всплеск из нескольких нажатий, дальше — одно в секунду
+USER_RATE = float(os.environ.get('USER_RATE', 1.0))
+USER_BURST = int(os.environ.get('USER_BURST', 5))
+MAX_USERS = 10000
+
+# Обработка обновления без сетевых запросов к TMDB (см. TMDBClient.request)
+CACHE_ONLY = ContextVar('cache_only', default=False)
+
+
+@contextmanager
+def cache_only(enabled=True):
+    """Внутри блока TMDBClient отвечает только из кэша"""
+    token = CACHE_ONLY.set(enabled)
+    try:
+        yield
+    finally:
+        CACHE_ONLY.reset(token)
+
+
+def background_context():
+    """Контекст для фоновой задачи: копия текущего, но без cache_only
+
+    Задача, созданная внутри cache_only(), иначе унаследует запрет на сеть
+    и будет обновлять кэш пустыми ответами.
+    """
+    context = copy_context()
+    context.run(CACHE_ONLY.set, False)
+    return context
+
+
+def parse_retry_after(value):
+    """Секунды из заголовка Retry-After (дату не разбираем)"""
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return DEFAULT_RETRY_AFTER
+
+
+class TokenBucket:
+    """Ведро токенов; токены можно занимать в долг (очередь ожидания)"""
+
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()  # может быть в будущем — пауза
+
+    def _refill(self, now):
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def try_acquire(self, now=None):
+        """Взять токен, только если он есть прямо сейчас"""
+        now = now or time.monotonic()
+        self._refill(now)
+        if self.tokens >= 1 and self.updated <= now:
+            self.tokens -= 1
+            return True
+        return False
+
+    def reserve(self, now=None):
+        """Занять токен, вернуть время ожидания до него (в секундах)"""
+        now = now or time.monotonic()
+        self._refill(now)
+        self.tokens -= 1
+        return max(0.0, self.updated - now) + max(0.0, -self.tokens / self.rate)
+
+    def cancel(self):
+        """Вернуть занятый токен"""
+        self.tokens += 1
+
+    def pause(self, seconds, now=None):
+        """Не выдавать токены ближайшие seconds секунд"""
+        now = now or time.monotonic()
+        self._refill(now)
+        self.tokens = min(self.tokens, 0.0)
+        self.updated = max(self.updated, now + seconds)
+
+
+class TMDBBudget:
+    """Общий лимит запросов к TMDB"""
+
+    def __init__(self, rate=TMDB_RATE, burst=TMDB_BURST, max_wait=TMDB_MAX_WAIT):
+        self.bucket = TokenBucket(rate, burst)
+        self.max_wait = max_wait
+        self.waiting = 0
+        self.acquired = 0
+        self.delayed = 0
+        self.rejected = 0
+        self.backoffs = 0
+
+    async def acquire(self):
+        """Дождаться своей очереди; False — ждать дольше max_wait"""
+        wait = self.bucket.reserve()
+        if wait > self.max_wait:
+            self.bucket.cancel()
+            self.rejected += 1
+            return False
+        if wait:
+            self.delayed += 1
+            self.waiting += 1
+            try:
+                await asyncio.sleep(wait)
+            finally:
+                self.waiting -= 1
+        self.acquired += 1
+        return True
+
+    def try_acquire(self):
+        """Токен без ожидания (дополнительные запросы — только из запаса)"""
+        if self.bucket.try_acquire():
+            self.acquired += 1
+            return True
+        return False
+
+    def backoff(self, retry_after):
+        """TMDB ответил 429 — пауза для всех запросов"""
+        self.backoffs += 1
+        self.bucket.pause(retry_after)
+        logger.warning(f"TMDB 429: пауза {retry_after:.1f} с")
+
+    def stats(self):
+        return {
+            'queue': self.waiting,
+            'acquired': self.acquired,
+            'delayed': self.delayed,
+            'rejected': self.rejected,
+            'backoffs': self.backoffs,
+        }
+
+
+class UserLimiter:
+    """Ведро на пользователя (ограниченное число пользователей в памяти)"""
+
+    def __init__(self, rate=USER_RATE, burst=USER_BURST, max_users=MAX_USERS):
+        self.rate = rate
+        self.burst = burst
+        self.max_users = max_users
+        self._buckets = OrderedDict()
+        self.allowed = 0
+        self.throttled = 0
+
+    def allow(self, user_id):
+        """True — обновление в пределах бюджета пользователя"""
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            bucket = self._buckets[user_id] = TokenBucket(self.rate, self.burst)
+            while len(self._buckets) > self.max_users:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(user_id)
+
+        if bucket.try_acquire():
+            self.allowed += 1
+            return True
+        self.throttled += 1
+        return False
+
+    def stats(self):
+        return {'users': len(self._buckets), 'allowed': self.allowed, 'throttled': self.throttled}
@@ -0,0 +1,247 @@
+"""
+Рекомендации по всей истории просмотров
+✅ Похожие/рекомендованные списки кэшируются по фильму
+✅ Кандидаты набираются инкрементально: новые просмотры дозагружаются порциями
+✅ Фильм, которого нет в TMDB, не запрашивается снова; сбои — не больше MAX_ATTEMPTS раз
+✅ Вес кандидата учитывает оценку и давность просмотра
+✅ Просмотренное и watchlist отфильтровываются по множеству id
+✅ Небольшая очередь готовых рекомендаций — «🎲 Ещё» отвечает сразу
+✅ Локальный индекс похожести (similarity.FeatureIndex) — работает и без TMDB
+"""
+
+import time
+import random
+import asyncio
+import logging
+from datetime import datetime
+from collections import OrderedDict, deque
+
+from models import Movie
+from ratelimit import CACHE_ONLY, background_context
+
+logger = logging.getLogger(__name__)
+
+QUEUE_SIZE = 10          # готовых рекомендаций на пользователя
+REFILL_AT = 3            # дозаполнять очередь, когда осталось столько
+BATCH_SIZE = 20          # фильмов истории за одно дозаполнение
+HALF_LIFE_DAYS = 60      # вес просмотра падает вдвое за этот срок
+DEFAULT_RATING = 3       # для просмотров без оценки
+MAX_USERS = 10000
+MAX_SIMILAR = 5000
+LOCAL_CANDIDATES = QUEUE_SIZE * 4  # кандидатов из локального индекса
+LOCAL_WEIGHT = 2.0                 # вес косинусной близости к профилю
+MAX_ATTEMPTS = 3                   # неудачных запросов похожих к фильму истории, потом пропускаем
+
+
+class UserState:
+    """Кандидаты и очередь одного пользователя"""
+
+    __slots__ = ('seen', 'processed', 'failures', 'history', 'scores', 'local', 'movies', 'queue', 'lock',
+                 'loaded')
+
+    def __init__(self):
+        self.seen = set()        # просмотренное + watchlist
+        self.processed = set()   # фильмы истории, чьи похожие уже учтены
+        self.failures = {}       # фильм истории -> неудачных попыток получить похожие
+        self.history = None      # [(movie_id, rating, watched_at)]; None — перечитать из БД
+        self.scores = {}         # кандидат -> вес
+        self.local = {}          # кандидат -> близость к профилю (локальный индекс)
+        self.movies = {}         # кандидат -> models.Movie
+        self.queue = deque()
+        self.lock = asyncio.Lock()
+        self.loaded = False
+
+
+def history_weight(rating, watched_at, now=None):
+    """Вес просмотра: оценка × экспоненциальное затухание по давности"""
+    now = now or time.time()
+    try:
+        age_days = max(0.0, (now - datetime.fromisoformat(watched_at).timestamp()) / 86400)
+    except (TypeError, ValueError):
+        age_days = 0.0
+    return (rating or DEFAULT_RATING) / DEFAULT_RATING * 0.5 ** (age_days / HALF_LIFE_DAYS)
+
+
+class Recommender:
+    """Движок рекомендаций поверх TMDB similar/recommendations"""
+
+    def __init__(self, tmdb, storage, fallback=None, index=None):
+        self.tmdb = tmdb
+        self.storage = storage
+        self.fallback = fallback  # async () -> список популярных фильмов
+        self.index = index        # similarity.FeatureIndex или None
+        self.local_picks = 0
+        self._users = OrderedDict()
+        self._similar = OrderedDict()
+        self._refills = set()
+
+    # === КЭШ ПОХОЖИХ ===
+
+    async def similar_for(self, movie_id):
+        """Похожие + рекомендованные к фильму (кэш в памяти); None — TMDB не ответил, не кэшируется
+
+        Фильма нет в TMDB (404, неверный id из импорта) — кэшируется пустой список.
+        """
+        cached = self._similar.get(movie_id)
+        if cached is not None:
+            self._similar.move_to_end(movie_id)
+            return cached
+
+        details, recommended = await asyncio.gather(
+            self.tmdb.get_movie_details(movie_id),
+            self.tmdb.get_recommendations(movie_id)
+        )
+        if details is not None:
+            similar = details.similar
+        elif self.tmdb.missing(f'/movie/{movie_id}'):
+            similar = ()  # повтор не поможет — запоминаем, что похожих нет
+        else:
+            # Ошибка, открытый размыкатель, лимит или cache_only — спросим в следующий раз
+            return None
+
+        recommended = [Movie.from_tmdb(item, 'movie', with_similar=False) for item in recommended if item.get('id')]
+        merged = {}
+        for movie in recommended + list(similar):
+            merged.setdefault(movie.id, movie)
+        result = list(merged.values())
+
+        self._similar[movie_id] = result
+        while len(self._similar) > MAX_SIMILAR:
+            self._similar.popitem(last=False)
+        return result
+
+    # === СОСТОЯНИЕ ПОЛЬЗОВАТЕЛЯ ===
+
+    def _state(self, user_id):
+        state = self._users.get(user_id)
+        if state is None:
+            state = self._users[user_id] = UserState()
+            while len(self._users) > MAX_USERS:
+                self._users.popitem(last=False)
+        else:
+            self._users.move_to_end(user_id)
+        return state
+
+    async def _refill(self, user_id, state):
+        """Учесть новую порцию истории и пересобрать очередь"""
+        async with state.lock:
+            if not state.loaded:
+                state.seen = await self.storage.get_seen_ids(user_id)
+                state.loaded = True
+
+            if state.history is None:
+                state.history = await self.storage.get_history(user_id)
+            history = state.history
+            # Новые просмотры — вперёд; неудачные попытки не занимают порцию раньше них
+            pending = sorted((row for row in history if row[0] not in state.processed),
+                             key=lambda row: state.failures.get(row[0], 0))[:BATCH_SIZE]
+
+            lists = await asyncio.gather(*(self.similar_for(movie_id) for movie_id, _, _ in pending))
+            now = time.time()
+            for (movie_id, rating, watched_at), candidates in zip(pending, lists):
+                if candidates is None:
+                    self._failed(state, movie_id)
+                    continue
+                state.processed.add(movie_id)
+                state.failures.pop(movie_id, None)
+                weight = history_weight(rating, watched_at, now)
+                for position, movie in enumerate(candidates):
+                    candidate_id = movie.id
+                    # Выше в списке TMDB — ближе к исходному фильму
+                    state.scores[candidate_id] = state.scores.get(candidate_id, 0.0) + weight / (1 + 0.1 * position)
+                    state.movies.setdefault(candidate_id, movie)
+
+            if self.index is not None:
+                self._score_local(state, history, now)
+
+            def score(cid):
+                return state.scores.get(cid, 0.0) + LOCAL_WEIGHT * state.local.get(cid, 0.0)
+
+            queued = set(state.queue)
+            best = sorted(
+                (cid for cid in state.scores.keys() | state.local.keys()
+                 if cid not in state.seen and cid not in queued),
+                key=score, reverse=True
+            )[:QUEUE_SIZE * 2]
+            # Немного случайности, чтобы «Ещё» не было однообразным
+            picks = random.sample(best, min(len(best), QUEUE_SIZE - len(state.queue)))
+            picks.sort(key=score, reverse=True)
+            state.queue.extend(picks)
+
+    def _failed(self, state, movie_id):
+        """Похожие не получены: попробуем при следующем дозаполнении, но не больше MAX_ATTEMPTS раз"""
+        if CACHE_ONLY.get():
+            return  # в сеть не ходили — попытка не считается
+        state.failures[movie_id] = state.failures.get(movie_id, 0) + 1
+        if state.failures[movie_id] >= MAX_ATTEMPTS:
+            logger.warning(f"No similar for movie {movie_id} after {MAX_ATTEMPTS} attempts — skipped")
+            state.processed.add(movie_id)
+            del state.failures[movie_id]
+
+    def _score_local(self, state, history, now):
+        """Близость кандидатов к профилю всей истории — без запросов к TMDB"""
+        profile = self.index.profile(
+            (movie_id, history_weight(rating, watched_at, now)) for movie_id, rating, watched_at in history
+        )
+        state.local = {}
+        for movie_id, similarity in self.index.top_k(profile, LOCAL_CANDIDATES, exclude=state.seen):
+            meta = self.index.meta.get(movie_id)
+            if meta:
+                state.local[movie_id] = similarity
+                if movie_id not in state.movies:
+                    state.movies[movie_id] = Movie.from_tmdb(meta, 'movie', with_similar=False)
+
+    def _schedule_refill(self, user_id, state):
+        # Дозаполнение идёт в сеть, даже если запущено из обработки сверх лимита
+        task = asyncio.create_task(self._refill(user_id, state), context=background_context())
+        self._refills.add(task)
+        task.add_done_callback(self._refills.discard)
+
+    # === ПУБЛИЧНЫЙ API ===
+
+    async def recommend(self, user_id):
+        """Следующая рекомендация (models.Movie) или None"""
+        state = self._state(user_id)
+        if not state.queue:
+            await self._refill(user_id, state)
+
+        while state.queue:
+            movie_id = state.queue.popleft()
+            if movie_id in state.seen:
+                continue
+            if len(state.queue) < REFILL_AT:
+                self._schedule_refill(user_id, state)
+            state.seen.add(movie_id)  # не повторять в этой сессии
+            if movie_id not in state.scores:
+                self.local_picks += 1
+            return state.movies[movie_id]
+
+        # История пуста или всё уже показано — популярное без просмотренного
+        popular = await self.fallback() if self.fallback else []
+        fresh = [m for m in popular if m.get('id') not in state.seen]
+        if not (fresh or popular):
+            return None
+        return Movie.from_tmdb(random.choice(fresh or popular), 'movie', with_similar=False)
+
+    def mark_seen(self, user_id, movie_id):
+        """Фильм добавлен в watchlist или просмотренные"""
+        state = self._users.get(user_id)
+        if state is not None:
+            state.seen.add(movie_id)
+
+    def on_watched(self, user_id, movie_id):
+        """Новый просмотр: учесть его похожие при следующем дозаполнении"""
+        state = self._users.get(user_id)
+        if state is not None:
+            state.seen.add(movie_id)
+            state.history = None
+            self._schedule_refill(user_id, state)
+
+    def forget(self, user_id):
+        """Списки изменены целиком (импорт): состояние соберётся заново из БД"""
+        self._users.pop(user_id, None)
+
+    def stats(self):
+        """Размеры кэшей"""
+        return {'users': len(self._users), 'similar_lists': len(self._similar),
+                'local_picks': self.local_picks}
@@ -0,0 +1,207 @@
+"""
+Отрисовка карточек и списков (HTML для Telegram)
+✅ Всё, что пришло из TMDB или от пользователя, экранируется перед вставкой в HTML
+✅ Готовая карточка (текст, клавиатура, картинка) — одна на (вид, id, язык)
+✅ Карточка сбрасывается, когда ответ TMDB, из которого она собрана, обновлён из сети
+✅ Тексты и клавиатуры списков собираются за один проход (join, без +=)
+"""
+
+import re
+import html
+from datetime import datetime
+from typing import NamedTuple, Optional
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+import callbacks
+from cache import CARD_SIZE, CARD_TTL, TTLCache
+from models import BIOGRAPHY_LIMIT, OVERVIEW_LIMIT
+
+BACK_ROW = (InlineKeyboardButton("◀️ Меню", callback_data='back'),)
+TYPE_EMOJI = {'movie': "🎬", 'tv': "📺"}
+
+# Пути ответов TMDB, из которых собираются карточки: /movie/550, /tv/1399, /person/6193
+_CARD_PATH = re.compile(r'^/(movie|tv|person)/(\d+)$')
+
+
+def esc(text):
+    """Текст для parse_mode='HTML' (кнопки не экранируются — Telegram их не разбирает)"""
+    return html.escape(str(text), quote=False)
+
+
+def clip(text, limit):
+    return text[:limit] + '...' if len(text) > limit else text
+
+
+class Card(NamedTuple):
+    """Готовое сообщение"""
+    text: str
+    reply_markup: InlineKeyboardMarkup
+    photo: Optional[str] = None  # poster_path / profile_path
+
+
+# === КАРТОЧКИ ===
+
+def movie_text(movie):
+    """Текст карточки фильма или сериала (models.Movie)"""
+    overview = esc(clip(movie.overview, OVERVIEW_LIMIT)) if movie.overview else 'Описание отсутствует'
+    return (f"{TYPE_EMOJI.get(movie.media_type, '🎬')} <b>{esc(movie.title)}</b>\n\n"
+            f"📅 Год: {movie.year}\n"
+            f"⭐ Рейтинг: {movie.vote_average:.1f}/10\n\n"
+            f"📖 <b>Описание:</b>\n{overview}")
+
+
+def _age(birthday):
+    try:
+        return (datetime.now() - datetime.strptime(birthday, '%Y-%m-%d')).days // 365
+    except ValueError:
+        return None
+
+
+def _actor_text(actor):
+    lines = [f"🎭 <b>{esc(actor.name)}</b>\n"]
+    if actor.known_for_department:
+        lines.append(f"👤 {esc(actor.known_for_department)}")
+    if actor.birthday:
+        age = _age(actor.birthday)
+        lines.append(f"🎂 {esc(actor.birthday)} ({age} лет)" if age is not None else f"🎂 {esc(actor.birthday)}")
+    if actor.place_of_birth:
+        lines.append(f"🌍 {esc(actor.place_of_birth)}")
+    biography = esc(clip(actor.biography, BIOGRAPHY_LIMIT)) if actor.biography else 'Биография отсутствует'
+    lines.append(f"\n📖 <b>О актёре:</b>\n{biography}\n")
+    lines.append(f"🎬 <b>ФИЛЬМЫ ({len(actor.movies)}):</b>\n\nВыберите фильм:")
+    return '\n'.join(lines)
+
+
+class Renderer:
+    """Карточки в памяти: (вид, тип, id, язык) -> Card, с TTL меньше жизни контекста кнопок"""
+
+    def __init__(self, ttl=CARD_TTL, max_size=CARD_SIZE):
+        self._cards = TTLCache(ttl, max_size)
+        self.invalidated = 0
+
+    def _memoized(self, key, build):
+        card = self._cards.get(key)
+        if card is None:
+            card = build()
+            self._cards.set(key, card)
+        return card
+
+    def movie_card(self, movie, language):
+        """Карточка фильма: в список / посмотрел / похожие"""
+        def build():
+            keyboard = (
+                (InlineKeyboardButton("➕ В список", callback_data=callbacks.add_watch(movie.id, movie.title)),
+                 InlineKeyboardButton("✅ Посмотрел", callback_data=callbacks.add_watched(movie.id, movie.title))),
+                (InlineKeyboardButton("🎲 Похожие", callback_data=callbacks.similar(movie.id, movie.media_type)),
+                 BACK_ROW[0]),
+            )
+            return Card(movie_text(movie), InlineKeyboardMarkup(keyboard), movie.poster_path)
+        return self._memoized(('movie', movie.media_type, movie.id, language), build)
+
+    def recommendation_card(self, movie, language):
+        """Карточка «🎲 Что посмотреть?»: с кнопками «Подробнее» и «Ещё»"""
+        def build():
+            keyboard = (
+                (InlineKeyboardButton("➕ В список", callback_data=callbacks.add_watch(movie.id, movie.title)),
+                 InlineKeyboardButton("✅ Посмотрел", callback_data=callbacks.add_watched(movie.id, movie.title))),
+                (InlineKeyboardButton("🔍 Подробнее", callback_data=callbacks.show(movie.id, 'movie')),),
+                (InlineKeyboardButton("🎲 Ещё", callback_data='smart_rec'), BACK_ROW[0]),
+            )
+            text = f"🎲 <b>РЕКОМЕНДАЦИЯ</b>\n\n{movie_text(movie)}"
+            return Card(text, InlineKeyboardMarkup(keyboard), movie.poster_path)
+        return self._memoized(('rec', movie.media_type, movie.id, language), build)
+
+    def actor_card(self, actor, language):
+        """Карточка актёра (models.Person) со списком фильмов"""
+        def build():
+            keyboard = [
+                (InlineKeyboardButton(f"⭐ {movie.vote_average:.1f} — {movie.title} ({movie.year})",
+                                      callback_data=callbacks.show(movie.id, 'movie')),)
+                for movie in actor.movies
+            ]
+            keyboard.append(BACK_ROW)
+            return Card(_actor_text(actor), InlineKeyboardMarkup(keyboard), actor.profile_path)
+        return self._memoized(('person', 'person', actor.id, language), build)
+
+    def on_refresh(self, path, language):
+        """Наблюдатель TMDBClient: ответ пришёл из сети — карточки из старого ответа сбрасываются"""
+        match = _CARD_PATH.match(path)
+        if match is None:
+            return
+        kind, item_id = match.group(1), int(match.group(2))
+        keys = [('person', 'person')] if kind == 'person' else [('movie', kind), ('rec', kind)]
+        for prefix in keys:
+            if self._cards.invalidate(prefix + (item_id, language)):
+                self.invalidated += 1
+
+    def stats(self):
+        return {**self._cards.stats(), 'invalidated': self.invalidated}
+
+
+# === СПИСКИ ===
+
+def movie_list(items, numbered=False):
+    """Клавиатура «Популярное»/«Топ»: кнопка на фильм (элементы списка TMDB — dict)"""
+    keyboard = [
+        (InlineKeyboardButton(
+            f"{f'{i}. ' if numbered else ''}⭐ {item.get('vote_average', 0):.1f} — {item.get('title', 'Фильм')}",
+            callback_data=callbacks.show(item.get('id'), 'movie')
+        ),)
+        for i, item in enumerate(items, 1)
+    ]
+    keyboard.append(BACK_ROW)
+    return InlineKeyboardMarkup(keyboard)
+
+
+def similar_list(movie):
+    """Похожие на фильм или сериал (models.Movie.similar): текст и клавиатура"""
+    text = f"🎲 <b>ПОХОЖИЕ</b> на «{esc(movie.title)}»:\n\n"
+    keyboard = [
+        (InlineKeyboardButton(f"⭐ {item.vote_average:.1f} — {item.title} ({item.year})",
+                              callback_data=callbacks.show(item.id, item.media_type)),)
+        for item in movie.similar[:10]
+    ]
+    keyboard.append((InlineKeyboardButton("◀️ Назад", callback_data=callbacks.show(movie.id, movie.media_type)),
+                     BACK_ROW[0]))
+    return text, InlineKeyboardMarkup(keyboard)
+
+
+def _item_button(item):
+    title = item.get('title') or item.get('name', 'Без названия')
+    year = (item.get('release_date') or item.get('first_air_date') or '')[:4]
+    media_type = item.get('media_type', 'movie')
+    return (InlineKeyboardButton(
+        f"{TYPE_EMOJI.get(media_type, '🎬')} {title} ({year}) — ⭐ {item.get('vote_average', 0):.1f}",
+        callback_data=callbacks.show(item.get('id'), media_type)
+    ),)
+
+
+def _actor_button(actor):
+    known = [title for title in ((kf.get('title') or kf.get('name')) for kf in actor.get('known_for', [])[:2]) if title]
+    known_text = f" ({', '.join(known)})" if known else ""
+    return (InlineKeyboardButton(
+        f"🎭 {actor.get('name', 'Актёр')}{known_text}",
+        callback_data=callbacks.show_actor(actor.get('id'))
+    ),)
+
+
+def searching(query_text):
+    return f"🔍 Ищу '<b>{esc(query_text)}</b>'..."
+
+
+def not_found(query_text):
+    return (f"❌ По запросу '<b>{esc(query_text)}</b>' ничего не найдено.\n\n"
+            f"💡 Попробуйте другое название или имя актёра!")
+
+
+def search_results(query_text, movies, actors):
+    """Выдача поиска: фильмы и сериалы, затем актёры"""
+    parts = [f"🔍 <b>РЕЗУЛЬТАТЫ ПОИСКА</b>\n\nПо запросу '<i>{esc(query_text)}</i>':\n\n"]
+    if movies:
+        parts.append("🎬 <b>ФИЛЬМЫ И СЕРИАЛЫ:</b>\n\n")
+    if actors:
+        parts.append("🎭 <b>АКТЁРЫ:</b>\n")
+    keyboard = [_item_button(item) for item in movies] + [_actor_button(actor) for actor in actors]
+    keyboard.append(BACK_ROW)
+    return ''.join(parts), InlineKeyboardMarkup(keyboard)
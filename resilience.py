@@ -0,0 +1,106 @@
+"""
+Устойчивость к сбоям TMDB
+✅ Circuit breaker на каждый эндпоинт: после серии ошибок — быстрый отказ
+✅ Пробный запрос после паузы (half-open), пауза растёт при повторных сбоях
+✅ Повторы с джиттером (full jitter) и общий дедлайн на запрос
+✅ Настройки хеджирования медленных запросов (см. TMDBClient._hedged)
+"""
+
+import os
+import time
+import random
+import logging
+
+logger = logging.getLogger(__name__)
+
+BREAKER_FAILURES = int(os.environ.get('TMDB_BREAKER_FAILURES', 5))  # ошибок подряд до размыкания
+BREAKER_COOLDOWN = float(os.environ.get('TMDB_BREAKER_COOLDOWN', 10.0))
+BREAKER_MAX_COOLDOWN = 120.0
+
+HEDGE_DELAY = float(os.environ.get('TMDB_HEDGE_DELAY', 1.0))  # без ответа дольше — второй запрос
+RETRY_ERRORS = 1       # повторов после 5xx и сетевых ошибок
+RETRY_BASE = 0.2       # база экспоненциальной паузы, с
+FETCH_DEADLINE = float(os.environ.get('TMDB_FETCH_DEADLINE', 6.0))  # весь запрос с повторами
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+def backoff_delay(attempt, base=RETRY_BASE, rng=random):
+    """Пауза перед повтором: случайная в [0, base * 2^(attempt-1)]"""
+    return rng.uniform(0, base * 2 ** (attempt - 1))
+
+
+class CircuitBreaker:
+    """Размыкатель для одного эндпоинта"""
+
+    __slots__ = ('name', 'failures', 'cooldown', 'state', 'opened_at', 'probe_at', 'rejected', 'trips')
+
+    def __init__(self, name, cooldown=BREAKER_COOLDOWN):
+        self.name = name
+        self.failures = 0      # ошибок подряд
+        self.cooldown = cooldown
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.probe_at = 0.0    # когда выпущен пробный запрос
+        self.rejected = 0
+        self.trips = 0
+
+    def allow(self, now=None):
+        """Можно ли идти в сеть; в half-open — один пробный запрос"""
+        if self.state == CLOSED:
+            return True
+        now = now or time.monotonic()
+        if self.state == OPEN and now - self.opened_at >= self.cooldown:
+            self.state = HALF_OPEN
+            self.probe_at = now
+            return True
+        if self.state == HALF_OPEN and now - self.probe_at >= self.cooldown:
+            # Пробный запрос так и не отчитался — выпускаем следующий
+            self.probe_at = now
+            return True
+        self.rejected += 1
+        return False
+
+    def success(self):
+        if self.state != CLOSED:
+            logger.info(f"TMDB {self.name}: размыкатель закрыт")
+        self.state = CLOSED
+        self.failures = 0
+        self.cooldown = BREAKER_COOLDOWN
+
+    def failure(self, now=None):
+        now = now or time.monotonic()
+        self.failures += 1
+        if self.state == HALF_OPEN:
+            # Проба не прошла — ждём дольше
+            self.cooldown = min(self.cooldown * 2, BREAKER_MAX_COOLDOWN)
+        elif self.state == OPEN or self.failures < BREAKER_FAILURES:
+            return
+        self.state = OPEN
+        self.opened_at = now
+        self.trips += 1
+        logger.warning(f"TMDB {self.name}: размыкатель открыт на {self.cooldown:.0f} с")
+
+    def snapshot(self):
+        return {'state': self.state, 'failures': self.failures, 'rejected': self.rejected, 'trips': self.trips}
+
+
+class Breakers:
+    """Размыкатели по эндпоинтам (создаются при первом обращении)"""
+
+    def __init__(self):
+        self._breakers = {}
+
+    def __getitem__(self, endpoint):
+        breaker = self._breakers.get(endpoint)
+        if breaker is None:
+            breaker = self._breakers[endpoint] = CircuitBreaker(endpoint)
+        return breaker
+
+    def open_endpoints(self):
+        return [name for name, breaker in self._breakers.items() if breaker.state != CLOSED]
+
+    def stats(self):
+        return {name: breaker.snapshot() for name, breaker in sorted(self._breakers.items())}
@@ -0,0 +1,95 @@
+"""
+Маршрутизатор callback-кнопок
+✅ Точные строки (кнопки меню) — поиск в dict за O(1)
+✅ Кнопки с параметром — по Action из callbacks.decode, тоже O(1)
+✅ Обработчик получает уже разобранный Callback
+✅ Счётчики вызовов и время каждого маршрута (и в /metrics)
+"""
+
+import time
+import logging
+
+import callbacks
+import metrics
+
+logger = logging.getLogger(__name__)
+
+ROUTE_LATENCY = metrics.histogram('callback_route_seconds', 'Время обработки кнопки', ('route',))
+ROUTE_ERRORS = metrics.counter('callback_route_errors_total', 'Исключения в обработчиках кнопок', ('route',))
+UNKNOWN_CALLBACKS = metrics.counter('callback_unknown_total', 'Кнопки без маршрута').labels()
+
+
+class Route:
+    """Обработчик + его статистика"""
+
+    __slots__ = ('name', 'handler', 'answer', 'latency', 'errors')
+
+    def __init__(self, name, handler, answer=True):
+        self.name = name
+        self.handler = handler
+        self.answer = answer  # False — обработчик сам вызывает query.answer(...)
+        self.latency = ROUTE_LATENCY.labels(name)
+        self.errors = ROUTE_ERRORS.labels(name)
+
+
+class CallbackRouter:
+    """Таблица маршрутов вместо цепочки if/elif"""
+
+    def __init__(self):
+        self._static = {}   # callback_data -> Route
+        self._actions = {}  # Action -> Route
+
+    def route(self, *names, answer=True):
+        """Декоратор для кнопок с фиксированной callback_data"""
+        def decorator(handler):
+            for name in names:
+                self._static[name] = Route(name, handler, answer)
+            return handler
+        return decorator
+
+    def action(self, *actions, answer=True):
+        """Декоратор для кнопок с параметром (callbacks.Action)"""
+        def decorator(handler):
+            for action in actions:
+                self._actions[action] = Route(action.name.lower(), handler, answer)
+            return handler
+        return decorator
+
+    def resolve(self, data):
+        """(Route, Callback) для callback_data или (None, None)"""
+        route = self._static.get(data)
+        if route is not None:
+            return route, None
+        payload = callbacks.decode(data)
+        if payload is None:
+            return None, None
+        return self._actions.get(payload.action), payload
+
+    async def dispatch(self, query, context, notice=None):
+        """Найти маршрут и вызвать обработчик (notice — всплывающий текст при ответе)"""
+        route, payload = self.resolve(query.data or '')
+        if route is None:
+            UNKNOWN_CALLBACKS.inc()
+            logger.warning(f"Unknown callback: {query.data!r}")
+            await query.answer()
+            return
+
+        if route.answer:
+            await query.answer(notice)
+
+        started = time.perf_counter()
+        try:
+            await route.handler(query, context, payload)
+        except Exception:
+            route.errors.inc()
+            raise
+        finally:
+            route.latency.observe(time.perf_counter() - started)
+
+    def stats(self):
+        """Вызовы и задержки по маршрутам"""
+        routes = {}
+        for route in list(self._static.values()) + list(self._actions.values()):
+            if route.name not in routes:
+                routes[route.name] = dict(route.latency.snapshot(), errors=route.errors.value)
+        return {'routes': routes, 'unknown': UNKNOWN_CALLBACKS.value}
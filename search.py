@@ -0,0 +1,115 @@
+"""
+Поиск фильмов и актёров
+✅ Оба запроса к TMDB идут одновременно
+✅ Общий дедлайн: показываем то, что успело прийти
+✅ Актёры из /search/multi и /search/person без дублей
+✅ Гистограмма времени поиска (p50/p99)
+✅ Сначала локальный индекс названий: уверенное совпадение — ответ сразу,
+   TMDB обновляет индекс в фоне; нечёткое — запасной ответ, если TMDB пуст
+"""
+
+import os
+import time
+import asyncio
+import logging
+
+import metrics
+from ratelimit import background_context
+from titles import STRONG_MATCH
+
+logger = logging.getLogger(__name__)
+
+SEARCH_DEADLINE = float(os.environ.get('SEARCH_DEADLINE', 3.0))
+MAX_MOVIES = 3
+MAX_ACTORS = 3
+
+SEARCH_LATENCY = metrics.histogram('search_latency_seconds', 'Время поиска в text_handler').labels()
+SEARCH_SOURCE = metrics.counter('search_source_total', 'Откуда взят ответ на поиск', ('source',))
+
+# Запросы, не успевшие к дедлайну, доживают в фоне и наполняют кэш
+_background = set()
+# Запросы, для которых уже идёт фоновое обновление локального ответа
+_refreshing = set()
+
+
+def merge_results(movie_results, actor_results, max_movies=MAX_MOVIES, max_actors=MAX_ACTORS):
+    """Разделить результаты на фильмы/сериалы и актёров (актёры без дублей по id)"""
+    movies = [r for r in movie_results if r.get('media_type') in ['movie', 'tv']][:max_movies]
+
+    actors = []
+    seen_actors = set()
+    persons = [r for r in movie_results if r.get('media_type') == 'person']
+    for actor in persons + actor_results:
+        actor_id = actor.get('id')
+        if actor_id in seen_actors:
+            continue
+        seen_actors.add(actor_id)
+        actors.append(actor)
+        if len(actors) >= max_actors:
+            break
+
+    return movies, actors
+
+
+def split_local(hits, strong=None):
+    """Результаты TitleIndex.search -> (movies, actors), только со схожестью >= strong"""
+    hits = [hit for hit in hits if strong is None or hit[0] >= strong]
+    movies = [item for _, kind, item in hits if kind in ('movie', 'tv')][:MAX_MOVIES]
+    actors = [item for _, kind, item in hits if kind == 'person'][:MAX_ACTORS]
+    return movies, actors
+
+
+def _background_task(coro):
+    task = asyncio.create_task(coro, context=background_context())
+    _background.add(task)
+    task.add_done_callback(_background.discard)
+
+
+async def _refresh(tmdb, query, key):
+    """Фоновый поиск в TMDB: наблюдатели обновят локальный индекс"""
+    try:
+        await asyncio.gather(tmdb.search_movie(query), tmdb.search_actor(query))
+    finally:
+        _refreshing.discard(key)
+
+
+async def search_tmdb(tmdb, query, deadline=SEARCH_DEADLINE):
+    """Параллельный поиск фильмов и актёров в TMDB, возвращает (movies, actors)"""
+    movie_task = asyncio.create_task(tmdb.search_movie(query))
+    actor_task = asyncio.create_task(tmdb.search_actor(query))
+    done, pending = await asyncio.wait({movie_task, actor_task}, timeout=deadline)
+
+    for task in pending:
+        _background.add(task)
+        task.add_done_callback(_background.discard)
+    if pending:
+        logger.warning(f"Search deadline {deadline}s exceeded for '{query}'")
+
+    movie_results = movie_task.result() if movie_task in done else []
+    actor_results = actor_task.result() if actor_task in done else []
+    return merge_results(movie_results, actor_results)
+
+
+async def search_all(tmdb, query, deadline=SEARCH_DEADLINE, local=None):
+    """Поиск фильмов и актёров: локальный индекс (если есть), иначе TMDB; (movies, actors)"""
+    started = time.perf_counter()
+
+    hits = await local.search(query) if local is not None else []
+    movies, actors = split_local(hits, STRONG_MATCH)
+    if movies or actors:
+        key = query.strip().lower()
+        if key not in _refreshing:
+            _refreshing.add(key)
+            _background_task(_refresh(tmdb, query, key))
+        source = 'local'
+    else:
+        movies, actors = await search_tmdb(tmdb, query, deadline)
+        source = 'tmdb'
+        if not (movies or actors) and hits:
+            # Опечатка или TMDB недоступен — похожие названия из индекса
+            movies, actors = split_local(hits)
+            source = 'local_fuzzy'
+
+    SEARCH_SOURCE.labels(source if movies or actors else 'empty').inc()
+    SEARCH_LATENCY.observe(time.perf_counter() - started)
+    return movies, actors
@@ -0,0 +1,308 @@
+"""
+Несколько процессов-обработчиков: обновления шардируются по user_id
+✅ Приёмник (polling или webhook) не обрабатывает обновления, а раскладывает их по воркерам: user_id % SHARDS
+✅ Все обновления пользователя попадают в один процесс и обрабатываются строго по порядку
+✅ Внутри воркера разные пользователи обрабатываются параллельно (UserQueues)
+✅ Кэши пользователя в памяти воркера (счётчики, контекст кнопок) остаются согласованными — у пользователя один воркер
+✅ Кэш ответов TMDB и файл БД — общие (backends, storage); лимит TMDB и индекс похожести — свои у воркера
+✅ Упавший воркер перезапускается, его очередь обновлений сохраняется
+✅ Воркеры присылают приёмнику отчёты (размыкатели TMDB, метрики) — /health и /metrics видят весь кластер
+"""
+
+import os
+import sys
+import time
+import queue
+import signal
+import asyncio
+import logging
+import multiprocessing
+from contextlib import contextmanager
+
+from telegram import Update
+from telegram.ext import TypeHandler
+
+from ratelimit import TMDB_BURST, TMDB_RATE
+from similarity import FEATURES_DIR
+
+logger = logging.getLogger(__name__)
+
+SHARDS = int(os.environ.get('SHARDS', 1))  # 1 — один процесс, как раньше
+SHARD_INDEX = os.environ.get('SHARD_INDEX')  # задаётся воркеру приёмником
+SHARD_CONCURRENCY = int(os.environ.get('SHARD_CONCURRENCY', 64))  # обновлений в работе на воркер
+SHARD_BACKLOG = 4 * SHARD_CONCURRENCY  # сверх этого обновления ждут в очереди приёмника
+SUPERVISE_INTERVAL = 5
+STOP_TIMEOUT = 15
+PARENT_CHECK = 1.0  # как часто воркер проверяет, жив ли приёмник
+REPORT_INTERVAL = 5
+REPORT_STALE = 3 * REPORT_INTERVAL  # отчёта нет дольше — воркер считается недоступным
+
+
+def shard_key(update):
+    """Чьё обновление: пользователь, иначе чат"""
+    if update.effective_user is not None:
+        return update.effective_user.id
+    if update.effective_chat is not None:
+        return update.effective_chat.id
+    return 0
+
+
+def is_primary():
+    """Общие фоновые задачи (очистка кэша в хранилище) — в одном процессе"""
+    return SHARD_INDEX in (None, '0')
+
+
+def worker_env(index, count):
+    """Настройки воркера: доля лимита TMDB и свой каталог индекса похожести"""
+    return {
+        'SHARD_INDEX': str(index),
+        'TMDB_RATE': str(TMDB_RATE / count),
+        'TMDB_BURST': str(max(1, TMDB_BURST // count)),
+        'FEATURES_DIR': os.path.join(FEATURES_DIR, f'shard-{index}'),
+    }
+
+
+@contextmanager
+def _environ(values):
+    """Временно дополнить окружение: его наследует процесс, запущенный внутри блока"""
+    saved = {name: os.environ.get(name) for name in values}
+    os.environ.update(values)
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+# === ВОРКЕР ===
+
+class UserQueues:
+    """Обновления одного пользователя — цепочкой задач, разных пользователей — параллельно"""
+
+    def __init__(self, application, concurrency=SHARD_CONCURRENCY, backlog=SHARD_BACKLOG):
+        self.application = application
+        self._tails = {}  # ключ -> последняя задача пользователя
+        self._slots = asyncio.Semaphore(concurrency)
+        self._backlog = asyncio.Semaphore(backlog)
+        self.processed = 0
+        self.waited = 0  # обновлений, ждавших предыдущее того же пользователя
+
+    async def dispatch(self, update):
+        """Поставить обновление за предыдущим обновлением того же пользователя"""
+        await self._backlog.acquire()
+        key = shard_key(update)
+        previous = self._tails.get(key)
+        self._tails[key] = asyncio.ensure_future(self._run(key, update, previous))
+
+    async def _run(self, key, update, previous):
+        try:
+            if previous is not None:
+                self.waited += 1
+                await asyncio.wait((previous,))
+            async with self._slots:
+                await self.application.process_update(update)
+        except Exception as e:
+            logger.error(f"Shard update {update.update_id} error: {e!r}")
+        finally:
+            self.processed += 1
+            self._backlog.release()
+            if self._tails.get(key) is asyncio.current_task():
+                del self._tails[key]
+
+    async def join(self):
+        """Дождаться всех начатых обновлений"""
+        while self._tails:
+            await asyncio.wait(list(self._tails.values()))
+
+    def stats(self):
+        return {'processed': self.processed, 'in_flight': len(self._tails), 'waited': self.waited}
+
+
+async def consume(updates, users):
+    """Читать обновления приёмника (dict) до None или до смерти приёмника"""
+    loop = asyncio.get_running_loop()
+    parent = multiprocessing.parent_process()
+    bot = users.application.bot
+    while True:
+        try:
+            data = await loop.run_in_executor(None, updates.get, True, PARENT_CHECK)
+        except queue.Empty:
+            if parent is not None and not parent.is_alive():
+                logger.warning("Приёмник завершился — воркер останавливается")
+                return
+            continue
+        if data is None:
+            return
+        await users.dispatch(Update.de_json(data, bot))
+
+
+async def work(application, updates, post_shutdown=None):
+    """Цикл воркера: приложение без polling/webhook, обновления — из очереди приёмника"""
+    users = UserQueues(application)
+    # SIGTERM — дообработать очередь и выйти; SIGINT (Ctrl+C в терминале) останавливает приёмник
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, updates.put, None)
+    async with application:
+        await application.start()
+        logger.info(f"🧩 Воркер {SHARD_INDEX} (pid {os.getpid()}) готов")
+        await consume(updates, users)
+        await users.join()
+        await application.stop()
+    if post_shutdown is not None:
+        await post_shutdown(application)
+    logger.info(f"🧩 Воркер {SHARD_INDEX}: обработано {users.processed}")
+
+
+def reporter(reports, collect):
+    """Задача JobQueue воркера: collect() -> dict отправляется приёмнику"""
+    async def report(context):
+        try:
+            reports.put_nowait((int(SHARD_INDEX), time.time(), collect()))
+        except queue.Full:
+            pass
+    return report
+
+
+def worker_main(index, count, updates, reports):
+    """Точка входа процесса-воркера (окружение — из worker_env, см. Shards._spawn)"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # Запуск `python bot.py`: spawn уже импортировал bot.py как __mp_main__ — второй копии не нужно
+    bot = sys.modules.get('__mp_main__')
+    if not hasattr(bot, 'run_worker'):
+        import bot
+    bot.run_worker(updates, reports)
+
+
+# === ПРИЁМНИК ===
+
+class Shards:
+    """Процессы-воркеры и их очереди; приёмник только раскладывает обновления"""
+
+    def __init__(self, count=SHARDS, target=worker_main, args=()):
+        self.count = count
+        self.target = target
+        self.args = args  # дополнительные аргументы target (для бенчмарка)
+        self._context = multiprocessing.get_context('spawn')
+        self.queues = [self._context.Queue() for _ in range(count)]
+        self.reports = self._context.Queue(maxsize=16 * count)
+        self._latest = {}  # индекс воркера -> (время отчёта, отчёт)
+        self.processes = [None] * count
+        self.forwarded = [0] * count
+        self.restarts = 0
+
+    def _spawn(self, index):
+        process = self._context.Process(target=self.target, args=(index, self.count, self.queues[index], self.reports, *self.args),
+                                        name=f'shard-{index}', daemon=True)
+        # Настройки читаются при импорте модулей — задаём их до старта интерпретатора воркера
+        with _environ(worker_env(index, self.count)):
+            process.start()
+        self.processes[index] = process
+
+    def start(self):
+        for index in range(self.count):
+            self._spawn(index)
+        logger.info(f"🧩 Запущено воркеров: {self.count}")
+        return self
+
+    def put(self, update):
+        """Отдать обновление воркеру пользователя (не блокирует: очередь без ограничения)"""
+        index = shard_key(update) % self.count
+        self.queues[index].put(update.to_dict())
+        self.forwarded[index] += 1
+
+    async def forward(self, update: Update, context):
+        """Обработчик приёмника (TypeHandler)"""
+        self.put(update)
+
+    async def supervise(self, context=None):
+        """Перезапустить упавшие воркеры (задача JobQueue)"""
+        for index, process in enumerate(self.processes):
+            if process is not None and not process.is_alive():
+                logger.error(f"🧩 Воркер {index} завершился (код {process.exitcode}) — перезапуск")
+                self.restarts += 1
+                self._spawn(index)
+
+    def attach(self, application):
+        application.add_handler(TypeHandler(Update, self.forward))
+        application.job_queue.run_repeating(self.supervise, interval=SUPERVISE_INTERVAL, first=SUPERVISE_INTERVAL)
+        return self
+
+    def stop(self, timeout=STOP_TIMEOUT):
+        """Дообработать очереди и остановить воркеры"""
+        for updates in self.queues:
+            updates.put(None)
+        for process in self.processes:
+            if process is not None:
+                process.join(timeout)
+                if process.is_alive():
+                    process.terminate()
+        logger.info("🧩 Воркеры остановлены")
+
+    # === ОТЧЁТЫ ВОРКЕРОВ ===
+
+    def _drain_reports(self):
+        while True:
+            try:
+                index, sent_at, report = self.reports.get_nowait()
+            except queue.Empty:
+                return
+            self._latest[index] = (sent_at, report)
+
+    def _fresh_report(self, index):
+        """Последний отчёт воркера, если он жив и отчитывался недавно"""
+        process = self.processes[index]
+        sent_at, report = self._latest.get(index, (0.0, None))
+        if process is None or not process.is_alive() or time.time() - sent_at > REPORT_STALE:
+            return None
+        return report
+
+    def health(self):
+        """Сводка для /health: degraded, если у воркера открыт размыкатель или нет отчёта"""
+        self._drain_reports()
+        workers, unavailable, missing = [], set(), []
+        for index in range(self.count):
+            report = self._fresh_report(index)
+            if report is None:
+                missing.append(index)
+                workers.append({'shard': index, 'reporting': False})
+                continue
+            unavailable.update(report['tmdb_unavailable'])
+            workers.append({'shard': index, 'reporting': True,
+                            'tmdb_unavailable': report['tmdb_unavailable'], 'tmdb': report['tmdb']})
+        return {
+            'status': 'degraded' if unavailable or missing else 'ok',
+            'tmdb_unavailable': sorted(unavailable),
+            'workers_missing': missing,
+            'workers': workers,
+        }
+
+    def metrics_texts(self):
+        """{shard: вывод metrics.render()} по свежим отчётам воркеров"""
+        self._drain_reports()
+        texts = {}
+        for index in range(self.count):
+            report = self._fresh_report(index)
+            if report is not None:
+                texts[str(index)] = report['metrics']
+        return texts
+
+    def _depth(self, index):
+        try:
+            return self.queues[index].qsize()
+        except NotImplementedError:  # macOS
+            return None
+
+    def stats(self):
+        return {
+            'count': self.count,
+            'restarts': self.restarts,
+            'workers': [
+                {'pid': process.pid if process else None,
+                 'alive': bool(process and process.is_alive()),
+                 'forwarded': self.forwarded[index],
+                 'queue': self._depth(index)}
+                for index, process in enumerate(self.processes)
+            ],
+        }
@@ -0,0 +1,245 @@
+"""
+Локальный индекс похожести фильмов (NumPy)
+✅ Признаки из жанров, ключевых слов и актёров, которые бот уже получил из TMDB
+✅ Hashing trick: фиксированная размерность, новые фильмы без перестройки словаря
+✅ Матрица в memory-mapped .npy — быстрый старт, инкрементальные обновления
+✅ «Топ-k похожих на профиль» — одно матрично-векторное произведение
+✅ Карточки фильмов — только поля для показа, описание обрезано; запись на диск — в потоке
+"""
+
+import os
+import json
+import zlib
+import asyncio
+import logging
+
+import numpy as np
+
+from models import OVERVIEW_LIMIT
+
+logger = logging.getLogger(__name__)
+
+FEATURES_DIR = os.environ.get('FEATURES_DIR', 'features')
+DIMENSIONS = 256
+INITIAL_CAPACITY = 4096
+TOP_CAST = 5
+
+# Вес группы признаков в векторе фильма
+WEIGHTS = {
+    'genre': 1.0,
+    'keyword': 0.7,
+    'director': 0.8,
+    'cast': 0.5,
+}
+
+# Поля, нужные для карточки фильма
+META_FIELDS = ('id', 'title', 'name', 'release_date', 'first_air_date',
+               'vote_average', 'overview', 'poster_path')
+
+
+def _slot(kind, value):
+    """Стабильный индекс и знак признака"""
+    h = zlib.crc32(f'{kind}:{value}'.encode())
+    return h % DIMENSIONS, 1.0 if h & 0x80000000 else -1.0
+
+
+def features_of(movie):
+    """Вектор признаков фильма из ответа TMDB (деталей или элемента списка)"""
+    vector = np.zeros(DIMENSIONS, dtype=np.float32)
+
+    def add(kind, value):
+        index, sign = _slot(kind, value)
+        vector[index] += sign * WEIGHTS[kind]
+
+    genre_ids = movie.get('genre_ids') or [g['id'] for g in movie.get('genres', [])]
+    for genre_id in genre_ids:
+        add('genre', genre_id)
+
+    keywords = movie.get('keywords') or {}
+    for keyword in keywords.get('keywords', keywords.get('results', [])):
+        add('keyword', keyword['id'])
+
+    credits = movie.get('credits') or {}
+    for person in credits.get('cast', [])[:TOP_CAST]:
+        add('cast', person['id'])
+    for person in credits.get('crew', []):
+        if person.get('job') == 'Director':
+            add('director', person['id'])
+
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def card_fields(movie):
+    """Поля карточки; описание обрезано, как в models.Movie (лишний символ — для многоточия)"""
+    entry = {k: movie[k] for k in META_FIELDS if k in movie}
+    if entry.get('overview'):
+        entry['overview'] = entry['overview'][:OVERVIEW_LIMIT + 1]
+    return entry
+
+
+def _write_meta(path, entries):
+    """Переписать meta.jsonl из снимка [(поля, полнота)] (в потоке)"""
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        for entry, richness in entries:
+            f.write(json.dumps(dict(entry, _richness=richness), ensure_ascii=False))
+            f.write('\n')
+    os.replace(tmp, path)
+
+
+def _richness(movie):
+    """Детали (с credits/keywords) богаче элемента списка"""
+    return int('credits' in movie) + int('keywords' in movie)
+
+
+class FeatureIndex:
+    """Матрица признаков фильмов с отображением в файл"""
+
+    def __init__(self, directory=FEATURES_DIR):
+        self.directory = directory
+        self._vectors_path = os.path.join(directory, 'vectors.npy')
+        self._ids_path = os.path.join(directory, 'ids.npy')
+        self._meta_path = os.path.join(directory, 'meta.jsonl')
+
+        self.vectors = None   # memmap (capacity, DIMENSIONS)
+        self.ids = None       # memmap (capacity,)
+        self.count = 0
+        self.rows = {}        # movie_id -> строка
+        self.meta = {}        # movie_id -> поля для карточки
+        self.richness = {}    # movie_id -> насколько полные признаки
+        self._dirty = False
+        self._flush_lock = None
+
+    # === ФАЙЛЫ ===
+
+    def load(self):
+        """Открыть индекс (или создать пустой)"""
+        os.makedirs(self.directory, exist_ok=True)
+        if os.path.exists(self._vectors_path) and os.path.exists(self._ids_path):
+            self.vectors = np.load(self._vectors_path, mmap_mode='r+')
+            self.ids = np.load(self._ids_path, mmap_mode='r+')
+        else:
+            self._allocate(INITIAL_CAPACITY)
+
+        if os.path.exists(self._meta_path):
+            with open(self._meta_path, encoding='utf-8') as f:
+                for line in f:
+                    entry = json.loads(line)
+                    self.richness[entry['id']] = entry.pop('_richness', 0)
+                    self.meta[entry['id']] = card_fields(entry)  # файлы прежних версий — с полным описанием
+
+        self.count = int(np.count_nonzero(self.ids))
+        self.rows = {int(movie_id): row for row, movie_id in enumerate(self.ids[:self.count])}
+        logger.info(f"🧭 Индекс похожести: {self.count} фильмов")
+        return self
+
+    def _allocate(self, capacity):
+        """Создать (или увеличить) файлы матрицы"""
+        old_vectors, old_ids = self.vectors, self.ids
+        tmp_vectors = self._vectors_path + '.tmp'
+        tmp_ids = self._ids_path + '.tmp'
+
+        vectors = np.lib.format.open_memmap(tmp_vectors, mode='w+', dtype=np.float32,
+                                            shape=(capacity, DIMENSIONS))
+        ids = np.lib.format.open_memmap(tmp_ids, mode='w+', dtype=np.int64, shape=(capacity,))
+        if old_vectors is not None:
+            vectors[:self.count] = old_vectors[:self.count]
+            ids[:self.count] = old_ids[:self.count]
+        vectors.flush()
+        ids.flush()
+        del vectors, ids, old_vectors, old_ids
+        self.vectors = self.ids = None
+
+        os.replace(tmp_vectors, self._vectors_path)
+        os.replace(tmp_ids, self._ids_path)
+        self.vectors = np.load(self._vectors_path, mmap_mode='r+')
+        self.ids = np.load(self._ids_path, mmap_mode='r+')
+
+    async def flush(self):
+        """Сбросить изменения на диск: снимок — в цикле событий, запись — в потоке"""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            if not self._dirty:
+                return
+            # Записи meta не изменяются, а заменяются (add) — хватает неглубокой копии
+            entries = [(entry, self.richness.get(movie_id, 0)) for movie_id, entry in self.meta.items()]
+            vectors, ids = self.vectors, self.ids
+            self._dirty = False
+            try:
+                await asyncio.to_thread(self._write, vectors, ids, entries)
+            except OSError as e:
+                self._dirty = True
+                logger.error(f"Features flush error: {e}")
+
+    def _write(self, vectors, ids, entries):
+        vectors.flush()
+        ids.flush()
+        _write_meta(self._meta_path, entries)
+
+    # === ОБНОВЛЕНИЕ ===
+
+    def add(self, movie):
+        """Добавить или обновить фильм (вызывается для каждого ответа TMDB)"""
+        movie_id = movie.get('id')
+        if not movie_id or movie.get('media_type') == 'person':
+            return
+        if self.ids is None:
+            self.load()
+
+        richness = _richness(movie)
+        row = self.rows.get(movie_id)
+        if row is not None and richness <= self.richness.get(movie_id, 0):
+            return  # признаки не полнее уже сохранённых
+
+        if row is None:
+            if self.count >= len(self.ids):
+                self._allocate(len(self.ids) * 2)
+            row = self.count
+            self.count += 1
+            self.rows[movie_id] = row
+            self.ids[row] = movie_id
+
+        self.vectors[row] = features_of(movie)
+        self.meta[movie_id] = card_fields(movie)
+        self.richness[movie_id] = richness
+        self._dirty = True
+
+    def add_many(self, movies):
+        for movie in movies:
+            self.add(movie)
+
+    # === ЗАПРОСЫ ===
+
+    def vector(self, movie_id):
+        row = self.rows.get(movie_id)
+        return None if row is None else self.vectors[row]
+
+    def profile(self, weighted_ids):
+        """Профиль пользователя: взвешенная сумма векторов его фильмов"""
+        profile = np.zeros(DIMENSIONS, dtype=np.float32)
+        for movie_id, weight in weighted_ids:
+            vector = self.vector(movie_id)
+            if vector is not None:
+                profile += weight * vector
+        norm = np.linalg.norm(profile)
+        return profile / norm if norm else None
+
+    def top_k(self, profile, k=10, exclude=()):
+        """[(movie_id, сходство)] — топ-k по косинусу к профилю"""
+        if profile is None or not self.count:
+            return []
+        scores = self.vectors[:self.count] @ profile  # одно умножение матрицы на вектор
+        for movie_id in exclude:
+            row = self.rows.get(movie_id)
+            if row is not None:
+                scores[row] = -np.inf
+
+        k = min(k, self.count)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(self.ids[row]), float(scores[row])) for row in top if scores[row] > 0]
+
+    def stats(self):
+        return {'movies': self.count, 'capacity': 0 if self.ids is None else len(self.ids)}
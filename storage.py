@@ -0,0 +1,612 @@
+"""
+Слой хранения SQLite
+✅ Долгоживущие соединения (по одному на поток чтения)
+✅ WAL + настроенные synchronous и cache_size
+✅ Повторное использование подготовленных выражений
+✅ Один поток-писатель: записи из очереди группируются в транзакции
+✅ Чтения и записи не блокируют цикл событий
+✅ Метрики: время операций, ожидание в очереди писателя, размер пакетов
+✅ Счётчики списков в таблице users + кэш в памяти — меню без запросов к БД
+✅ Списки постранично по ключу (время, id), без OFFSET и fetchall()
+✅ Импорт пакетами одной транзакцией, экспорт кусками по тому же ключу
+✅ Таблица titles + FTS5 (триграммы) для локального поиска (titles.TitleIndex)
+"""
+
+import os
+import time
+import queue
+import asyncio
+import logging
+import sqlite3
+import threading
+from datetime import datetime
+from typing import NamedTuple, Optional
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+DB_PATH = os.environ.get('DB_PATH', 'movies.db')
+
+PRAGMAS = (
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'NORMAL'),   # в WAL безопасно и намного быстрее FULL
+    ('cache_size', -16000),      # ~16 МБ страничного кэша на соединение
+    ('temp_store', 'MEMORY'),
+    ('busy_timeout', 5000),
+)
+
+READ_WORKERS = int(os.environ.get('DB_READ_WORKERS', 4))
+WRITE_BATCH = int(os.environ.get('DB_WRITE_BATCH', 64))
+STATEMENT_CACHE = 256  # подготовленные выражения на соединение
+STATS_CACHE_SIZE = 50000  # пользователей со счётчиками в памяти
+PAGE_SIZE = 10  # фильмов на странице списка
+EXPORT_CHUNK = 500  # строк за одно чтение при экспорте
+
+# Таблица -> (колонка времени, колонки строки)
+PAGED_LISTS = {
+    'watchlist': ('added_at', 'movie_id, title'),
+    'watched': ('watched_at', 'movie_id, title, rating'),
+}
+
+_STOP = object()
+
+DB_LATENCY = metrics.histogram('db_op_seconds', 'Операции SQLite (чтение — с ожиданием пула)', ('op', 'kind'))
+DB_QUEUE_WAIT = metrics.histogram('db_write_queue_seconds', 'Ожидание записи в очереди писателя').labels()
+DB_BATCH = metrics.histogram('db_write_batch_size', 'Записей в одной транзакции',
+                             buckets=(1, 2, 4, 8, 16, 32, 64, 128)).labels()
+
+
+def _op_name(fn):
+    return fn.__name__.lstrip('_')
+
+
+def connect(db_path=DB_PATH):
+    """Соединение с нужными PRAGMA; транзакциями управляем сами"""
+    conn = sqlite3.connect(db_path, check_same_thread=False,
+                           cached_statements=STATEMENT_CACHE, isolation_level=None)
+    for name, value in PRAGMAS:
+        conn.execute(f'PRAGMA {name}={value}')
+    return conn
+
+
+# === МИГРАЦИИ ===
+# Версия схемы хранится в PRAGMA user_version.
+# Новые миграции только добавляются в конец списка.
+
+def _migration_1(c):
+    """Базовые таблицы"""
+    # Таблица пользователей
+    c.execute('''CREATE TABLE IF NOT EXISTS users
+                 (user_id INTEGER PRIMARY KEY,
+                  username TEXT,
+                  created_at TEXT,
+                  total_watched INTEGER DEFAULT 0)''')
+
+    # Таблица watchlist
+    c.execute('''CREATE TABLE IF NOT EXISTS watchlist
+                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                  user_id INTEGER,
+                  movie_id INTEGER,
+                  title TEXT,
+                  added_at TEXT)''')
+
+    # Таблица просмотренных
+    c.execute('''CREATE TABLE IF NOT EXISTS watched
+                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                  user_id INTEGER,
+                  movie_id INTEGER,
+                  title TEXT,
+                  rating INTEGER,
+                  watched_at TEXT)''')
+
+    # Таблица поиска (кэш)
+    c.execute('''CREATE TABLE IF NOT EXISTS search_cache
+                 (query TEXT PRIMARY KEY,
+                  results TEXT,
+                  cached_at TEXT)''')
+
+
+def _migration_2(c):
+    """Индексы по пользователю и уникальность (user_id, movie_id)"""
+    # Старые версии могли записать дубликаты — оставляем самую раннюю запись
+    for table in ('watchlist', 'watched'):
+        c.execute(f'''DELETE FROM {table} WHERE id NOT IN
+                     (SELECT MIN(id) FROM {table} GROUP BY user_id, movie_id)''')
+
+    # SQLite не умеет добавлять UNIQUE в существующую таблицу — уникальный индекс равнозначен
+    c.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_watchlist_user_movie ON watchlist (user_id, movie_id)')
+    c.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_watched_user_movie ON watched (user_id, movie_id)')
+
+    # Списки пользователя читаются по времени добавления
+    c.execute('CREATE INDEX IF NOT EXISTS idx_watchlist_user_added ON watchlist (user_id, added_at)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_watched_user_watched ON watched (user_id, watched_at)')
+
+
+def _migration_3(c):
+    """file_id Telegram для постеров и фото актёров"""
+    c.execute('''CREATE TABLE IF NOT EXISTS telegram_files
+                 (path TEXT PRIMARY KEY,
+                  file_id TEXT NOT NULL,
+                  used_at TEXT)''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_telegram_files_used ON telegram_files (used_at)')
+
+
+def _migration_4(c):
+    """Счётчики watchlist/просмотренных в users (вместо COUNT(*) на каждое меню)"""
+    c.execute('ALTER TABLE users ADD COLUMN watchlist_count INTEGER NOT NULL DEFAULT 0')
+
+    # Пользователи, добавлявшие фильмы без /start, тоже получают строку
+    c.execute('''INSERT OR IGNORE INTO users (user_id, created_at)
+                 SELECT user_id, ? FROM watchlist UNION SELECT user_id, ? FROM watched''',
+              (datetime.now().isoformat(), datetime.now().isoformat()))
+
+    # total_watched раньше не читался и мог разойтись с таблицей — пересчитываем
+    c.execute('''UPDATE users SET
+                   watchlist_count = (SELECT COUNT(*) FROM watchlist w WHERE w.user_id = users.user_id),
+                   total_watched = (SELECT COUNT(*) FROM watched w WHERE w.user_id = users.user_id)''')
+
+
+def _migration_5(c):
+    """Локальный индекс названий: фильмы, сериалы и люди из ответов TMDB (FTS5, триграммы)"""
+    c.execute('''CREATE TABLE IF NOT EXISTS titles
+                 (id INTEGER PRIMARY KEY,
+                  kind TEXT NOT NULL,
+                  item_id INTEGER NOT NULL,
+                  names TEXT NOT NULL,
+                  popularity REAL NOT NULL DEFAULT 0,
+                  payload TEXT NOT NULL,
+                  seen_at TEXT,
+                  UNIQUE (kind, item_id))''')
+    c.execute('''CREATE VIRTUAL TABLE IF NOT EXISTS titles_fts
+                 USING fts5(names, content='titles', content_rowid='id', tokenize='trigram')''')
+
+    # Внешний контент FTS5 синхронизируется триггерами
+    c.execute('''CREATE TRIGGER IF NOT EXISTS titles_ai AFTER INSERT ON titles BEGIN
+                   INSERT INTO titles_fts (rowid, names) VALUES (new.id, new.names);
+                 END''')
+    c.execute('''CREATE TRIGGER IF NOT EXISTS titles_ad AFTER DELETE ON titles BEGIN
+                   INSERT INTO titles_fts (titles_fts, rowid, names) VALUES ('delete', old.id, old.names);
+                 END''')
+    c.execute('''CREATE TRIGGER IF NOT EXISTS titles_au AFTER UPDATE OF names ON titles
+                 WHEN old.names IS NOT new.names BEGIN
+                   INSERT INTO titles_fts (titles_fts, rowid, names) VALUES ('delete', old.id, old.names);
+                   INSERT INTO titles_fts (rowid, names) VALUES (new.id, new.names);
+                 END''')
+
+
+MIGRATIONS = [
+    _migration_1,
+    _migration_2,
+    _migration_3,
+    _migration_4,
+    _migration_5,
+]
+
+
+def migrate(conn, target=None):
+    """Применить недостающие миграции, каждую в своей транзакции"""
+    target = len(MIGRATIONS) if target is None else target
+    version = conn.execute('PRAGMA user_version').fetchone()[0]
+
+    for number in range(version + 1, target + 1):
+        migration = MIGRATIONS[number - 1]
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            migration(conn.cursor())
+            conn.execute(f'PRAGMA user_version={number}')
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        logger.info(f"🛠 Миграция {number}: {migration.__doc__}")
+
+    return max(version, target)
+
+
+def init_db(db_path=DB_PATH, target=None):
+    """Инициализация базы данных (миграции до последней версии)"""
+    conn = connect(db_path)
+    version = migrate(conn, target)
+    conn.execute('PRAGMA optimize')  # обновить статистику для планировщика
+    conn.close()
+    logger.info(f"✅ База данных инициализирована (схема v{version})")
+
+
+# === ОПЕРАЦИИ (выполняются на соединении из пула) ===
+
+def _add_user(conn, user_id, username):
+    # Строка могла появиться раньше из счётчиков — тогда только имя
+    conn.execute('''INSERT INTO users (user_id, username, created_at) VALUES (?, ?, ?)
+                    ON CONFLICT (user_id) DO UPDATE SET username = excluded.username''',
+                 (user_id, username, datetime.now().isoformat()))
+
+
+def _add_to_watchlist(conn, user_id, movie_id, title):
+    # Дубликат отсекает уникальный индекс (user_id, movie_id)
+    now = datetime.now().isoformat()
+    cursor = conn.execute('''INSERT INTO watchlist (user_id, movie_id, title, added_at)
+                              VALUES (?, ?, ?, ?)
+                              ON CONFLICT (user_id, movie_id) DO NOTHING''',
+                          (user_id, movie_id, title, now))
+    if cursor.rowcount != 1:
+        return False
+
+    # Счётчик — в той же транзакции
+    conn.execute('''INSERT INTO users (user_id, created_at, watchlist_count) VALUES (?, ?, 1)
+                    ON CONFLICT (user_id) DO UPDATE SET watchlist_count = watchlist_count + 1''',
+                 (user_id, now))
+    return True
+
+
+def _add_to_watched(conn, user_id, movie_id, title, rating=0):
+    # Дубликат отсекает уникальный индекс (user_id, movie_id)
+    now = datetime.now().isoformat()
+    cursor = conn.execute('''INSERT INTO watched (user_id, movie_id, title, rating, watched_at)
+                              VALUES (?, ?, ?, ?, ?)
+                              ON CONFLICT (user_id, movie_id) DO NOTHING''',
+                          (user_id, movie_id, title, rating, now))
+    if cursor.rowcount != 1:
+        return False, False
+
+    # Убрать из watchlist
+    removed = conn.execute('DELETE FROM watchlist WHERE user_id=? AND movie_id=?',
+                           (user_id, movie_id)).rowcount == 1
+
+    # Обновить счётчики
+    conn.execute('''INSERT INTO users (user_id, created_at, total_watched) VALUES (?, ?, 1)
+                    ON CONFLICT (user_id) DO UPDATE SET
+                      total_watched = total_watched + 1,
+                      watchlist_count = MAX(watchlist_count - ?, 0)''',
+                 (user_id, now, int(removed)))
+    return True, removed
+
+
+class Page(NamedTuple):
+    """Страница списка; курсоры — ключи (время, id) соседних страниц или None"""
+    rows: list
+    newer: Optional[tuple]
+    older: Optional[tuple]
+
+
+def _get_page(conn, table, user_id, cursor, older, limit):
+    """Страница по ключу (время, id), новые первыми.
+
+    Без курсора — первая страница; older=True — строки старше курсора, иначе новее.
+    Индекс (user_id, время) содержит rowid, так что читается ровно limit + 1 строк.
+    """
+    time_column, columns = PAGED_LISTS[table]
+    order = 'DESC' if older else 'ASC'
+    where = ''
+    params = (user_id,)
+    if cursor is not None:
+        where = f"AND ({time_column}, id) {'<' if older else '>'} (?, ?)"
+        params += tuple(cursor)
+    rows = conn.execute(f'''SELECT {time_column}, id, {columns} FROM {table}
+                            WHERE user_id=? {where}
+                            ORDER BY {time_column} {order}, id {order} LIMIT ?''',
+                        params + (limit + 1,)).fetchall()
+
+    more = len(rows) > limit
+    rows = rows[:limit]
+    if not older:
+        rows.reverse()
+    if not rows:
+        return Page([], None, None)
+
+    first, last = tuple(rows[0][:2]), tuple(rows[-1][:2])
+    if older:
+        # Пришли по курсору — значит, новее что-то есть
+        page = Page([row[2:] for row in rows], first if cursor is not None else None, last if more else None)
+    else:
+        page = Page([row[2:] for row in rows], first if more else None, last)
+    return page
+
+
+def _get_watchlist_page(conn, user_id, cursor=None, older=True, limit=PAGE_SIZE):
+    return _get_page(conn, 'watchlist', user_id, cursor, older, limit)
+
+
+def _get_watched_page(conn, user_id, cursor=None, older=True, limit=PAGE_SIZE):
+    return _get_page(conn, 'watched', user_id, cursor, older, limit)
+
+
+def _import_rows(conn, user_id, watchlist, watched):
+    """Пакет импорта одной транзакцией: watchlist [(movie_id, title, added_at)],
+    watched [(movie_id, title, rating, watched_at)] -> (в список, в просмотренные, убрано из списка)"""
+    listed = seen = removed = 0
+    if watchlist:
+        listed = conn.executemany('''INSERT INTO watchlist (user_id, movie_id, title, added_at)
+                                     VALUES (?, ?, ?, ?)
+                                     ON CONFLICT (user_id, movie_id) DO NOTHING''',
+                                  [(user_id, *row) for row in watchlist]).rowcount
+    if watched:
+        seen = conn.executemany('''INSERT INTO watched (user_id, movie_id, title, rating, watched_at)
+                                   VALUES (?, ?, ?, ?, ?)
+                                   ON CONFLICT (user_id, movie_id) DO NOTHING''',
+                                [(user_id, *row) for row in watched]).rowcount
+        removed = conn.executemany('DELETE FROM watchlist WHERE user_id=? AND movie_id=?',
+                                   [(user_id, row[0]) for row in watched]).rowcount
+
+    # Счётчики — один раз на пакет
+    if listed or seen or removed:
+        conn.execute('''INSERT INTO users (user_id, created_at, watchlist_count, total_watched) VALUES (?, ?, ?, ?)
+                        ON CONFLICT (user_id) DO UPDATE SET
+                          watchlist_count = MAX(watchlist_count + excluded.watchlist_count, 0),
+                          total_watched = total_watched + excluded.total_watched''',
+                     (user_id, datetime.now().isoformat(), listed - removed, seen))
+    return listed, seen, removed
+
+
+def _export_rows(conn, table, user_id, cursor, limit):
+    """Кусок списка для экспорта: (время, id, колонки...) по возрастанию ключа"""
+    time_column, columns = PAGED_LISTS[table]
+    return conn.execute(f'''SELECT {time_column}, id, {columns} FROM {table}
+                            WHERE user_id=? AND ({time_column}, id) > (?, ?)
+                            ORDER BY {time_column}, id LIMIT ?''',
+                        (user_id, *cursor, limit)).fetchall()
+
+
+def _get_recent_watched(conn, user_id, limit):
+    rows = conn.execute('SELECT movie_id FROM watched WHERE user_id=? ORDER BY watched_at DESC LIMIT ?',
+                        (user_id, limit)).fetchall()
+    return [row[0] for row in rows]
+
+
+def _get_history(conn, user_id, limit):
+    return conn.execute('''SELECT movie_id, rating, watched_at FROM watched
+                           WHERE user_id=? ORDER BY watched_at DESC LIMIT ?''', (user_id, limit)).fetchall()
+
+
+def _get_seen_ids(conn, user_id):
+    rows = conn.execute('''SELECT movie_id FROM watched WHERE user_id=?
+                           UNION SELECT movie_id FROM watchlist WHERE user_id=?''', (user_id, user_id)).fetchall()
+    return {row[0] for row in rows}
+
+
+def _get_user_stats(conn, user_id):
+    row = conn.execute('SELECT watchlist_count, total_watched FROM users WHERE user_id=?', (user_id,)).fetchone()
+    return tuple(row) if row else (0, 0)
+
+
+def _resolve(future, ok, value):
+    if future.cancelled():
+        return
+    if ok:
+        future.set_result(value)
+    else:
+        future.set_exception(value)
+
+
+class Storage:
+    """Пул соединений для чтения + один писатель с группировкой транзакций"""
+
+    def __init__(self, db_path=DB_PATH, read_workers=READ_WORKERS, batch_size=WRITE_BATCH):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self._readers = ThreadPoolExecutor(read_workers, thread_name_prefix='db-read')
+        self._local = threading.local()
+        self._read_conns = []
+        self._conns_lock = threading.Lock()
+
+        self._queue = queue.Queue()
+        self._writer = None
+        self._writer_lock = threading.Lock()
+
+        self.batches = 0
+        self.writes = 0
+
+        # user_id -> [watchlist_count, watched_count]; меняется только в цикле событий
+        self._stats = OrderedDict()
+        self._stats_generation = 0  # растёт при каждом изменении счётчиков
+        self.stats_hits = 0
+        self.stats_misses = 0
+
+    # === ЧТЕНИЕ ===
+
+    def _read_conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = connect(self.db_path)
+            with self._conns_lock:
+                self._read_conns.append(conn)
+        return conn
+
+    def _run_read(self, fn, args):
+        return fn(self._read_conn(), *args)
+
+    async def read(self, fn, *args):
+        """Выполнить fn(conn, *args) в пуле чтения"""
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        try:
+            return await loop.run_in_executor(self._readers, self._run_read, fn, args)
+        finally:
+            DB_LATENCY.labels(_op_name(fn), 'read').observe(time.perf_counter() - started)
+
+    # === ЗАПИСЬ ===
+
+    def _ensure_writer(self):
+        if self._writer is None:
+            with self._writer_lock:
+                if self._writer is None:
+                    self._writer = threading.Thread(target=self._writer_loop, name='db-writer', daemon=True)
+                    self._writer.start()
+
+    def submit(self, fn, *args):
+        """Поставить запись в очередь, не дожидаясь результата"""
+        self._ensure_writer()
+        self._queue.put((fn, args, None, None, time.perf_counter()))
+
+    async def write(self, fn, *args):
+        """Поставить fn(conn, *args) в очередь писателя и дождаться результата"""
+        self._ensure_writer()
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._queue.put((fn, args, loop, future, time.perf_counter()))
+        return await future
+
+    def _writer_loop(self):
+        conn = connect(self.db_path)
+        stop = False
+        while not stop:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+
+            # Забираем всё, что накопилось, одной транзакцией
+            batch = [item]
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+
+            self._run_batch(conn, batch)
+        conn.close()
+
+    def _run_batch(self, conn, batch):
+        results = []
+        started = time.perf_counter()
+        DB_BATCH.observe(len(batch))
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            for fn, args, _loop, _future, enqueued in batch:
+                DB_QUEUE_WAIT.observe(started - enqueued)
+                op_started = time.perf_counter()
+                # Ошибка одной операции не откатывает остальные
+                conn.execute('SAVEPOINT op')
+                try:
+                    results.append((True, fn(conn, *args)))
+                    conn.execute('RELEASE op')
+                except Exception as e:
+                    conn.execute('ROLLBACK TO op')
+                    conn.execute('RELEASE op')
+                    results.append((False, e))
+                DB_LATENCY.labels(_op_name(fn), 'write').observe(time.perf_counter() - op_started)
+            conn.execute('COMMIT')
+        except sqlite3.Error as e:
+            logger.error(f"DB write batch error: {e}")
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            results = [(False, e)] * len(batch)
+
+        self.batches += 1
+        self.writes += len(batch)
+        for (fn, _args, loop, future, _enqueued), (ok, value) in zip(batch, results):
+            if future is not None:
+                loop.call_soon_threadsafe(_resolve, future, ok, value)
+            elif not ok:
+                logger.error(f"DB write {fn.__name__} error: {value}")
+
+    def queue_depth(self):
+        """Записей в очереди писателя"""
+        return self._queue.qsize()
+
+    async def close(self):
+        """Дописать очередь и закрыть соединения"""
+        if self._writer is not None:
+            self._queue.put(_STOP)
+            await asyncio.to_thread(self._writer.join)
+            self._writer = None
+        self._readers.shutdown(wait=True)
+        with self._conns_lock:
+            for conn in self._read_conns:
+                conn.close()
+            self._read_conns.clear()
+
+    # === ПОЛЬЗОВАТЕЛИ И СПИСКИ ===
+
+    async def add_user(self, user_id, username):
+        """Добавить пользователя (известный по кэшу счётчиков — без записи)"""
+        if user_id in self._stats:
+            return
+        await self.write(_add_user, user_id, username)
+
+    async def add_to_watchlist(self, user_id, movie_id, title):
+        """Добавить в watchlist"""
+        added = await self.write(_add_to_watchlist, user_id, movie_id, title)
+        if added:
+            self._bump_stats(user_id, watchlist=1)
+        return added
+
+    async def add_to_watched(self, user_id, movie_id, title, rating=0):
+        """Добавить в просмотренные"""
+        added, removed = await self.write(_add_to_watched, user_id, movie_id, title, rating)
+        if added:
+            self._bump_stats(user_id, watchlist=-int(removed), watched=1)
+        return added
+
+    async def get_watchlist_page(self, user_id, cursor=None, older=True, limit=PAGE_SIZE):
+        """Страница watchlist: Page((movie_id, title), ...)"""
+        return await self.read(_get_watchlist_page, user_id, cursor, older, limit)
+
+    async def get_watched_page(self, user_id, cursor=None, older=True, limit=PAGE_SIZE):
+        """Страница просмотренных: Page((movie_id, title, rating), ...)"""
+        return await self.read(_get_watched_page, user_id, cursor, older, limit)
+
+    async def import_rows(self, user_id, watchlist, watched):
+        """Записать пакет импорта -> (добавлено в список, добавлено в просмотренные)"""
+        listed, seen, removed = await self.write(_import_rows, user_id, watchlist, watched)
+        if listed or seen or removed:
+            self._bump_stats(user_id, watchlist=listed - removed, watched=seen)
+        return listed, seen
+
+    async def iter_list(self, user_id, table, chunk=EXPORT_CHUNK):
+        """Строки списка ('watchlist' или 'watched') кусками, без загрузки целиком"""
+        cursor = ('', 0)
+        while True:
+            rows = await self.read(_export_rows, table, user_id, cursor, chunk)
+            for row in rows:
+                yield row
+            if len(rows) < chunk:
+                return
+            cursor = tuple(rows[-1][:2])
+
+    async def get_recent_watched(self, user_id, limit=3):
+        """ID последних просмотренных фильмов"""
+        return await self.read(_get_recent_watched, user_id, limit)
+
+    async def get_history(self, user_id, limit=-1):
+        """История просмотров (movie_id, rating, watched_at), новые первыми"""
+        return await self.read(_get_history, user_id, limit)
+
+    async def get_seen_ids(self, user_id):
+        """ID фильмов из просмотренных и из watchlist"""
+        return await self.read(_get_seen_ids, user_id)
+
+    async def get_user_stats(self, user_id):
+        """(watchlist_count, watched_count) — из памяти, при промахе из users"""
+        cached = self._stats.get(user_id)
+        if cached is not None:
+            self._stats.move_to_end(user_id)
+            self.stats_hits += 1
+            return tuple(cached)
+
+        self.stats_misses += 1
+        generation = self._stats_generation
+        counts = await self.read(_get_user_stats, user_id)
+        # Если счётчики менялись во время чтения, прочитанное могло устареть
+        if generation == self._stats_generation:
+            self._stats[user_id] = list(counts)
+            while len(self._stats) > STATS_CACHE_SIZE:
+                self._stats.popitem(last=False)
+        return counts
+
+    def stats_cache(self):
+        """Статистика кэша счётчиков для /stats"""
+        return {'hits': self.stats_hits, 'misses': self.stats_misses, 'size': len(self._stats)}
+
+    def _bump_stats(self, user_id, watchlist=0, watched=0):
+        """Применить изменение счётчиков к кэшу (после успешной записи)"""
+        self._stats_generation += 1
+        cached = self._stats.get(user_id)
+        if cached is not None:
+            cached[0] = max(0, cached[0] + watchlist)
+            cached[1] += watched
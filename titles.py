@@ -0,0 +1,235 @@
+"""
+Локальный поиск по названиям (SQLite FTS5, триграммы)
+✅ Фильмы, сериалы и люди из всех ответов TMDB (наблюдатель TMDBClient)
+✅ Без учёта регистра, ё = е, кириллица <-> латиница (транслитерация)
+✅ Нечёткий поиск: кандидаты по кускам запроса, порядок — по схожести строк
+✅ Запись — через очередь писателя Storage, поиск — в потоке чтения
+"""
+
+import re
+import json
+import logging
+import sqlite3
+from datetime import datetime
+from difflib import SequenceMatcher
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+MIN_QUERY = 3          # триграммный индекс не ищет строки короче
+CANDIDATES = 60        # кандидатов из FTS на переранжирование
+STRONG_MATCH = 0.85    # отвечаем сразу, без TMDB
+WEAK_MATCH = 0.6       # показываем, только если TMDB ничего не нашёл
+COVERAGE = 0.6         # подстрока сильная, если покрывает такую долю названия...
+WORD_MATCH = 5         # ...или совпадает с целым словом не короче стольких символов
+MAX_NAMES = 6          # названий/имён на запись (also_known_as бывает длинным)
+WRITTEN_SIZE = 100_000  # записей, о которых помним, что они уже в индексе
+
+RU_TO_LAT = {
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ж': 'zh', 'з': 'z', 'и': 'i',
+    'й': 'y', 'к': 'k', 'л': 'l', 'м': 'm', 'н': 'n', 'о': 'o', 'п': 'p', 'р': 'r', 'с': 's',
+    'т': 't', 'у': 'u', 'ф': 'f', 'х': 'kh', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'shch',
+    'ъ': '', 'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'yu', 'я': 'ya',
+}
+LAT_TO_RU = {
+    'shch': 'щ', 'sch': 'щ', 'zh': 'ж', 'kh': 'х', 'ts': 'ц', 'ch': 'ч', 'sh': 'ш',
+    'yu': 'ю', 'ya': 'я', 'yo': 'е', 'ee': 'и', 'oo': 'у',
+    'a': 'а', 'b': 'б', 'c': 'к', 'd': 'д', 'e': 'е', 'f': 'ф', 'g': 'г', 'h': 'х', 'i': 'и',
+    'j': 'дж', 'k': 'к', 'l': 'л', 'm': 'м', 'n': 'н', 'o': 'о', 'p': 'п', 'q': 'к', 'r': 'р',
+    's': 'с', 't': 'т', 'u': 'у', 'v': 'в', 'w': 'в', 'x': 'кс', 'y': 'й', 'z': 'з',
+}
+_LATIN = re.compile('|'.join(sorted(LAT_TO_RU, key=len, reverse=True)))
+_CYRILLIC = re.compile('[а-я]')
+_NOT_WORD = re.compile(r'[^\w]+')
+
+
+# === НОРМАЛИЗАЦИЯ ===
+
+def normalize(text):
+    """Нижний регистр, ё -> е, знаки препинания -> пробел"""
+    return _NOT_WORD.sub(' ', str(text).lower().replace('ё', 'е')).strip()
+
+
+def transliterate(text):
+    """Нормализованная строка в другой алфавит (кириллица <-> латиница) или None"""
+    if _CYRILLIC.search(text):
+        other = ''.join(RU_TO_LAT.get(ch, ch) for ch in text)
+    elif text.isascii():
+        other = _LATIN.sub(lambda m: LAT_TO_RU[m.group()], text)
+    else:
+        return None  # другие алфавиты оставляем как есть
+    return other if other != text else None
+
+
+def variants(text):
+    """Строка и её транслитерация"""
+    text = normalize(text)
+    if not text:
+        return []
+    other = transliterate(text)
+    return [text, other] if other else [text]
+
+
+def _names(item):
+    kind = item.get('media_type')
+    if kind == 'person':
+        names = [item.get('name')] + list(item.get('also_known_as') or [])
+    elif kind == 'tv':
+        names = [item.get('name'), item.get('original_name')]
+    else:
+        names = [item.get('title'), item.get('original_title')]
+
+    result = []
+    for name in names:
+        for variant in variants(name or ''):
+            if variant not in result:
+                result.append(variant)
+        if len(result) >= MAX_NAMES:
+            break
+    return result[:MAX_NAMES]
+
+
+def _payload(item):
+    """Только поля, нужные для выдачи поиска"""
+    kind = item.get('media_type')
+    if kind == 'person':
+        known_for = [{'title': m.get('title') or m.get('name')} for m in (item.get('known_for') or [])[:2]]
+        return {'id': item['id'], 'media_type': 'person', 'name': item.get('name'),
+                'known_for': [m for m in known_for if m['title']], 'profile_path': item.get('profile_path')}
+    payload = {'id': item['id'], 'media_type': kind, 'vote_average': item.get('vote_average', 0),
+               'poster_path': item.get('poster_path')}
+    if kind == 'tv':
+        payload.update(name=item.get('name'), first_air_date=item.get('first_air_date', ''))
+    else:
+        payload.update(title=item.get('title'), release_date=item.get('release_date', ''))
+    return payload
+
+
+# === ОПЕРАЦИИ (на соединении Storage) ===
+
+def _titles_upsert(conn, rows, seen_at):
+    conn.executemany('''INSERT INTO titles (kind, item_id, names, popularity, payload, seen_at)
+                        VALUES (?, ?, ?, ?, ?, ?)
+                        ON CONFLICT (kind, item_id) DO UPDATE SET
+                          names = excluded.names, popularity = excluded.popularity,
+                          payload = excluded.payload, seen_at = excluded.seen_at''',
+                     [row + (seen_at,) for row in rows])
+
+
+def _phrase(text):
+    return '"' + text.replace('"', '""') + '"'
+
+
+def _segments(text):
+    """Перекрывающиеся куски запроса: одна опечатка портит не больше одного"""
+    if len(text) < 6:
+        return [text[:3], text[-3:]]
+    third = len(text) // 3
+    return [text[:third + 2], text[third:2 * third + 2], text[2 * third:]]
+
+
+def _match_expressions(query_variants):
+    """(подстрока, нечёткий) — выражения MATCH для FTS5"""
+    exact = ' OR '.join(_phrase(text) for text in query_variants)
+    pieces = []
+    for text in query_variants:
+        for piece in _segments(text):
+            if len(piece) >= MIN_QUERY and piece not in pieces:
+                pieces.append(piece)
+    return exact, ' OR '.join(_phrase(piece) for piece in pieces)
+
+
+def similarity(query_variants, names):
+    """0..1: совпадение, подстрока или схожесть строк (и начала названия — для опечаток)"""
+    best = 0.0
+    for query in query_variants:
+        for name in names:
+            if query == name:
+                return 1.0
+            if query in name:
+                # Начало названия или слова весит больше середины
+                score = 0.95 if name.startswith(query) or f' {query}' in name else 0.9
+                # Короткая или частая подстрока ("the", "tom") — не повод отвечать без TMDB
+                whole_word = f' {query} ' in f' {name} ' and len(query) >= WORD_MATCH
+                if not whole_word and len(query) < COVERAGE * len(name):
+                    score -= 0.15
+            else:
+                score = max(SequenceMatcher(None, query, name).ratio(),
+                            0.9 * SequenceMatcher(None, query, name[:len(query) + 1]).ratio())
+            best = max(best, score)
+    return best
+
+
+def _candidates(conn, expression):
+    return conn.execute('''SELECT t.id, t.kind, t.names, t.popularity, t.payload
+                           FROM titles_fts JOIN titles t ON t.id = titles_fts.rowid
+                           WHERE titles_fts MATCH ? ORDER BY rank LIMIT ?''',
+                        (expression, CANDIDATES)).fetchall()
+
+
+def _titles_search(conn, query_variants, limit):
+    """Сначала подстрока, при слабом результате — по кускам запроса -> [(схожесть, популярность, kind, payload)]"""
+    exact, fuzzy = _match_expressions(query_variants)
+    scored = {}
+    for expression in (exact, fuzzy):
+        for row_id, kind, names, popularity, payload in _candidates(conn, expression):
+            if row_id not in scored:
+                scored[row_id] = (similarity(query_variants, names.split('\n')), popularity, kind, payload)
+        if any(row[0] >= STRONG_MATCH for row in scored.values()):
+            break
+    rows = sorted((row for row in scored.values() if row[0] >= WEAK_MATCH),
+                  key=lambda row: (row[0], row[1]), reverse=True)
+    return rows[:limit]
+
+
+# === ИНДЕКС ===
+
+class TitleIndex:
+    """Названия из ответов TMDB в SQLite; поиск с опечатками и транслитерацией"""
+
+    def __init__(self, storage):
+        self.storage = storage
+        self._written = OrderedDict()  # (kind, id) -> строка индекса, уже отправленная на запись
+        self.writes = 0
+        self.searches = 0
+
+    def add_many(self, items):
+        """Наблюдатель TMDBClient: фильмы, сериалы и люди с media_type"""
+        rows = []
+        for item in items:
+            kind = item.get('media_type')
+            if kind not in ('movie', 'tv', 'person') or not item.get('id'):
+                continue
+            names = _names(item)
+            if not names:
+                continue
+            row = (kind, item['id'], '\n'.join(names), float(item.get('popularity') or 0),
+                   json.dumps(_payload(item), ensure_ascii=False))
+            key = (kind, item['id'])
+            if self._written.get(key) == row:
+                continue
+            self._written[key] = row
+            self._written.move_to_end(key)
+            rows.append(row)
+
+        while len(self._written) > WRITTEN_SIZE:
+            self._written.popitem(last=False)
+        if rows:
+            self.writes += len(rows)
+            self.storage.submit(_titles_upsert, rows, datetime.now().isoformat())
+
+    async def search(self, query, limit=10):
+        """[(схожесть, kind, dict для выдачи)] лучшие первыми"""
+        query_variants = variants(query)
+        if not query_variants or len(query_variants[0]) < MIN_QUERY:
+            return []
+        self.searches += 1
+        try:
+            rows = await self.storage.read(_titles_search, query_variants, limit)
+        except sqlite3.Error as e:
+            logger.error(f"Title search error: {e}")
+            return []
+        return [(score, kind, json.loads(payload)) for score, _, kind, payload in rows]
+
+    def stats(self):
+        return {'writes': self.writes, 'searches': self.searches, 'remembered': len(self._written)}
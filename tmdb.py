@@ -0,0 +1,439 @@
+"""
+Асинхронный клиент TMDB
+✅ Один пул HTTP-соединений с keep-alive
+✅ Ограничение числа одновременных запросов
+✅ Не блокирует цикл событий бота
+✅ Кэширование ответов (cache.ResponseCache)
+✅ Детали фильма и актёра разбираются один раз в models.Movie/Person — в кэше только нужные поля
+✅ Наблюдатели получают каждый увиденный фильм (индекс похожести)
+   и каждое название — фильм, сериал или человека (локальный поиск)
+✅ Общий бюджет запросов и пауза по HTTP 429 (ratelimit.TMDBBudget)
+✅ Single-flight: одинаковые запросы «в полёте» делят один вызов и один результат
+✅ Stale-while-revalidate: устаревший ответ из кэша сразу, обновление в фоне
+✅ Размыкатель на эндпоинт, дедлайн, повторы с джиттером и хеджирование (resilience)
+"""
+
+import os
+import re
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+
+import httpx
+import orjson
+
+import metrics
+from models import Movie, Person, top_by_popularity
+from ratelimit import CACHE_ONLY, RETRY_429, parse_retry_after
+from resilience import FETCH_DEADLINE, HEDGE_DELAY, RETRY_ERRORS, Breakers, backoff_delay
+
+logger = logging.getLogger(__name__)
+
+TMDB_API_KEY = os.environ.get('TMDB_API_KEY', "8265bd1679663a7ea12ac168da84d2e8")  # Бесплатный ключ для демо
+TMDB_BASE_URL = os.environ.get('TMDB_BASE_URL', "https://api.themoviedb.org/3")
+TMDB_LANGUAGE = 'ru-RU'
+
+# Лимиты пула соединений
+MAX_CONNECTIONS = int(os.environ.get('TMDB_MAX_CONNECTIONS', 20))
+MAX_KEEPALIVE = int(os.environ.get('TMDB_MAX_KEEPALIVE', 10))
+MAX_CONCURRENCY = int(os.environ.get('TMDB_MAX_CONCURRENCY', 16))
+REQUEST_TIMEOUT = float(os.environ.get('TMDB_TIMEOUT', 10))
+MISSING_SIZE = 10_000  # путей, на которые TMDB ответил окончательной ошибкой (404 и т.п.)
+TRANSIENT_4XX = (401, 408, 429)  # 4xx, после которых повтор может удаться
+
+TMDB_LATENCY = metrics.histogram('tmdb_request_seconds', 'Время HTTP-запроса к TMDB', ('endpoint',))
+TMDB_RESPONSES = metrics.counter('tmdb_responses_total', 'Ответы TMDB по статусу', ('endpoint', 'status'))
+TMDB_COALESCED = metrics.counter('tmdb_coalesced_total', 'Запросы, присоединённые к уже идущему', ('endpoint',))
+TMDB_STALE = metrics.counter('tmdb_stale_served_total', 'Устаревшие ответы из кэша (обновляются в фоне)',
+                             ('endpoint',))
+TMDB_HEDGED = metrics.counter('tmdb_hedged_total', 'Повторные (хеджирующие) запросы к медленному TMDB', ('endpoint',))
+TMDB_FAST_FAILED = metrics.counter('tmdb_breaker_rejected_total', 'Запросы, отклонённые открытым размыкателем',
+                                   ('endpoint',))
+_IDS = re.compile(r'/(?:tt)?\d+')  # id TMDB и IMDb
+
+
+def endpoint_of(path):
+    """Путь без id для меток метрик: /movie/550 -> /movie/{id}"""
+    return _IDS.sub('/{id}', path)
+
+
+def _usable(task):
+    """Попытка завершилась ответом, который можно отдать (не ошибка, не 429/5xx)"""
+    if task.cancelled() or task.exception() is not None:
+        return False
+    response = task.result()
+    return response is not None and response.status_code != 429 and response.status_code < 500
+
+
+class TMDBClient:
+    """Асинхронный клиент TMDB с общим пулом соединений"""
+
+    def __init__(self, api_key=TMDB_API_KEY, base_url=TMDB_BASE_URL, language=TMDB_LANGUAGE,
+                 max_connections=MAX_CONNECTIONS, max_keepalive=MAX_KEEPALIVE,
+                 max_concurrency=MAX_CONCURRENCY, timeout=REQUEST_TIMEOUT, cache=None, budget=None,
+                 hedge_delay=HEDGE_DELAY, deadline=FETCH_DEADLINE):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip('/')
+        self.language = language
+        self.max_connections = max_connections
+        self.max_keepalive = max_keepalive
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.cache = cache
+        self.budget = budget  # ratelimit.TMDBBudget или None (без ограничений)
+        self.hedge_delay = hedge_delay  # 0 — без хеджирования
+        self.deadline = deadline        # на весь запрос с повторами
+        self.breakers = Breakers()
+        self.cache_only_misses = 0
+        self.coalesced = 0
+        self.stale_served = 0
+        self.hedges = 0
+        self._inflight = {}  # (path, параметры) -> Task с запросом к TMDB
+        self._missing = OrderedDict()  # path -> None: нет такого фильма/человека или неверный id
+        self.observers = []  # callable(list[dict]) — фильмы из ответов TMDB
+        self.title_observers = []  # callable(list[dict]) — фильмы, сериалы и люди (с media_type)
+        self.refresh_observers = []  # callable(path, language) — ответ получен из сети и заменил кэш
+
+        # Создаются лениво внутри цикла событий бота
+        self._client = None
+        self._semaphore = None
+
+    def _get_client(self):
+        """Пул соединений (создаётся при первом запросе)"""
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_keepalive
+                )
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._client
+
+    async def close(self):
+        """Закрыть пул соединений"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            self._semaphore = None
+
+    async def request(self, path, parse=None, **params):
+        """GET-запрос к TMDB (через кэш), возвращает JSON или None
+
+        parse(json) -> то, что кладётся в кэш и возвращается (вызывается один раз на ответ сети)
+        """
+        params = {'api_key': self.api_key, 'language': self.language, **params}
+
+        stale = None
+        if self.cache is not None:
+            data, fresh = await self.cache.lookup(path, params)
+            if fresh:
+                return data
+            stale = data
+
+        key = (path, tuple(sorted(params.items())))
+        task = self._inflight.get(key)
+        if stale is not None:
+            # Stale-while-revalidate: отвечаем сразу, обновляем в фоне (не чаще одного запроса)
+            self.stale_served += 1
+            TMDB_STALE.labels(endpoint_of(path)).inc()
+            if task is None and not CACHE_ONLY.get():
+                self._start(key, path, params, parse)
+            return stale
+
+        # Такой же запрос уже идёт — ждём его результат (shield: отмена одного
+        # ожидающего не отменяет запрос для остальных)
+        if task is not None:
+            self.coalesced += 1
+            TMDB_COALESCED.labels(endpoint_of(path)).inc()
+            return await asyncio.shield(task)
+
+        if CACHE_ONLY.get():
+            # Пользователь сверх лимита — в сеть не ходим
+            self.cache_only_misses += 1
+            return None
+
+        return await asyncio.shield(self._start(key, path, params, parse))
+
+    def _start(self, key, path, params, parse):
+        task = self._inflight[key] = asyncio.ensure_future(self._fetch(path, params, parse))
+        task.add_done_callback(lambda done: self._landed(key, done))
+        return task
+
+    def _landed(self, key, task):
+        self._inflight.pop(key, None)
+        if not task.cancelled() and task.exception() is not None:
+            # Ожидающие могли уже уйти (дедлайн поиска) — не оставляем ошибку «непрочитанной»
+            logger.debug(f"TMDB {key[0]}: {task.exception()!r}")
+
+    async def _fetch(self, path, params, parse=None):
+        """Запрос в сеть через размыкатель эндпоинта, с общим дедлайном; результат — в кэш"""
+        endpoint = endpoint_of(path)
+        breaker = self.breakers[endpoint]
+        if not breaker.allow():
+            # TMDB недавно не отвечал — не ждём таймаута, отказываем сразу
+            TMDB_FAST_FAILED.labels(endpoint).inc()
+            return None
+
+        try:
+            response = await asyncio.wait_for(self._hedged(path, params), self.deadline)
+        except (httpx.HTTPError, asyncio.TimeoutError) as e:
+            breaker.failure()
+            logger.warning(f"TMDB {path}: {e!r}")
+            return None
+        if response is None:
+            return None  # бюджет исчерпан — о доступности TMDB это ничего не говорит
+
+        if response.status_code >= 500:
+            breaker.failure()
+        elif response.status_code != 429:
+            breaker.success()
+
+        if response.status_code == 200:
+            self._missing.pop(path, None)
+            data = orjson.loads(response.content)
+            if parse is not None:
+                data = parse(data)
+            if self.cache is not None:
+                await self.cache.set(path, params, data)
+            for observer in self.refresh_observers:
+                try:
+                    observer(path, params.get('language'))
+                except Exception as e:
+                    logger.error(f"Refresh observer error: {e}")
+            return data
+        logger.warning(f"TMDB {path} -> HTTP {response.status_code}")
+        if 400 <= response.status_code < 500 and response.status_code not in TRANSIENT_4XX:
+            self._missing[path] = None
+            self._missing.move_to_end(path)
+            while len(self._missing) > MISSING_SIZE:
+                self._missing.popitem(last=False)
+        return None
+
+    def missing(self, path):
+        """TMDB ответил на path окончательной ошибкой (404, неверный id) — повтор не поможет"""
+        return path in self._missing
+
+    async def _send(self, path, params):
+        """Попытка с бюджетом, паузой по 429 и повтором после 5xx/сетевой ошибки; None — нет бюджета"""
+        client = self._get_client()
+        limited = errors = 0
+        while True:
+            if self.budget is not None and not await self.budget.acquire():
+                logger.warning(f"TMDB {path}: бюджет запросов исчерпан")
+                return None
+            try:
+                async with self._semaphore:
+                    response = await self._get(client, path, params)
+            except httpx.HTTPError:
+                if errors >= RETRY_ERRORS:
+                    raise
+                errors += 1
+                await asyncio.sleep(backoff_delay(errors))
+                continue
+
+            if response.status_code == 429 and self.budget is not None and limited < RETRY_429:
+                limited += 1
+                self.budget.backoff(parse_retry_after(response.headers.get('Retry-After')))
+            elif response.status_code >= 500 and errors < RETRY_ERRORS:
+                errors += 1
+                await asyncio.sleep(backoff_delay(errors))
+            else:
+                return response
+
+    async def _hedged(self, path, params):
+        """Нет ответа за hedge_delay — второй такой же запрос (если есть запас бюджета), берём первый удачный"""
+        primary = asyncio.ensure_future(self._send(path, params))
+        tasks = {primary}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.hedge_delay or None)
+            if done or not self.hedge_delay or (self.budget is not None and not self.budget.try_acquire()):
+                return await primary
+
+            self.hedges += 1
+            TMDB_HEDGED.labels(endpoint_of(path)).inc()
+            client = self._get_client()
+            tasks.add(asyncio.ensure_future(self._get(client, path, params)))
+            pending = tasks
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if _usable(task):
+                        return task.result()
+            return primary.result()  # обе попытки неудачны — итог основной
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    def stats(self):
+        """Счётчики клиента для /stats"""
+        return {
+            'in_flight': len(self._inflight),
+            'coalesced': self.coalesced,
+            'stale_served': self.stale_served,
+            'hedges': self.hedges,
+            'missing': len(self._missing),
+            'breakers': self.breakers.stats(),
+        }
+
+    async def _get(self, client, path, params):
+        """Один HTTP-запрос с метриками по эндпоинту"""
+        endpoint = endpoint_of(path)
+        started = time.perf_counter()
+        try:
+            response = await client.get(path, params=params)
+        except httpx.HTTPError as e:
+            TMDB_RESPONSES.labels(endpoint, type(e).__name__).inc()
+            raise
+        finally:
+            TMDB_LATENCY.labels(endpoint).observe(time.perf_counter() - started)
+        TMDB_RESPONSES.labels(endpoint, str(response.status_code)).inc()
+        return response
+
+    def _observe(self, items, media_type='movie'):
+        """Передать элементы ответа наблюдателям: observers — только фильмы, title_observers — всё"""
+        if not items or not (self.observers or self.title_observers):
+            return
+        # Ответы лежат в кэше — media_type дописываем в копию
+        items = [item if item.get('media_type') else {**item, 'media_type': media_type} for item in items]
+        movies = [item for item in items if item['media_type'] == 'movie']
+        for observers, batch in ((self.observers, movies), (self.title_observers, items)):
+            if not batch:
+                continue
+            for observer in observers:
+                try:
+                    observer(batch)
+                except Exception as e:
+                    logger.error(f"Observer error: {e}")
+
+    # === ПОИСК ===
+
+    async def search_movie(self, query):
+        """Поиск фильма через TMDB API"""
+        try:
+            data = await self.request('/search/multi', query=query, page=1)
+            results = data.get('results', [])[:5] if data else []  # Топ-5 результатов
+            self._observe(results)
+            return results
+        except Exception as e:
+            logger.error(f"Search error: {e}")
+            return []
+
+    async def search_actor(self, query):
+        """Поиск актёра через TMDB API"""
+        try:
+            data = await self.request('/search/person', query=query, page=1)
+            results = data.get('results', [])[:5] if data else []  # Топ-5 актёров
+            self._observe(results, 'person')
+            return results
+        except Exception as e:
+            logger.error(f"Actor search error: {e}")
+            return []
+
+    async def find_movie(self, title, year=None):
+        """Лучшее совпадение фильма по названию (и году) или None — для импорта"""
+        try:
+            params = {'query': title, 'page': 1}
+            if year:
+                params['year'] = year
+            data = await self.request('/search/movie', **params)
+            results = data.get('results', []) if data else []
+            self._observe(results[:5])
+            return results[0] if results else None
+        except Exception as e:
+            logger.error(f"Find movie error: {e}")
+            return None
+
+    async def find_by_imdb(self, imdb_id):
+        """Фильм по id IMDb (tt...) или None"""
+        try:
+            data = await self.request(f'/find/{imdb_id}', external_source='imdb_id')
+            results = data.get('movie_results', []) if data else []
+            self._observe(results)
+            return results[0] if results else None
+        except Exception as e:
+            logger.error(f"Find by IMDb error: {e}")
+            return None
+
+    # === АКТЁРЫ ===
+
+    async def get_actor(self, actor_id):
+        """Актёр и топ-10 фильмов одним запросом: (models.Person, [models.Movie])"""
+        def parse(data):
+            movies = top_by_popularity(data.get('movie_credits', {}).get('cast', []))
+            self._observe([{**data, 'media_type': 'person', 'known_for': movies[:2]}] + movies)
+            return Person.from_tmdb(data, movies)
+
+        try:
+            data = await self.request(f'/person/{actor_id}', parse=parse, append_to_response='movie_credits')
+            if not data:
+                return None, []
+            actor = Person.load(data)
+            return actor, list(actor.movies)
+        except Exception as e:
+            logger.error(f"Actor error: {e}")
+            return None, []
+
+    # === ФИЛЬМЫ ===
+
+    async def get_movie_details(self, movie_id, media_type='movie'):
+        """Детали фильма (models.Movie) или None"""
+        def parse(data):
+            self._observe([data] + data.get('similar', {}).get('results', []), media_type)
+            return Movie.from_tmdb(data, media_type)
+
+        try:
+            data = await self.request(f'/{media_type}/{movie_id}', parse=parse,
+                                      append_to_response='credits,similar,keywords')
+            return Movie.load(data, media_type) if data else None
+        except Exception as e:
+            logger.error(f"Details error: {e}")
+            return None
+
+    async def get_recommendations(self, movie_id, media_type='movie'):
+        """Рекомендации TMDB к фильму"""
+        try:
+            data = await self.request(f'/{media_type}/{movie_id}/recommendations', page=1)
+            results = data.get('results', []) if data else []
+            self._observe(results, media_type)
+            return results
+        except Exception as e:
+            logger.error(f"Recommendations error: {e}")
+            return []
+
+    async def get_popular_movies(self):
+        """Получить популярные фильмы"""
+        try:
+            data = await self.request('/movie/popular', page=1)
+            results = data.get('results', [])[:10] if data else []
+            self._observe(results)
+            return results
+        except Exception as e:
+            logger.error(f"Popular error: {e}")
+            return []
+
+    async def get_top_rated_movies(self):
+        """Топ фильмов по рейтингу"""
+        try:
+            data = await self.request('/movie/top_rated', page=1)
+            results = data.get('results', [])[:10] if data else []
+            self._observe(results)
+            return results
+        except Exception as e:
+            logger.error(f"Top rated error: {e}")
+            return []
+
+    async def get_trending_movies(self):
+        """Фильмы в тренде за день"""
+        try:
+            data = await self.request('/trending/movie/day')
+            results = data.get('results', [])[:10] if data else []
+            self._observe(results)
+            return results
+        except Exception as e:
+            logger.error(f"Trending error: {e}")
+            return []
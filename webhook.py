@@ -0,0 +1,125 @@
+"""
+Режим webhook на одном ASGI-сервере
+✅ Telegram присылает обновления сам — без long polling
+✅ Обновление сразу кладётся в update_queue приложения, ответ 200 без ожидания обработки
+✅ Проверка секретного заголовка X-Telegram-Bot-Api-Secret-Token
+✅ Остальные маршруты (/, /health, /stats) — существующее Flask-приложение через WsgiToAsgi
+✅ Корректная остановка по SIGTERM/SIGINT: сервер, затем приложение бота
+"""
+
+import os
+import json
+import logging
+
+import uvicorn
+from asgiref.wsgi import WsgiToAsgi
+from telegram import Update
+
+logger = logging.getLogger(__name__)
+
+# Публичный адрес сервиса, например https://movie-bot.onrender.com (пусто — режим polling)
+WEBHOOK_URL = os.environ.get('WEBHOOK_URL', '').rstrip('/')
+WEBHOOK_PATH = os.environ.get('WEBHOOK_PATH', '/telegram')
+WEBHOOK_SECRET = os.environ.get('WEBHOOK_SECRET')
+MAX_BODY = 1024 * 1024  # обновления Telegram намного меньше
+
+
+async def _respond(send, status, body=b'', content_type=b'text/plain; charset=utf-8'):
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(b'content-type', content_type), (b'content-length', str(len(body)).encode())]})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+class WebhookApp:
+    """ASGI-приложение: путь webhook обрабатывается здесь, остальное — Flask"""
+
+    def __init__(self, flask_app, path=WEBHOOK_PATH, secret=WEBHOOK_SECRET):
+        self.path = path
+        self.secret = secret.encode() if secret else None
+        self.fallback = WsgiToAsgi(flask_app)
+        self.application = None  # telegram.ext.Application, см. attach()
+
+        self.received = 0
+        self.rejected = 0
+
+    def attach(self, application):
+        self.application = application
+        return self
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http' and scope['path'] == self.path:
+            await self._webhook(scope, receive, send)
+        else:
+            await self.fallback(scope, receive, send)
+
+    async def _read_body(self, receive):
+        chunks, size = [], 0
+        while True:
+            message = await receive()
+            chunk = message.get('body', b'')
+            size += len(chunk)
+            if size > MAX_BODY:
+                return None
+            chunks.append(chunk)
+            if not message.get('more_body'):
+                return b''.join(chunks)
+
+    async def _webhook(self, scope, receive, send):
+        """Принять обновление от Telegram"""
+        if scope['method'] != 'POST':
+            await _respond(send, 405)
+            return
+        if self.secret is not None:
+            headers = dict(scope['headers'])
+            if headers.get(b'x-telegram-bot-api-secret-token') != self.secret:
+                self.rejected += 1
+                await _respond(send, 403)
+                return
+        if self.application is None:
+            await _respond(send, 503)
+            return
+
+        body = await self._read_body(receive)
+        try:
+            update = Update.de_json(json.loads(body), self.application.bot) if body else None
+        except (ValueError, TypeError, KeyError) as e:
+            logger.warning(f"Bad webhook payload: {e}")
+            update = None
+        if update is None:
+            self.rejected += 1
+            await _respond(send, 400)
+            return
+
+        await self.application.update_queue.put(update)
+        self.received += 1
+        await _respond(send, 200)
+
+    def stats(self):
+        """Принятые/отклонённые обновления и длина очереди"""
+        return {
+            'received': self.received,
+            'rejected': self.rejected,
+            'queue': self.application.update_queue.qsize() if self.application else 0,
+        }
+
+
+async def serve(webhook, application, port, host='0.0.0.0', post_shutdown=None):
+    """Запустить бота и ASGI-сервер в одном цикле событий до сигнала остановки"""
+    server = uvicorn.Server(uvicorn.Config(webhook.attach(application), host=host, port=port,
+                                           log_level='warning', lifespan='off'))
+    async with application:  # initialize() ... shutdown()
+        await application.start()
+        await application.bot.set_webhook(
+            url=WEBHOOK_URL + webhook.path,
+            secret_token=WEBHOOK_SECRET,
+            allowed_updates=Update.ALL_TYPES
+        )
+        logger.info(f"🌐 Webhook: {WEBHOOK_URL}{webhook.path}, порт {port}")
+
+        # uvicorn сам перехватывает SIGINT/SIGTERM и дожидается текущих запросов
+        await server.serve()
+
+        logger.info("⏹ Останавливаю бота...")
+        await application.stop()
+    if post_shutdown is not None:
+        await post_shutdown(application)